@@ -1,16 +1,18 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_file, Blueprint, jsonify
+from flask import Flask, Response, g, render_template, request, redirect, url_for, session, Blueprint, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-from io import StringIO, BytesIO
 from flasgger import Swagger, swag_from
-from sqlalchemy import text
-import csv
+import threading
+import time
 from datetime import datetime
 from app.core.config import settings
-from app.core.db import Base, engine, db_session
+from app.core import metrics, sqltrace, stats
+from app.core.db import db_session, init_db
 from app.core.models import Parent, Child, Lead, Appointment, MessageTemplate, AdminUser
+from sqlalchemy import select
 from .forms import LoginForm
 from .auth import login_required
 from app.admin.routes_messages import bp_messages
+from app.admin import export, listing
 
 
 app = Flask(__name__, template_folder="templates", static_folder="static", static_url_path="/static")
@@ -68,54 +70,58 @@ def tg_at(username: str | None) -> str:
     return f"@{username}" if username else ""
 
 # ─────────────────────────────────────────────────────────
-# БД, таблицы и дефолтный админ
+# БД, таблицы и дефолтный админ — при старте, а не при импорте
 # ─────────────────────────────────────────────────────────
-Base.metadata.create_all(bind=engine)
-
-# Грубые миграции недостающих колонок
-with engine.begin() as conn:
-    # children
-    cols_children = {row[1] for row in conn.execute(text("PRAGMA table_info(children)"))}
-    if "tg_id" not in cols_children:
-        conn.execute(text("ALTER TABLE children ADD COLUMN tg_id VARCHAR"))
-    if "schedule_text" not in cols_children:
-        conn.execute(text("ALTER TABLE children ADD COLUMN schedule_text TEXT"))
-    if "paid" not in cols_children:
-        conn.execute(text("ALTER TABLE children ADD COLUMN paid BOOLEAN DEFAULT 0"))
-    if "tg_username" not in cols_children:
-        conn.execute(text("ALTER TABLE children ADD COLUMN tg_username VARCHAR"))
-
-    # parents
-    cols_parents = {row[1] for row in conn.execute(text("PRAGMA table_info(parents)"))}
-    if "tg_username" not in cols_parents:
-        conn.execute(text("ALTER TABLE parents ADD COLUMN tg_username VARCHAR"))
-
-    # leads
-    cols_leads = {row[1] for row in conn.execute(text("PRAGMA table_info(leads)"))}
-    if "name" not in cols_leads:
-        conn.execute(text("ALTER TABLE leads ADD COLUMN name VARCHAR"))
-    if "age" not in cols_leads:
-        conn.execute(text("ALTER TABLE leads ADD COLUMN age INTEGER"))
-    if "processed" not in cols_leads:
-        conn.execute(text("ALTER TABLE leads ADD COLUMN processed BOOLEAN DEFAULT 0"))
-    if "source" not in cols_leads:
-        conn.execute(text("ALTER TABLE leads ADD COLUMN source VARCHAR"))
-    if "tg_username" not in cols_leads:
-        conn.execute(text("ALTER TABLE leads ADD COLUMN tg_username VARCHAR"))
-
-    # appointments (на всякий случай — вдруг нет created_at)
-    cols_appts = {row[1] for row in conn.execute(text("PRAGMA table_info(appointments)"))}
-    if "created_at" not in cols_appts:
-        conn.execute(text("ALTER TABLE appointments ADD COLUMN created_at DATETIME"))
-
-
-# Создаём дефолтного админа, если отсутствует
-with db_session() as db:
-    if not db.query(AdminUser).filter_by(login=settings.ADMIN_LOGIN).first():
-        db.add(AdminUser(
-            login=settings.ADMIN_LOGIN,
-            password_hash=generate_password_hash(settings.ADMIN_PASSWORD)
-        ))
+_started = False
+_start_lock = threading.Lock()
+
+
+def _startup():
+    global _started
+    if _started:
+        return
+    with _start_lock:
+        if _started:
+            return
+        init_db()  # миграции схемы: app.core.migrations
+
+        # Создаём дефолтного админа, если отсутствует
+        with db_session() as db:
+            if not db.query(AdminUser).filter_by(login=settings.ADMIN_LOGIN).first():
+                db.add(AdminUser(
+                    login=settings.ADMIN_LOGIN,
+                    password_hash=generate_password_hash(settings.ADMIN_PASSWORD)
+                ))
+        _started = True
+
+
+# если приложение взяли как app.admin.app:app (flask run, gunicorn) — поднимемся на первом запросе
+app.before_request(_startup)
+
+# SQL_TRACE: запросы админки помечаются эндпоинтом (admin:leads_view), см. app.core.sqltrace
+if settings.SQL_TRACE:
+    app.before_request(lambda: sqltrace.set_source(f"admin:{request.endpoint}"))
+
+# METRICS_ENABLED: время ответа по шаблону маршрута (/parent/<int:pid>), см. app.core.metrics
+if settings.METRICS_ENABLED:
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            metrics.HTTP_SECONDS.observe(
+                time.perf_counter() - started, app="admin", method=request.method,
+                route=request.url_rule.rule if request.url_rule else "<unmatched>", status=response.status_code,
+            )
+        return response
+
+
+def create_app() -> Flask:
+    _startup()
+    return app
 
 # ─────────────────────────────────────────────────────────
 # API Blueprint (только JSON)
@@ -139,13 +145,36 @@ api = Blueprint("api", __name__, url_prefix="/api")
 def api_health():
     return jsonify(status="ok")
 
+PARENT_SORTS = {"id": Parent.id, "created_at": Parent.created_at}
+
+
+def _parent_filters(args) -> list:
+    """?lang=&date_from=&date_to=&q= (ФИО или телефон) — общие для /parents и /api/parents."""
+    cond = listing.date_range(
+        Parent.created_at, listing.parse_day(args.get("date_from")), listing.parse_day(args.get("date_to"))
+    )
+    if args.get("lang"):
+        cond.append(Parent.language == args["lang"])
+    q, phones = listing.parse_search(args)
+    if q:
+        cond.append(Parent.phone.in_(phones) if phones else Parent.full_name.icontains(q, autoescape=True))
+    return cond
+
+
 @api.get("/parents")
 @swag_from({
     "tags": ["Parents"],
     "summary": "Получить список родителей (JSON)",
+    "description": "Keyset-пагинация: следующая страница — ?after=<next_after из ответа>. Без COUNT и OFFSET.",
     "parameters": [
         {"in": "query", "name": "limit", "type": "integer", "default": 50, "minimum": 1, "maximum": 500},
-        {"in": "query", "name": "offset", "type": "integer", "default": 0, "minimum": 0}
+        {"in": "query", "name": "after", "type": "string", "description": "курсор из next_after"},
+        {"in": "query", "name": "sort", "type": "string", "default": "-id",
+         "enum": ["id", "-id", "created_at", "-created_at"]},
+        {"in": "query", "name": "lang", "type": "string"},
+        {"in": "query", "name": "date_from", "type": "string", "format": "date"},
+        {"in": "query", "name": "date_to", "type": "string", "format": "date"},
+        {"in": "query", "name": "q", "type": "string", "description": "ФИО (подстрока) или телефон"}
     ],
     "responses": {
         200: {
@@ -153,7 +182,7 @@ def api_health():
             "schema": {
                 "type": "object",
                 "properties": {
-                    "total": {"type": "integer"},
+                    "next_after": {"type": "string", "description": "null — это последняя страница"},
                     "items": {
                         "type": "array",
                         "items": {
@@ -171,37 +200,27 @@ def api_health():
                     }
                 }
             }
-        }
+        },
+        400: {"description": "Кривой фильтр, сортировка или курсор"}
     }
 })
 def api_parents():
-    # простая пагинация
     try:
-        limit = int(request.args.get("limit", 50))
-        offset = int(request.args.get("offset", 0))
-    except Exception:
-        limit, offset = 50, 0
-    limit = max(1, min(500, limit))
-    offset = max(0, offset)
-
-    with db_session() as db:
-        total = db.query(Parent).count()
-        rows = (db.query(Parent)
-                  .order_by(Parent.id.desc())
-                  .offset(offset).limit(limit)
-                  .all())
-        items = []
-        for p in rows:
-            items.append({
-                "id": p.id,
-                "tg_id": p.tg_id,
-                "full_name": p.full_name or "",
-                "phone": p.phone or "",
-                "city": p.city or "",
-                "language": p.language or "",
-                "created_at": (p.created_at.isoformat() if getattr(p, "created_at", None) else None),
-            })
-    return jsonify(total=total, items=items)
+        cond = _parent_filters(request.args)
+        with db_session() as db:
+            page = listing.paginate(db, select(Parent).where(*cond), request.args, PARENT_SORTS, Parent.id)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    items = [{
+        "id": p.id,
+        "tg_id": p.tg_id,
+        "full_name": p.full_name or "",
+        "phone": p.phone or "",
+        "city": p.city or "",
+        "language": p.language or "",
+        "created_at": (p.created_at.isoformat() if getattr(p, "created_at", None) else None),
+    } for p in page.items]
+    return jsonify(items=items, next_after=page.next_after)
 
 # регистрируем API после объявления
 app.register_blueprint(api)
@@ -233,19 +252,63 @@ def logout():
 @app.route("/")
 @login_required
 def dashboard():
+    # один запрос к stats_counters вместо COUNT(*) по таблицам (app.core.stats)
     with db_session() as db:
-        parents = db.query(Parent).count()
-        children = db.query(Child).count()
-        leads = db.query(Lead).count()
-        appts = db.query(Appointment).count()
-    return render_template("dashboard.html", parents=parents, children=children, leads=leads, appts=appts)
+        data = stats.read(db)
+    return render_template("dashboard.html", **data)
+
+# ---- Трассировка SQL этого процесса (SQL_TRACE=1): top-N запросов, ?top=50
+@app.route("/sql")
+@login_required
+def sql_report():
+    if not settings.SQL_TRACE:
+        return "SQL_TRACE выключен", 404
+    report = sqltrace.TRACE.report(request.args.get("top", type=int))
+    return Response(report, mimetype="text/plain; charset=utf-8")
+
+# ---- Метрики Prometheus: без сессии админа — у скрейпера её нет; закрывается METRICS_TOKEN
+@app.route("/metrics")
+def metrics_view():
+    if not settings.METRICS_ENABLED:
+        return "METRICS_ENABLED выключен", 404
+    if not metrics.authorized(request.headers.get("Authorization")):
+        return "unauthorized", 401
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+# ---- Разделы: фильтры и keyset-пагинация (app.admin.listing), без .all() по таблице
+def _list_urls(page) -> dict:
+    """Ссылки пагинации с теми же фильтрами."""
+    args = request.args.to_dict()
+    args.pop("after", None)
+    return {
+        "first_url": url_for(request.endpoint, **args),
+        "next_url": url_for(request.endpoint, **args, after=page.next_after) if page.next_after else None,
+    }
+
 
-# ---- Разделы
 @app.route("/leads")
 @login_required
 def leads_view():
-    with db_session() as db:
-        rows = db.query(Lead).order_by(Lead.id.desc()).all()
+    args = request.args
+    try:
+        processed = listing.parse_flag(args, "processed")
+        cond = listing.date_range(
+            Lead.created_at, listing.parse_day(args.get("date_from")), listing.parse_day(args.get("date_to"))
+        )
+        if processed is not None:
+            cond.append(Lead.processed.is_(True) if processed else Lead.processed.isnot(True))
+        if args.get("source"):
+            cond.append(Lead.source == args["source"])
+        q, phones = listing.parse_search(args)
+        if q:
+            cond.append(Lead.phone.in_(phones) if phones else Lead.name.icontains(q, autoescape=True))
+        with db_session() as db:
+            page = listing.paginate(
+                db, select(Lead).where(*cond), args, {"id": Lead.id, "created_at": Lead.created_at}, Lead.id
+            )
+    except ValueError as e:
+        return str(e), 400
+    rows = page.items
 
     items = []
     for l in rows:
@@ -264,7 +327,7 @@ def leads_view():
             "created": (l.created_at.strftime("%d-%m-%Y") if getattr(l, "created_at", None) else "")
         })
 
-    return render_template("leads.html", items=items)
+    return render_template("leads.html", items=items, page=page, **_list_urls(page))
 
 
 @app.post("/leads/<int:lead_id>/toggle_processed")
@@ -274,16 +337,40 @@ def lead_toggle_processed(lead_id: int):
         lead = db.query(Lead).filter(Lead.id == lead_id).first()
         if lead:
             lead.processed = 0 if getattr(lead, "processed", 0) else 1
-    return redirect(url_for("leads_view"))
+    return redirect(request.referrer or url_for("leads_view"))  # остаёмся на той же странице списка
 
 
 
 @app.route("/parents", methods=["GET"])
 @login_required
 def parents_view():
-    with db_session() as db:
-        items = db.query(Parent).order_by(Parent.id.desc()).all()
-    return render_template("parents.html", items=items, tg_at=tg_at)
+    args = request.args
+    try:
+        cond = _parent_filters(args)
+        with db_session() as db:
+            page = listing.paginate(db, select(Parent).where(*cond), args, PARENT_SORTS, Parent.id)
+            # дети страницы — одним SELECT ... WHERE parent_id IN (...) по колонкам, а не parent.children
+            # в шаблоне: там это запрос на строку (или DetachedInstanceError после закрытия сессии).
+            # selectinload тут хуже: он грузит и лишнюю строку-«заглядывание» paginate и режет IN по 500 id
+            children: dict[int, list[str]] = {}
+            ids = [p.id for p in page.items]
+            if ids:
+                for parent_id, name in db.execute(
+                    select(Child.parent_id, Child.name).where(Child.parent_id.in_(ids)).order_by(Child.id)
+                ):
+                    children.setdefault(parent_id, []).append(name)
+    except ValueError as e:
+        return str(e), 400
+    items = [{
+        "id": p.id,
+        "tg": tg_at(getattr(p, "tg_username", None)),
+        "full_name": p.full_name or "",
+        "phone": p.phone or "",
+        "language": p.language or "",
+        "created": dmy(p.created_at),
+        "children": ", ".join(children.get(p.id, ())),
+    } for p in page.items]
+    return render_template("parents.html", items=items, page=page, **_list_urls(page))
 
 
 @app.route("/parents/<int:parent_id>/update", methods=["POST"])
@@ -295,15 +382,43 @@ def parent_update(parent_id: int):
         p = db.query(Parent).filter(Parent.id == parent_id).first()
         if p:
             p.full_name = full_name
-    return redirect(url_for("parents_view"))
+    return redirect(request.referrer or url_for("parents_view"))
 
 
 @app.route("/children", methods=["GET"])
 @login_required
 def children_view():
-    with db_session() as db:
-        items = db.query(Child).order_by(Child.id.desc()).all()
-    return render_template("children.html", items=items, tg_at=tg_at)
+    args = request.args
+    try:
+        paid = listing.parse_flag(args, "paid")
+        cond = listing.date_range(
+            Child.created_at, listing.parse_day(args.get("date_from")), listing.parse_day(args.get("date_to"))
+        )
+        if paid is not None:
+            cond.append(Child.paid.is_(True) if paid else Child.paid.isnot(True))
+        q, phones = listing.parse_search(args)
+        if q:
+            cond.append(Child.phone.in_(phones) if phones else Child.name.icontains(q, autoescape=True))
+        # родитель — в том же запросе (outer join по колонкам), без ленивой загрузки на строку
+        stmt = (
+            select(Child, Parent.full_name, Parent.phone)
+            .outerjoin(Parent, Parent.id == Child.parent_id)
+            .where(*cond)
+        )
+        with db_session() as db:
+            page = listing.paginate(db, stmt, args, {"id": Child.id, "created_at": Child.created_at}, Child.id)
+    except ValueError as e:
+        return str(e), 400
+    items = [{
+        "id": c.id,
+        "name": c.name or "",
+        "age": c.age or "",
+        "tg": tg_at(getattr(c, "tg_username", None)),
+        "paid": bool(c.paid),
+        "schedule_text": c.schedule_text or "",
+        "parent": " · ".join(x for x in (parent_name, parent_phone) if x),
+    } for c, parent_name, parent_phone in page.items]
+    return render_template("children.html", items=items, page=page, **_list_urls(page))
 
 
 @app.route("/children/<int:child_id>/update", methods=["POST"])
@@ -328,26 +443,33 @@ def children_update(child_id: int):
             # эти поля существуют в БД даже если их нет в ORM‑модели
             setattr(c, "paid", paid)
             setattr(c, "schedule_text", schedule_text)
-    return redirect(url_for("children_view"))
+    return redirect(request.referrer or url_for("children_view"))
 
 
 @app.route("/appointments")
 @login_required
 def appointments_view():
-    with db_session() as db:
-        rows = (
-            db.query(Appointment, Child)
-            .outerjoin(Child, Child.id == Appointment.child_id)
-            .order_by(Appointment.id.desc())
-            .all()
+    args = request.args
+    try:
+        cond = listing.date_range(
+            Appointment.created_at, listing.parse_day(args.get("date_from")), listing.parse_day(args.get("date_to"))
         )
-        items = [{
-            "id": a.id,
-            "child_name": (c.name if c else "") or "",
-            "child_tg": tg_at(getattr(c, "tg_username", None) if c else None),
-            "created": (a.created_at.strftime("%d-%m-%Y") if getattr(a, "created_at", None) else ""),
-        } for a, c in rows]
-    return render_template("appointments.html", items=items)
+        if args.get("status"):
+            cond.append(Appointment.status == args["status"])
+        with db_session() as db:
+            stmt = select(Appointment, Child).outerjoin(Child, Child.id == Appointment.child_id).where(*cond)
+            page = listing.paginate(
+                db, stmt, args, {"id": Appointment.id, "created_at": Appointment.created_at}, Appointment.id
+            )
+    except ValueError as e:
+        return str(e), 400
+    items = [{
+        "id": a.id,
+        "child_name": (c.name if c else "") or "",
+        "child_tg": tg_at(getattr(c, "tg_username", None) if c else None),
+        "created": (a.created_at.strftime("%d-%m-%Y") if getattr(a, "created_at", None) else ""),
+    } for a, c in page.items]
+    return render_template("appointments.html", items=items, page=page, **_list_urls(page))
 
 
 @app.route("/messages", methods=["GET", "POST"])
@@ -368,42 +490,34 @@ def messages_view():
         items = db.query(MessageTemplate).all()
     return render_template("messages.html", items=items)
 
-# ---- Экспорт CSV (расширенный)
+# ---- Экспорт CSV / XLSX (потоком, с фильтрами: ?date_from=&date_to=&paid=&lang=)
+def _export_response(chunks, mimetype: str, filename: str) -> Response:
+    return Response(chunks, mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
 @app.route("/export.csv")
 @login_required
 def export_csv():
-    si = StringIO(newline="")
-    writer = csv.writer(si)
-    writer.writerow([
-        "parent_id", "parent_full_name", "phone", "language",
-        "child_id", "child_name", "child_age", "paid"
-    ])
+    try:
+        filters = export.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return _export_response(export.iter_csv(export.iter_rows(**filters)), "text/csv; charset=utf-8", "export.csv")
 
-    with db_session() as db:
-        rows = (
-            db.query(Parent, Child)
-            .join(Child, Child.parent_id == Parent.id, isouter=True)
-            .order_by(Parent.id.asc())
-            .all()
-        )
-        for p, c in rows:
-            writer.writerow([
-                p.id,
-                p.full_name or "",
-                p.phone or "",
-                p.language or "",
-                getattr(c, "id", "") or "",
-                getattr(c, "name", "") or "",
-                getattr(c, "age", "") or "",
-                getattr(c, "paid", 0) or 0,  # колонка может быть вне ORM‑модели
-            ])
-
-    csv_text = si.getvalue()
-    buf = BytesIO()
-    buf.write("\ufeff".encode("utf-8"))  # BOM для Excel
-    buf.write(csv_text.encode("utf-8"))
-    buf.seek(0)
-    return send_file(buf, mimetype="text/csv; charset=utf-8", as_attachment=True, download_name="export.csv")
+
+@app.route("/export.xlsx")
+@login_required
+def export_xlsx():
+    try:
+        filters = export.parse_filters(request.args)
+        chunks = export.iter_xlsx(export.iter_rows(**filters))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    except RuntimeError as e:
+        return jsonify(error=str(e)), 501
+    return _export_response(
+        chunks, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "export.xlsx"
+    )
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
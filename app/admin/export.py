@@ -0,0 +1,112 @@
+"""
+Потоковая выгрузка родителей × детей для админки (/export.csv, /export.xlsx).
+
+Строки идут из БД пачками (yield_per) и сразу уходят в ответ кусками по ~64 КиБ —
+память не растёт с размером таблицы. XLSX пишет XlsxWriter в constant_memory-режиме
+во временный файл (zip собирается только в конце), файл отдаём кусками и удаляем.
+"""
+import csv
+import os
+import tempfile
+from io import StringIO
+from typing import Iterator
+
+from sqlalchemy import select
+
+from app.admin.listing import date_range, parse_day, parse_flag
+from app.core.db import db_session
+from app.core.models import Child, Parent
+
+HEADER = [
+    "parent_id", "parent_full_name", "phone", "language",
+    "child_id", "child_name", "child_age", "paid",
+]
+YIELD_PER = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_filters(args) -> dict:
+    """
+    Фильтры из query string: date_from / date_to (YYYY-MM-DD, включительно, по дате регистрации
+    родителя), paid (1/0 — только оплаченные / неоплаченные дети), lang.
+    ValueError — на кривые значения.
+    """
+    return {
+        "date_from": parse_day(args.get("date_from")),
+        "date_to": parse_day(args.get("date_to")),
+        "paid": parse_flag(args, "paid"),
+        "lang": (args.get("lang") or "").strip() or None,
+    }
+
+
+def _query(date_from=None, date_to=None, paid=None, lang=None):
+    # колонки, а не ORM-объекты: без identity map и по объекту на строку
+    stmt = (
+        select(
+            Parent.id, Parent.full_name, Parent.phone, Parent.language,
+            Child.id, Child.name, Child.age, Child.paid,
+        )
+        .join(Child, Child.parent_id == Parent.id, isouter=True)
+        .order_by(Parent.id.asc(), Child.id.asc())
+    )
+    stmt = stmt.where(*date_range(Parent.created_at, date_from, date_to))
+    if paid is not None:
+        # и для paid=0 нужен сам ребёнок: родители без детей — не «неоплаченные»
+        stmt = stmt.where(Child.paid.is_(True) if paid else (Child.id.isnot(None) & Child.paid.isnot(True)))
+    if lang:
+        stmt = stmt.where(Parent.language == lang)
+    return stmt
+
+
+def iter_rows(**filters) -> Iterator[list]:
+    with db_session() as db:
+        result = db.execute(_query(**filters).execution_options(yield_per=YIELD_PER))
+        for pid, full_name, phone, language, cid, cname, age, paid in result:
+            yield [
+                pid, full_name or "", phone or "", language or "",
+                cid or "", cname or "", age or "", 1 if paid else 0,
+            ]
+
+
+def iter_csv(rows: Iterator[list]) -> Iterator[bytes]:
+    buf = StringIO(newline="")
+    writer = csv.writer(buf)
+    buf.write("\ufeff")  # BOM для Excel
+    writer.writerow(HEADER)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def iter_xlsx(rows: Iterator[list]) -> Iterator[bytes]:
+    """RuntimeError без XlsxWriter — сразу, до начала ответа."""
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise RuntimeError("XLSX-выгрузка требует пакет XlsxWriter: pip install XlsxWriter")
+    return _xlsx_chunks(xlsxwriter, rows)
+
+
+def _xlsx_chunks(xlsxwriter, rows: Iterator[list]) -> Iterator[bytes]:
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        # constant_memory: строка пишется во временный файл сразу, в памяти — только текущая
+        wb = xlsxwriter.Workbook(path, {"constant_memory": True})
+        ws = wb.add_worksheet("export")
+        ws.write_row(0, 0, HEADER)
+        for i, row in enumerate(rows, start=1):
+            ws.write_row(i, 0, row)
+        wb.close()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
@@ -0,0 +1,142 @@
+"""
+Списки админки: фильтры из query string и keyset-пагинация (без OFFSET и COUNT).
+
+Страница — `limit` строк, отсортированных по (колонка сортировки, id). Курсор `after` — значения
+этой пары у последней строки; следующая страница — WHERE (col, id) < (:v, :id) по индексу
+(col, id), сколько бы страниц ни было до неё. NULL в колонке сортировки считается меньше любого
+значения: при -col такие строки идут в конце, при col — в начале (NULLS LAST / NULLS FIRST явно,
+у SQLite и Postgres умолчания разные), курсор с NULL продолжает по id внутри этого хвоста.
+
+    page = paginate(db, select(Lead).where(...), request.args, {"id": Lead.id, "created_at": Lead.created_at}, Lead.id)
+    page.items, page.next_after
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import DateTime, and_, or_, tuple_
+
+from app.core.phone import to_e164
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+@dataclass
+class Page:
+    items: list
+    next_after: Optional[str]
+    sort: str
+    limit: int
+
+
+# ====== разбор параметров ======
+def parse_day(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"bad date {value!r}, expected YYYY-MM-DD")
+
+
+def parse_flag(args, name: str) -> Optional[bool]:
+    """?name=1 / ?name=0 / нет параметра (None)."""
+    value = args.get(name, "")
+    if value not in ("", "0", "1"):
+        raise ValueError(f"{name} must be 0 or 1")
+    return None if value == "" else value == "1"
+
+
+def parse_limit(args, default: int = DEFAULT_LIMIT) -> int:
+    try:
+        limit = int(args.get("limit", default))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(MAX_LIMIT, limit))
+
+
+def parse_search(args) -> tuple[str, list[str]]:
+    """
+    ?q= -> (строка, варианты телефона). Похожее на телефон ищем точным совпадением по индексу:
+    E.164 и он же без «+» — бот хранит номера родителей/детей как прислал Telegram.
+    """
+    q = (args.get("q") or "").strip()
+    if not any(ch.isdigit() for ch in q):
+        return q, []
+    try:
+        phone = to_e164(q)
+    except ValueError:
+        return q, []
+    return q, [phone, phone[1:]]
+
+
+def date_range(column, date_from: Optional[date], date_to: Optional[date]) -> list:
+    """Условия на column по дням, обе границы включительно."""
+    cond = []
+    if date_from:
+        cond.append(column >= datetime.combine(date_from, time.min))
+    if date_to:
+        cond.append(column < datetime.combine(date_to + timedelta(days=1), time.min))
+    return cond
+
+
+# ====== keyset ======
+def _encode(value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str, column) -> tuple[Any, int]:
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(column.type, DateTime) and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("bad cursor")
+
+
+def paginate(db, stmt, args, sorts: dict, id_col, default_sort: str = "-id") -> Page:
+    """
+    stmt — select без ORDER BY/LIMIT. sorts — {имя: колонка}; ?sort=created_at или ?sort=-created_at.
+    ValueError — на неизвестную сортировку, кривой limit или курсор.
+    """
+    sort = args.get("sort") or default_sort
+    desc = sort.startswith("-")
+    col = sorts.get(sort.lstrip("-"))
+    if col is None:
+        raise ValueError(f"sort must be one of: {', '.join(sorted(sorts))} (prefix '-' for descending)")
+    limit = parse_limit(args)
+
+    # created_at и т.п. в моделях nullable — строки с NULL не должны пропадать после первой страницы
+    nullable = col is not id_col and getattr(col.expression, "nullable", True)
+
+    after = args.get("after")
+    if after:
+        value, last_id = _decode(after, col)
+        if col is id_col:
+            stmt = stmt.where(id_col < last_id if desc else id_col > last_id)
+        elif value is None:
+            tail = and_(col.is_(None), id_col < last_id if desc else id_col > last_id)
+            stmt = stmt.where(tail if desc else or_(tail, col.isnot(None)))
+        else:
+            key, bound = tuple_(col, id_col), tuple_(value, last_id)
+            cond = key < bound if desc else key > bound
+            stmt = stmt.where(or_(cond, col.is_(None)) if desc and nullable else cond)
+
+    n = len(stmt.column_descriptions)  # сущностей/колонок в строке результата
+    if desc:
+        order = (col.desc().nulls_last() if nullable else col.desc(), id_col.desc())
+    else:
+        order = (col.asc().nulls_first() if nullable else col.asc(), id_col.asc())
+    rows = db.execute(stmt.add_columns(col, id_col).order_by(*order).limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [r[0] if n == 1 else tuple(r[:n]) for r in rows]
+    next_after = _encode(rows[-1][n], rows[-1][n + 1]) if more else None
+    return Page(items=items, next_after=next_after, sort=sort, limit=limit)
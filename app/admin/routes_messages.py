@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.admin.forms import BroadcastForm
+from app.admin.auth import login_required
 from app.core.db import db_session
-from app.services.telegram_broadcast import broadcast_message
+from app.core.models import BroadcastJob
+from app.services.broadcast_jobs import enqueue_broadcast, job_progress
 
 bp_messages = Blueprint(
     "messages",
@@ -14,9 +16,22 @@ bp_messages = Blueprint(
 def messages():
     form = BroadcastForm(request.form)
     if request.method == "POST" and form.validate():
+        # рассылку выполняет фоновый воркер (app.services.broadcast_jobs), здесь — только постановка в очередь
         with db_session() as db:
-            stats = broadcast_message(db, audience=form.audience.data, text=form.text.data)
-        flash(f"Отправлено: {stats['sent']}, ошибок: {stats['failed']}", "success")
-        return redirect(url_for("messages.messages"))
+            job = enqueue_broadcast(db, audience=form.audience.data, text=form.text.data)
+            job_id, total = job.id, job.total
+        flash(f"Рассылка #{job_id} поставлена в очередь, получателей: {total}", "success")
+        return redirect(url_for("messages.messages", job=job_id))
     # ВАЖНО: имя файла без префикса "admin/"
-    return render_template("messages.html", form=form)
\ No newline at end of file
+    return render_template("messages.html", form=form, job_id=request.args.get("job", type=int))
+
+
+@bp_messages.get("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id: int):
+    # прогресс для поллинга со страницы сообщений
+    with db_session() as db:
+        job = db.get(BroadcastJob, job_id)
+        if not job:
+            return jsonify(error="not found"), 404
+        return jsonify(job_progress(job))
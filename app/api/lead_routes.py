@@ -1,15 +1,40 @@
-from fastapi import APIRouter, Depends, status, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, field_validator, ConfigDict
+from pydantic import BaseModel, field_validator, ConfigDict, ValidationError
 from datetime import datetime, timedelta
-from sqlalchemy import and_
-from typing import Optional
-from app.core.db import get_db
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import hmac
+import json
+import math
+import threading
+from app.core import metrics, stats
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import db_session, get_async_db, get_db
 from app.core.models import Lead
-from app.services.telegram_notify import notify_new_lead
+from app.core.phone import to_e164
+from app.core.ratelimit import create_rate_limiter
+from app.services.telegram_notify import DISPATCHER, enqueue_notification, notify_new_lead
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession  # нужен greenlet — только при DB_ASYNC
 
 router = APIRouter(prefix="/api", tags=["leads"])
 
+# E.164 -> LeadOut последней заявки: повтор в течение LEAD_RECENT_CACHE_TTL отвечаем без БД
+RECENT_LEADS = TTLCache(ttl=settings.LEAD_RECENT_CACHE_TTL, max_size=settings.LEAD_RECENT_CACHE_MAX_SIZE)
+metrics.watch_cache("recent_leads", RECENT_LEADS)
+# rate(leads_total{result="created"}[5m]) — темп приёма заявок
+LEADS = metrics.counter("leads_total", "Заявки по исходу: created | duplicate | rate_limited | invalid", ["result"])
+# одинаковые номера в этом процессе обрабатываем по очереди, иначе двойной клик успеет вставить две заявки
+_PHONE_LOCKS = [threading.Lock() for _ in range(64)]
+_ASYNC_PHONE_LOCKS = [asyncio.Lock() for _ in range(64)]   # то же для async-роутов (DB_ASYNC)
+
 # ====== схемы ======
 class LeadCreate(BaseModel):
     # обязательные
@@ -37,7 +62,7 @@ class LeadCreate(BaseModel):
     @field_validator("phone")
     @classmethod
     def normalize_phone(cls, v: str) -> str:
-        return v.replace(" ", "").replace("-", "")
+        return to_e164(v)
 
     @field_validator("tg_username")
     @classmethod
@@ -130,45 +155,106 @@ def _to_out(lead: Lead) -> LeadOut:
 
 
 # ====== JSON endpoint ======
-@router.post("/leads", response_model=LeadOut, status_code=status.HTTP_201_CREATED)
-def create_lead(payload: LeadCreate, db: Session = Depends(get_db)):
-    # (необязательно) анти-дубль: та же труба за последние 60 минут в статусе new
-    try:
-        one_hour_ago = datetime.utcnow() - timedelta(minutes=60)
-        dup = (
-            db.query(Lead)
-            .filter(
-                and_(
-                    Lead.phone == payload.phone,
-                    getattr(Lead, "status", "new") == "new",
-                    getattr(Lead, "created_at", one_hour_ago) >= one_hour_ago,
-                )
+def _duplicate_stmt(phone: str):
+    """Та же труба за LEAD_DEDUP_WINDOW в статусе new — по индексу ix_leads_phone_status_created."""
+    since = datetime.utcnow() - timedelta(seconds=settings.LEAD_DEDUP_WINDOW)
+    return (
+        select(Lead)
+        .where(Lead.phone == phone, Lead.status == "new", Lead.created_at >= since)
+        .order_by(Lead.created_at.desc())
+        .limit(1)
+    )
+
+
+def _find_duplicate(db: Session, phone: str) -> Optional[Lead]:
+    return db.execute(_duplicate_stmt(phone)).scalars().first()
+
+
+# ====== лимиты частоты (эндпоинты публичные, без авторизации) ======
+LIMITER = create_rate_limiter()
+
+
+def _client_ip(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _enforce_limits(request: Request, phone: Optional[str] = None) -> None:
+    """429 + Retry-After, если IP или телефон превысили лимит. Проверка — в памяти, до любых запросов в БД."""
+    checks = [("ip:" + _client_ip(request), settings.LEAD_RATE_LIMIT_IP, settings.LEAD_RATE_LIMIT_IP_WINDOW)]
+    if phone:
+        checks.append(("phone:" + phone, settings.LEAD_RATE_LIMIT_PHONE, settings.LEAD_RATE_LIMIT_PHONE_WINDOW))
+    for key, limit, window in checks:
+        if limit <= 0:
+            continue
+        wait = LIMITER.hit(key, limit, window)
+        if wait:
+            LEADS.inc(result="rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
             )
-            .first()
-        )
+
+
+def create_lead(payload: LeadCreate, request: Request, db: Session = Depends(get_db)):
+    # анти-дубль: сначала память процесса, потом БД. Повтор (двойной клик, ретрай клиента)
+    # отвечаем из кэша до лимитера — он не должен съедать квоту телефона и получать 429
+    cached = RECENT_LEADS.get(payload.phone)
+    if cached is not None:
+        LEADS.inc(result="duplicate")
+        return cached
+    _enforce_limits(request, payload.phone)
+
+    with _PHONE_LOCKS[hash(payload.phone) % len(_PHONE_LOCKS)]:
+        cached = RECENT_LEADS.get(payload.phone)  # пока ждали — соседний запрос мог уже создать
+        if cached is not None:
+            LEADS.inc(result="duplicate")
+            return cached
+
+        dup = _find_duplicate(db, payload.phone)
         if dup:
-            return _to_out(dup)
-    except Exception:
-        # если в модели нет status/created_at — тихо пропускаем
-        pass
+            out = _to_out(dup)
+            RECENT_LEADS.set(payload.phone, out)
+            LEADS.inc(result="duplicate")
+            return out
 
-    lead = Lead(**_lead_kwargs(payload))
-    db.add(lead)
-    db.commit()          # фиксируем изменения
-    db.refresh(lead)     # подтягиваем дефолты/таймстампы
+        lead = Lead(**_lead_kwargs(payload))
+        db.add(lead)
+        notify_new_lead(db, lead)  # outbox: уведомления админам коммитятся вместе с заявкой
+        db.commit()          # фиксируем изменения
+        db.refresh(lead)     # подтягиваем дефолты/таймстампы
+        out = _to_out(lead)
+        RECENT_LEADS.set(payload.phone, out)
+        LEADS.inc(result="created")
 
-    try:
-        # уведомляем уже ПОСЛЕ успешного коммита
-        notify_new_lead(lead)
-    except Exception:
-        pass
+    # отправит фоновый диспетчер; ответ Telegram не ждёт
+    DISPATCHER.wake()
 
-    return _to_out(lead)
+    return out
 
 
 # ====== endpoint для формы (x-www-form-urlencoded) ======
-@router.post("/leads-form", response_model=LeadOut, status_code=status.HTTP_201_CREATED)
+def _form_payload(name: str, phone: str, age: str | None, tg_username: str | None, comment: str | None) -> LeadCreate:
+    try:
+        return LeadCreate(
+            name=name,
+            phone=phone,
+            age=age,
+            comment=comment,
+            tg_username=tg_username,
+            source="site",
+        )
+    except ValidationError as e:
+        # тот же 422, что и у JSON-эндпоинта, а не 500
+        raise RequestValidationError(e.errors())
+
+
 def create_lead_form(
+    request: Request,
     name: str = Form(...),
     phone: str = Form(...),
     age: str | None = Form(None),
@@ -176,12 +262,232 @@ def create_lead_form(
     comment: str | None = Form(None),       # для обратной совместимости
     db: Session = Depends(get_db),
 ):
-    payload = LeadCreate(
-        name=name,
-        phone=phone,
-        age=age,
-        comment=comment,
-        tg_username=tg_username,
-        source="site",
-    )
-    return create_lead(payload, db)
\ No newline at end of file
+    payload = _form_payload(name, phone, age, tg_username, comment)
+    return create_lead(payload, request, db)
+
+
+# ====== async-версии (DB_ASYNC): запрос не держит поток пула, пока ждёт БД ======
+async def _find_duplicate_async(db: "AsyncSession", phone: str) -> Optional[Lead]:
+    return (await db.execute(_duplicate_stmt(phone))).scalars().first()
+
+
+async def create_lead_async(payload: LeadCreate, request: Request, db: "AsyncSession" = Depends(get_async_db)):
+    cached = RECENT_LEADS.get(payload.phone)   # повтор — до лимитера, как в create_lead
+    if cached is not None:
+        LEADS.inc(result="duplicate")
+        return cached
+    _enforce_limits(request, payload.phone)
+
+    async with _ASYNC_PHONE_LOCKS[hash(payload.phone) % len(_ASYNC_PHONE_LOCKS)]:
+        cached = RECENT_LEADS.get(payload.phone)
+        if cached is not None:
+            LEADS.inc(result="duplicate")
+            return cached
+
+        dup = await _find_duplicate_async(db, payload.phone)
+        if dup:
+            out = _to_out(dup)
+            RECENT_LEADS.set(payload.phone, out)
+            LEADS.inc(result="duplicate")
+            return out
+
+        lead = Lead(**_lead_kwargs(payload))
+        db.add(lead)
+        await db.run_sync(notify_new_lead, lead)  # outbox — тот же sync-код в той же транзакции
+        await db.commit()
+        await db.refresh(lead)
+        out = _to_out(lead)
+        RECENT_LEADS.set(payload.phone, out)
+        LEADS.inc(result="created")
+
+    DISPATCHER.wake()
+    return out
+
+
+async def create_lead_form_async(
+    request: Request,
+    name: str = Form(...),
+    phone: str = Form(...),
+    age: str | None = Form(None),
+    tg_username: str | None = Form(None),
+    comment: str | None = Form(None),
+    db: "AsyncSession" = Depends(get_async_db),
+):
+    payload = _form_payload(name, phone, age, tg_username, comment)
+    return await create_lead_async(payload, request, db)
+
+
+# sync-обработчики FastAPI гоняет в пуле потоков (40 по умолчанию) — при DB_ASYNC берём async-версии
+_LEAD_ROUTE = dict(methods=["POST"], response_model=LeadOut, status_code=status.HTTP_201_CREATED)
+router.add_api_route("/leads", create_lead_async if settings.DB_ASYNC else create_lead, **_LEAD_ROUTE)
+router.add_api_route("/leads-form", create_lead_form_async if settings.DB_ASYNC else create_lead_form, **_LEAD_ROUTE)
+
+# ====== пакетная загрузка (рекламные кабинеты, партнёрские формы) ======
+_BULK_IN_CHUNK = 5000  # телефонов в одном IN (...) — ниже лимита переменных SQLite
+_BAD_JSON = object()
+_LEAD_HAS_TG_USERNAME = hasattr(Lead, "tg_username")
+
+
+def _parse_bulk(body: bytes, ndjson: bool) -> list:
+    if ndjson:
+        items = []
+        for line in body.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(_BAD_JSON)  # битая строка — ошибка этого элемента, а не всего пакета
+        return items
+    try:
+        items = json.loads(body or b"[]")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid JSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="expected a JSON array")
+    return items
+
+
+def _bulk_row(payload: LeadCreate, now: datetime) -> dict:
+    # executemany требует одинаковый набор колонок у всех строк; hasattr-ы _lead_kwargs
+    # на десятках тысяч строк заметны, поэтому строку собираем напрямую
+    row = {
+        "name": payload.name,
+        "phone": payload.phone,
+        "comment": payload.comment or "",
+        "age": payload.age,
+        "source": payload.source or "site",
+        "ref_code": payload.ref_code or "",
+        "status": "new",
+        "processed": False,
+        "created_at": now,
+    }
+    if _LEAD_HAS_TG_USERNAME:
+        row["tg_username"] = payload.tg_username
+    return row
+
+
+def _insert_bulk(db: Session, rows: list[dict]) -> dict[str, int]:
+    """Вставить пакет, вернуть телефон -> id. Телефоны в пакете уникальны — по ним и сопоставляем."""
+    table = Lead.__table__
+    if db.get_bind().dialect.insert_executemany_returning:
+        # SQLite 3.35+ / PostgreSQL: INSERT ... VALUES (...), (...) RETURNING пачками; id берём из
+        # ответа этого же запроса — строки соседнего пакета с тем же created_at сюда не попадут
+        return dict(db.execute(insert(table).returning(table.c.phone, table.c.id), rows).all())
+    return {row["phone"]: db.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows}
+
+
+def _ingest_bulk(items: list) -> dict:
+    results: list = [None] * len(items)
+    first_by_phone: dict[str, int] = {}   # телефон -> индекс первой строки в пакете
+    valid: list[tuple[int, LeadCreate]] = []
+    invalid = 0
+    for i, raw in enumerate(items):
+        if not isinstance(raw, dict):
+            msg = "invalid JSON" if raw is _BAD_JSON else "expected a JSON object"
+            results[i] = {"index": i, "status": "invalid", "errors": [{"msg": msg}]}
+            invalid += 1
+            continue
+        try:
+            payload = LeadCreate.model_validate(raw)
+        except ValidationError as e:
+            results[i] = {"index": i, "status": "invalid",
+                          "errors": e.errors(include_url=False, include_context=False, include_input=False)}
+            invalid += 1
+            continue
+        if payload.phone in first_by_phone:
+            results[i] = {"index": i, "status": "duplicate", "of": "batch", "first": first_by_phone[payload.phone]}
+            continue
+        first_by_phone[payload.phone] = i
+        valid.append((i, payload))
+
+    now = datetime.utcnow()
+    since = now - timedelta(seconds=settings.LEAD_DEDUP_WINDOW)
+    phones = list(first_by_phone)
+    existing: dict[str, int] = {}
+    created = 0
+    with db_session() as db:
+        for start in range(0, len(phones), _BULK_IN_CHUNK):
+            chunk = phones[start:start + _BULK_IN_CHUNK]
+            existing.update(
+                db.query(Lead.phone, Lead.id)
+                .filter(Lead.phone.in_(chunk), Lead.status == "new", Lead.created_at >= since)
+                .all()
+            )
+
+        fresh = [(i, p) for i, p in valid if p.phone not in existing]
+        for i, p in valid:
+            if p.phone in existing:
+                results[i] = {"index": i, "status": "duplicate", "of": "db", "id": existing[p.phone]}
+        if fresh:
+            ids = _insert_bulk(db, [_bulk_row(p, now) for _, p in fresh])
+            for i, p in fresh:
+                results[i] = {"index": i, "status": "created", "id": ids.get(p.phone)}
+            created = len(fresh)
+            # Core insert мимо событий ORM — счётчики дашборда прибавляем сами
+            row = {"processed": False, "parent_id": None, "created_at": now}
+            stats.add(db, {key: created for key in stats.keys_for("leads", row)})
+            sources = sorted({p.source or "site" for _, p in fresh})
+            enqueue_notification(
+                db,
+                f"📥 Пакет заявок ({', '.join(sources)}): новых {created}, "
+                f"дублей {len(items) - created - invalid}, с ошибками {invalid}",
+            )
+
+    LEADS.inc(created, result="created")
+    LEADS.inc(len(items) - created - invalid, result="duplicate")
+    LEADS.inc(invalid, result="invalid")
+
+    # строки-дубли внутри пакета получают id той, на которую ссылаются
+    for r in results:
+        if r["status"] == "duplicate" and r.get("of") == "batch":
+            r["id"] = results[r.pop("first")].get("id")
+    return {
+        "total": len(items),
+        "created": created,
+        "duplicates": len(items) - created - invalid,
+        "invalid": invalid,
+        "items": results,
+    }
+
+
+def _check_bulk_token(request: Request) -> None:
+    """Пакет — до LEAD_BULK_MAX_ITEMS строк за вызов: только интеграциям с LEAD_BULK_TOKEN."""
+    token = settings.LEAD_BULK_TOKEN
+    if not token:
+        raise HTTPException(status_code=403, detail="bulk ingest is disabled")
+    given = request.headers.get("authorization", "")
+    if not hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="invalid token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.post("/leads/bulk")
+async def create_leads_bulk(request: Request):
+    """
+    Пакет заявок: JSON-массив или NDJSON (Content-Type: application/x-ndjson), каждая строка — как в POST /api/leads.
+    Нужен Authorization: Bearer <LEAD_BULK_TOKEN>; тело — не больше LEAD_BULK_MAX_BYTES.
+    Антидубль внутри пакета и по БД одним запросом, вставка одним executemany, одно сводное уведомление.
+    Ответ — итоги и результат по каждой строке (created / duplicate / invalid).
+    """
+    _check_bulk_token(request)
+    _enforce_limits(request)
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    limit = settings.LEAD_BULK_MAX_BYTES
+    too_large = HTTPException(status_code=413, detail=f"body too large (max {limit} bytes)")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:  # без Content-Length (chunked) — режем по ходу чтения
+            raise too_large
+    items = _parse_bulk(bytes(body), ndjson)
+    if len(items) > settings.LEAD_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"too many items (max {settings.LEAD_BULK_MAX_ITEMS})")
+    # валидация и БД — в пуле потоков, event loop не блокируем
+    result = await run_in_threadpool(_ingest_bulk, items)
+    if result["created"]:
+        DISPATCHER.wake()
+    return JSONResponse(result)  # без jsonable_encoder: в ответе только простые типы
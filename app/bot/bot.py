@@ -1,120 +1,86 @@
-from telebot import TeleBot, types, apihelper
-from core.config import settings
-from core.db import Base, engine, db_session
-from core.i18n import t
-from core.utils import get_or_create_parent, add_child, list_children, create_appointment
-from core.models import Parent, Child
-from datetime import datetime, timedelta, UTC
-from sqlalchemy import text as sql_text
+from telebot import TeleBot, types
+from app.core.config import settings
+from app.core.db import SessionLocal, init_db, start_sqlite_maintenance
+from app.core import i18n  # индексы кнопок — через модуль: compile_i18n()/update_i18n() их подменяют
+from app.core.i18n import t
+from app.core.utils import get_or_create_parent, add_child, list_children, create_appointment
+from app.core.models import Parent, Child
+from app.core.cache import DedupCache
+from app.core.identity import IDENTITIES, Identity, start_identity_sync
+from app.core import metrics, sqltrace
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+from dataclasses import replace
+from functools import wraps
+from typing import Optional
 import threading, time, traceback, requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from app.bot.client import get_client
+from app.bot.dispatcher import UpdateDispatcher
+from app.bot.state import create_state_store
+from app.bot import keyboards
+from app.bot.keyboards import (
+    step_kb, lang_kb, phone_kb, kid_phone_kb, no_child_kb, child_added_kb,
+    after_sign_kb, main_parent_kb, kid_main_kb, schedule_inline,
+)
 
 
 # невидимый разделитель сменить клаву не выводя текст
 _ZWSP = '\u2063'
 
 
-# Сессия requests с ретраями и backoff
-_session = requests.Session()
-_retry = Retry(
-    total=5,
-    connect=5,
-    read=5,
-    backoff_factor=0.5,            # 0.5s, 1s, 2s, ...
-    status_forcelist=(429, 500, 502, 503, 504),
-    raise_on_status=False,
-)
-_adapter = HTTPAdapter(max_retries=_retry, pool_connections=100, pool_maxsize=100)
-_session.mount("https://", _adapter)
-_session.mount("http://", _adapter)
-
-# Подсовываем сессию и таймауты самому apihelper
-apihelper.SESSION = _session
-apihelper.READ_TIMEOUT = 120
-apihelper.CONNECT_TIMEOUT = 10
-
 # Telegram allowed_updates — contact приходит в типе message, отдельный тип не нужен
 _ALLOWED_UPDATES = ["message", "callback_query"]
 
+# Создаются в create_bot(): импорт модуля ничего не делает с БД и сетью
+bot: Optional[TeleBot] = None
+dispatcher: Optional[UpdateDispatcher] = None
+_create_lock = threading.Lock()
 
 # ──────────────────────────────
-# Таблицы (на случай отдельного запуска)
+# FSM + антидубль входящих (+ анти‑дабл старт)
 # ──────────────────────────────
-Base.metadata.create_all(bind=engine)
+STATE = create_state_store()  # tg_id -> {"step": str, ...}; бэкенд и TTL — из настроек BOT_STATE_*
 
-# ──────────────────────────────
-# Грубая миграция недостающих колонок (SQLite) — без Alembic
-# ──────────────────────────────
-def _ensure_children_columns():
-    with engine.begin() as conn:
-        # parents.phone
-        pcols = {row[1] for row in conn.execute(sql_text("PRAGMA table_info(parents)"))}
-        if "phone" not in pcols:
-            conn.execute(sql_text("ALTER TABLE parents ADD COLUMN phone VARCHAR"))
-
-        # children.*
-        ccols = {row[1] for row in conn.execute(sql_text("PRAGMA table_info(children)"))}
-        if "tg_id" not in ccols:
-            conn.execute(sql_text("ALTER TABLE children ADD COLUMN tg_id VARCHAR"))
-        if "schedule_text" not in ccols:
-            conn.execute(sql_text("ALTER TABLE children ADD COLUMN schedule_text TEXT"))
-        if "paid" not in ccols:
-            conn.execute(sql_text("ALTER TABLE children ADD COLUMN paid BOOLEAN DEFAULT 0"))
-        if "phone" not in ccols:
-            conn.execute(sql_text("ALTER TABLE children ADD COLUMN phone VARCHAR"))
-
-_ensure_children_columns()
+_TTL_SECONDS = 120
+SEEN_MSG = DedupCache(ttl=_TTL_SECONDS, max_size=50000)       # (chat_id, message_id)
+SEEN_CALLBACK = DedupCache(ttl=_TTL_SECONDS, max_size=50000)  # callback_id
+LAST_START_AT = DedupCache(ttl=1.0, max_size=50000)           # tg_id, анти-дабл /start
 
-# ──────────────────────────────
-# Токен бота
-# ──────────────────────────────
-if not settings.BOT_TOKEN or settings.BOT_TOKEN.startswith("000000000"):
-    raise RuntimeError("BOT_TOKEN не задан. Заполни .env по образцу .env.example")
+def _seen_message(m: types.Message) -> bool:
+    return SEEN_MSG.seen((m.chat.id, m.message_id))
 
-bot = TeleBot(settings.BOT_TOKEN, parse_mode="HTML", threaded=True)
+def _seen_callback(c: types.CallbackQuery) -> bool:
+    return SEEN_CALLBACK.seen(c.id)
 
 # ──────────────────────────────
-# FSM + антидубль входящих (+ анти‑дабл старт)
+# Метрики (app.core.metrics)
 # ──────────────────────────────
-STATE = {}  # {tg_id: {"step": str, ...}}
+UPDATE_SECONDS = metrics.histogram("bot_update_duration_seconds", "Время обработки апдейта хендлером", ["handler"])
+UPDATE_ERRORS = metrics.counter("bot_update_errors_total", "Апдейты, упавшие с исключением", ["handler"])
+SEND_SECONDS = metrics.histogram("telegram_send_duration_seconds", "Время отправки из хендлера (с повторами транспорта)", ["method"])
+SEND_ERRORS = metrics.counter(
+    "telegram_send_errors_total", "Ошибки отправки из хендлера: timeout — таймаут, other — прочие", ["method", "error"]
+)
 
-_TTL_SECONDS = 120
-_SEEN_LOCK = threading.Lock()
-SEEN_MSG = {}       # {(chat_id, message_id): ts}
-SEEN_CALLBACK = {}  # {callback_id: ts}
-LAST_START_AT = {}  # {tg_id: ts}
+for _name, _cache in (("seen_msg", SEEN_MSG), ("seen_callback", SEEN_CALLBACK),
+                      ("last_start", LAST_START_AT), ("identities", IDENTITIES)):
+    metrics.watch_cache(_name, _cache)
 
-def _now() -> float: return time.time()
 
-def _gc_seen():
-    now = _now()
-    for d in (SEEN_MSG, SEEN_CALLBACK):
-        stale = [k for k, ts in d.items() if now - ts > _TTL_SECONDS]
-        for k in stale:
-            d.pop(k, None)
+def _bot_metrics() -> list[str]:
+    # len(STATE) у sqlite/redis — запрос к хранилищу, но только раз на scrape
+    lines = metrics.gauge_family("bot_fsm_states", "Пользователей с активным шагом FSM", [({}, len(STATE))])
+    if dispatcher is not None:
+        st = dispatcher.stats()
+        lines += metrics.gauge_family("bot_dispatcher_queued", "Апдейтов в очередях воркеров", [({}, st["queued"])])
+        lines += metrics.gauge_family(
+            "bot_dispatcher_updates_total", "Апдейты диспетчера по исходу",
+            [({"result": k}, st[k]) for k in ("processed", "rejected", "errors")], "counter",
+        )
+    return lines
 
-def _seen_message(m: types.Message) -> bool:
-    key = (m.chat.id, m.message_id)
-    with _SEEN_LOCK:
-        _gc_seen()
-        if key in SEEN_MSG:
-            return True
-        SEEN_MSG[key] = _now()
-    return False
 
-def _seen_callback(c: types.CallbackQuery) -> bool:
-    key = c.id
-    with _SEEN_LOCK:
-        _gc_seen()
-        if key in SEEN_CALLBACK:
-            return True
-        SEEN_CALLBACK[key] = _now()
-    return False
-
-def _set(uid, **data): STATE[uid] = {**STATE.get(uid, {}), **data}
-def _get(uid): return STATE.get(uid, {})
-def _clear(uid): STATE.pop(uid, None)
+metrics.REGISTRY.collector("bot", _bot_metrics)
 
 # ──────────────────────────────
 # ---- утилиты ----
@@ -130,10 +96,6 @@ def _looks_like_phone(s: str) -> bool:
     s = _normalize_phone(s)
     return len(s) >= 7  # простая валидация
 
-def _set_child_phone(child_id: int, phone: str):
-    with engine.begin() as conn:
-        conn.execute(sql_text("UPDATE children SET phone=:p WHERE id=:id"), {"p": phone, "id": child_id})
-
 def _first_name(full_name: str) -> str:
     parts = (full_name or "").strip().split()
     if not parts:
@@ -194,525 +156,562 @@ def _admin_ids() -> list[int]:
     return sorted(ids)
 
 # ──────────────────────────────
-# Клавиатуры
+# Единица работы на апдейт
 # ──────────────────────────────
 
-def step_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "btn_back")))
-    kb.add(types.KeyboardButton(t(lang, "main_menu")))
-    return kb
-
-def lang_kb():
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    kb.add(types.KeyboardButton("Русский"), types.KeyboardButton("O'zbekcha"))
-    return kb
-
-def phone_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "btn_share_phone"), request_contact=True))
-    kb.add(types.KeyboardButton(t(lang, "btn_back")))
-    kb.add(types.KeyboardButton(t(lang, "main_menu")))
-    return kb
-
-def kid_phone_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "btn_share_phone"), request_contact=True))
-    kb.add(types.KeyboardButton(t(lang, "btn_back")))
-    return kb
-
-def no_child_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "btn_create_child")))
-    kb.add(types.KeyboardButton(t(lang, "btn_help")))
-    kb.add(types.KeyboardButton(t(lang, "btn_back")))
-    return kb
-
-def child_added_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "btn_sign")))
-    kb.add(types.KeyboardButton(t(lang, "btn_help")))
-    kb.add(types.KeyboardButton(t(lang, "btn_back")))
-    return kb
-
-def after_sign_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "main_menu")))
-    return kb
-
-def main_parent_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(
-        types.KeyboardButton(t(lang, "btn_sign")),
-        types.KeyboardButton(t(lang, "btn_schedule"))
-    )
-    kb.add(
-        types.KeyboardButton(t(lang, "btn_prices")),
-        types.KeyboardButton(t(lang, "btn_my_children"))
-    )
-    kb.add(types.KeyboardButton(t(lang, "btn_create_child")))
-    kb.add(types.KeyboardButton(t(lang, "btn_pay")))
-    kb.add(types.KeyboardButton(t(lang, "btn_help")))
-    return kb
-
-def kid_main_kb(lang: str):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(types.KeyboardButton(t(lang, "kid_schedule")))
-    kb.add(types.KeyboardButton(t(lang, "kid_help")))
-    return kb
-
-def schedule_inline(lang: str):
-    kb = types.InlineKeyboardMarkup()
-    for time_label in ("Пн 17:00", "Ср 17:00", "Пт 17:00"):
-        kb.add(types.InlineKeyboardButton(text=time_label, callback_data=f"sign:{time_label}"))
-    return kb
+class UpdateContext:
+    """
+    Всё, что хендлеру нужно о пользователе, в рамках одного апдейта:
+    одна сессия БД (открывается лениво) и один коммит в конце;
+    личность (ребёнок/родитель, язык, есть ли дети) берётся из IDENTITIES, FSM-шаг читается один раз,
+    изменённый FSM-шаг пишется один раз — в commit(), в той же транзакции.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._db: Session | None = None
+        self._identity: Identity | None = None
+        self._kid: Child | None = None
+        self._parent: Parent | None = None
+        self._state: dict | None = None
+        self._state_dirty = False
+
+    # ---- БД
+    @property
+    def db(self) -> Session:
+        if self._db is None:
+            self._db = SessionLocal()
+        return self._db
+
+    def commit(self) -> None:
+        if self._state_dirty:
+            if self._state:
+                STATE.set(self.user_id, self._state, db=self.db)
+            else:
+                STATE.delete(self.user_id, db=self.db)
+            self._state_dirty = False
+        if self._db is not None:
+            self._db.commit()
+
+    def rollback(self) -> None:
+        if self._db is not None:
+            self._db.rollback()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # ---- личность (кэш IDENTITIES; в БД идём только на промахе)
+    @property
+    def identity(self) -> Identity:
+        if self._identity is None:
+            ident = IDENTITIES.get(self.user_id)
+            if ident is None:
+                ident = self._load_identity()
+                IDENTITIES.put(self.user_id, ident)
+            self._identity = ident
+        return self._identity
+
+    def _load_identity(self) -> Identity:
+        tg_id = str(self.user_id)
+
+        row = (self.db.query(Child, Parent.language)
+               .outerjoin(Parent, Parent.id == Child.parent_id)
+               .filter(Child.tg_id == tg_id)
+               .first())
+        if row:
+            self._kid, lang = row
+            return Identity("kid", lang or settings.DEFAULT_LANG, parent_id=self._kid.parent_id,
+                            child_id=self._kid.id, name=self._kid.name or "")
+
+        has_child = exists().where(Child.parent_id == Parent.id)
+        row = self.db.query(Parent, has_child).filter(Parent.tg_id == tg_id).first()
+        if row:
+            self._parent = row[0]
+            return Identity("parent", self._parent.language or settings.DEFAULT_LANG,
+                            parent_id=self._parent.id, has_child=bool(row[1]),
+                            name=self._parent.full_name or "")
+
+        return Identity("new", settings.DEFAULT_LANG)
+
+    @property
+    def is_kid(self) -> bool:
+        return self.identity.role == "kid"
+
+    @property
+    def is_parent(self) -> bool:
+        return self.identity.role == "parent"
+
+    @property
+    def lang(self) -> str:
+        """Язык общения: у ребёнка — язык его родителя."""
+        return self.identity.language
+
+    @property
+    def name(self) -> str:
+        return self.identity.name
+
+    @property
+    def has_child(self) -> bool:
+        return self.identity.has_child
+
+    @property
+    def kid(self) -> Child | None:
+        """Строка ребёнка (расписание, телефон) — грузится, только если нужна."""
+        if self._kid is None and self.is_kid:
+            self._kid = self.db.get(Child, self.identity.child_id)
+        return self._kid
+
+    @property
+    def parent(self) -> Parent | None:
+        if self._parent is None and self.is_parent:
+            self._parent = self.db.get(Parent, self.identity.parent_id)
+        return self._parent
+
+    def ensure_parent(self, lang: str | None = None) -> Parent:
+        """Профиль родителя текущего пользователя; создаётся при первом обращении."""
+        if self.parent is None:
+            self._parent = get_or_create_parent(self.db, str(self.user_id), lang=lang or self.lang)
+            self._identity = Identity("parent", self._parent.language, name=self._parent.full_name or "")
+        return self._parent
+
+    def add_child(self, name: str, age: int) -> Child:
+        ch = add_child(self.db, self.ensure_parent(), name, age)
+        self._identity = replace(self.identity, has_child=True)
+        return ch
+
+    # ---- FSM
+    @property
+    def state(self) -> dict:
+        if self._state is None:
+            self._state = STATE.get(self.user_id, db=self.db)
+        return self._state
+
+    @property
+    def step(self) -> str | None:
+        return self.state.get("step")
+
+    def set_state(self, **data) -> None:
+        self._state = {**self.state, **data}
+        self._state_dirty = True
+
+    def clear_state(self) -> None:
+        if self.state:
+            self._state = {}
+            self._state_dirty = True
+
+
+def _unit_of_work(handler):
+    """
+    Оборачивает хендлер: создаёт UpdateContext, передаёт его вторым аргументом,
+    коммитит один раз в конце; при ошибке — откат и traceback в лог.
+    SQL хендлера помечается bot:<имя> (app.core.sqltrace).
+    """
+    source = f"bot:{handler.__name__}"
+
+    @wraps(handler)
+    def wrapped(obj):
+        with sqltrace.handler(source), UPDATE_SECONDS.time(handler=handler.__name__):
+            ctx = UpdateContext(obj.from_user.id)
+            try:
+                handler(obj, ctx)
+                ctx.commit()
+            except Exception:
+                ctx.rollback()
+                UPDATE_ERRORS.inc(handler=handler.__name__)
+                print(f"{handler.__name__} error:\n", traceback.format_exc())
+            finally:
+                ctx.close()
+    return wrapped
 
 # ──────────────────────────────
 # Вспомогалки
 # ──────────────────────────────
 
-def _find_child_by_tg(tg_id: int):
-    with db_session() as db:
-        return db.query(Child).filter(Child.tg_id == str(tg_id)).first()
+def _set_child_phone(ctx: UpdateContext, child_id: int, phone: str):
+    ctx.db.query(Child).filter(Child.id == child_id).update({Child.phone: phone}, synchronize_session=False)
 
-def _has_child_for(user_id: int) -> bool:
-    with db_session() as db:
-        p = db.query(Parent).filter_by(tg_id=str(user_id)).first()
-        if not p:
-            return False
-        return db.query(Child).filter_by(parent_id=p.id).first() is not None
-
-def _parent_menu_for(user_id: int, lang: str):
-    st = _get(user_id).get("step")
-    if st == "after_sign":
+def _parent_menu_for(ctx: UpdateContext, lang: str):
+    if ctx.step == "after_sign":
         return after_sign_kb(lang)
-    if not _has_child_for(user_id):
+    if not ctx.has_child:
         return no_child_kb(lang)
     return main_parent_kb(lang)
 
-def _send_main_menu(chat_id: int, lang: str, is_kid: bool = False, greet_name: str = ""):
+def _send_main_menu(ctx: UpdateContext, chat_id: int, lang: str, is_kid: bool = False, greet_name: str = ""):
     if is_kid:
         text = f"Привет, {greet_name}!" if greet_name else _ZWSP
         safe_send_message(chat_id, text, reply_markup=kid_main_kb(lang))
     else:
         text = f"Привет, {greet_name}!" if greet_name else t(lang, "main_menu")
-        safe_send_message(chat_id, text, reply_markup=_parent_menu_for(chat_id, lang))
+        safe_send_message(chat_id, text, reply_markup=_parent_menu_for(ctx, lang))
 
 
 def safe_send_message(chat_id, text, **kwargs):
-    try:
-        return bot.send_message(chat_id, text, **kwargs)
-    except requests.exceptions.ReadTimeout:
+    # повторы — в транспорте (app.bot.transport); здесь только не роняем хендлер
+    with SEND_SECONDS.time(method="sendMessage"):
         try:
             return bot.send_message(chat_id, text, **kwargs)
         except Exception as e:
-            print(f"safe_send_message retry failed: chat_id={chat_id}, err={e!r}")
+            SEND_ERRORS.inc(method="sendMessage", error=_send_error(e))
+            print(f"safe_send_message failed: chat_id={chat_id}, err={e!r}")
             return None
-    except Exception as e:
-        print(f"safe_send_message failed: chat_id={chat_id}, err={e!r}")
-        return None
 
 
 def safe_edit_message_text(text, chat_id, message_id, **kwargs):
-    try:
-        return bot.edit_message_text(text, chat_id, message_id, **kwargs)
-    except requests.exceptions.ReadTimeout:
+    with SEND_SECONDS.time(method="editMessageText"):
         try:
             return bot.edit_message_text(text, chat_id, message_id, **kwargs)
-        except Exception:
+        except Exception as e:
+            SEND_ERRORS.inc(method="editMessageText", error=_send_error(e))
             return None
-    except Exception:
-        return None
+
+
+def _send_error(e: Exception) -> str:
+    return "timeout" if isinstance(e, requests.exceptions.Timeout) else "other"
 
 # ──────────────────────────────
 # /start (+ поддержка /start <ID_РЕБЁНКА>)
 # ──────────────────────────────
-@bot.message_handler(commands=["start"])
-def on_start(m: types.Message):
+@_unit_of_work
+def on_start(m: types.Message, ctx: UpdateContext):
     if _seen_message(m):
         return
-    last = LAST_START_AT.get(m.from_user.id, 0)
-    if _now() - last < 1:
+    if LAST_START_AT.seen(m.from_user.id):
         return
-    LAST_START_AT[m.from_user.id] = _now()
 
-    try:
-        # ── 1) Если это уже ПРИВЯЗАННЫЙ РЕБЁНОК — восстанавливаем его меню/шаг
-        with db_session() as db:
-            kid = db.query(Child).filter(Child.tg_id == str(m.from_user.id)).first()
-            if kid:
-                parent = db.query(Parent).filter(Parent.id == kid.parent_id).first()
+    # ── 1) Если это уже ПРИВЯЗАННЫЙ РЕБЁНОК — восстанавливаем его меню/шаг
+    kid = ctx.kid
+    if kid:
+        lang_local = ctx.lang
+
+        # если телефон ещё не сохранён — вернёмся в шаг запроса телефона
+        if not (getattr(kid, "phone", "") or "").strip():
+            safe_send_message(
+                m.chat.id,
+                t(lang_local, "child_linked_child").format(name=kid.name),
+                reply_markup=kid_phone_kb(lang_local)
+            )
+            ctx.set_state(step="kid:phone", child_id=kid.id, lang=lang_local)
+        else:
+            # иначе — просто показать детское главное меню (кнопки ребёнка)
+            safe_send_message(m.chat.id, _ZWSP, reply_markup=kid_main_kb(lang_local))
+            ctx.clear_state()
+        return
+
+    ref_code = ""
+    arg = None
+    if m.text and " " in m.text:
+        arg = m.text.split(" ", 1)[1][:64]
+
+        # Детская привязка по ID
+        if arg and arg.isdigit():
+            child = ctx.db.get(Child, int(arg))
+            if child:
+                parent = child.parent
                 lang_local = parent.language if parent else settings.DEFAULT_LANG
 
-                # если телефон ещё не сохранён — вернёмся в шаг запроса телефона
-                if not (getattr(kid, "phone", "") or "").strip():
+                # 0) защита от дурака — родитель нажал ссылку сам
+                if parent and str(m.from_user.id) == (parent.tg_id or ""):
                     safe_send_message(
                         m.chat.id,
-                        t(lang_local, "child_linked_child").format(name=kid.name),
-                        reply_markup=kid_phone_kb(lang_local)
+                        t(lang_local, "link_is_for_child")
                     )
-                    _set(m.from_user.id, step="kid:phone", child_id=kid.id, lang=lang_local)
-                else:
-                    # иначе — просто показать детское главное меню (кнопки ребёнка)
-                    safe_send_message(m.chat.id, _ZWSP, reply_markup=kid_main_kb(lang_local))
-                    _clear(m.from_user.id)
-                return
+                    return
 
+                # 1) привязываем ребёнка
+                child.has_telegram = True
+                child.tg_id = str(m.from_user.id)
+                child_name = child.name
 
-        ref_code = ""
-        arg = None
-        if m.text and " " in m.text:
-            arg = m.text.split(" ", 1)[1][:64]
-
-            # Детская привязка по ID
-            if arg and arg.isdigit():
-                with db_session() as db:
-                    child = db.query(Child).filter(Child.id == int(arg)).first()
-                    if child:
-                        parent = db.query(Parent).filter(Parent.id == child.parent_id).first()
-                        lang_local = parent.language if parent else settings.DEFAULT_LANG
-
-                        # 0) защита от дурака — родитель нажал ссылку сам
-                        if parent and str(m.from_user.id) == (parent.tg_id or ""):
-                            safe_send_message(
-                                m.chat.id,
-                                t(lang_local, "link_is_for_child")
-                            )
-                            return
-
-                        # 1) привязываем ребёнка
-                        child.has_telegram = True
-                        child.tg_id = str(m.from_user.id)
-                        child_name = child.name
-
-                        # 2) уведомляем РОДИТЕЛЯ
-                        if parent and parent.tg_id:
-                            try:
-                                safe_send_message(
-                                    parent.tg_id,
-                                    t(lang_local, "child_linked_parent").format(name=child_name)
-                                )
-                            except Exception:
-                                pass
-
-                        # 3) приветствуем РЕБЁНКА и просим телефон
+                # 2) уведомляем РОДИТЕЛЯ
+                if parent and parent.tg_id:
+                    try:
                         safe_send_message(
-                            m.chat.id,
-                            t(lang_local, "child_linked_child").format(name=child_name),
-                            reply_markup=kid_phone_kb(lang_local)
+                            parent.tg_id,
+                            t(lang_local, "child_linked_parent").format(name=child_name)
                         )
-                        _set(m.from_user.id, step="kid:phone", child_id=child.id, lang=lang_local)
-                        return
-                ref_code = arg  # не нашли ребёнка — трактуем как реф-код
-
-        # Обычный старт (родитель)
-        with db_session() as db:
-            parent = db.query(Parent).filter_by(tg_id=str(m.from_user.id)).first()
-            if not parent:
-                safe_send_message(m.chat.id, "Выберите язык / Tilni tanlang", reply_markup=lang_kb())
-                _set(m.from_user.id, step="choose_lang", ref_code=ref_code)
+                    except Exception:
+                        pass
+
+                # 3) приветствуем РЕБЁНКА и просим телефон
+                safe_send_message(
+                    m.chat.id,
+                    t(lang_local, "child_linked_child").format(name=child_name),
+                    reply_markup=kid_phone_kb(lang_local)
+                )
+                ctx.set_state(step="kid:phone", child_id=child.id, lang=lang_local)
                 return
-            lang_local = parent.language
+            ref_code = arg  # не нашли ребёнка — трактуем как реф-код
 
-            if not (parent.full_name or "").strip():
-                safe_send_message(m.chat.id, t(lang_local, "ask_parent_name"), reply_markup=step_kb(lang_local))
-                _set(m.from_user.id, step="parent:name", lang=lang_local)
-                return
+    # Обычный старт (родитель)
+    if not ctx.is_parent:
+        safe_send_message(m.chat.id, "Выберите язык / Tilni tanlang", reply_markup=lang_kb())
+        ctx.set_state(step="choose_lang", ref_code=ref_code)
+        return
+    lang_local = ctx.lang
+
+    if not ctx.name.strip():
+        safe_send_message(m.chat.id, t(lang_local, "ask_parent_name"), reply_markup=step_kb(lang_local))
+        ctx.set_state(step="parent:name", lang=lang_local)
+        return
 
-        name = _first_name(parent.full_name)
-        _send_main_menu(m.chat.id, lang_local, greet_name=name)
+    name = _first_name(ctx.name)
+    _send_main_menu(ctx, m.chat.id, lang_local, greet_name=name)
 
-    except Exception:
-        print("on_start error:\n", traceback.format_exc())
+@_unit_of_work
+def on_contact(m: types.Message, ctx: UpdateContext):
+    st = ctx.state
+    lang = ctx.lang
 
-@bot.message_handler(content_types=["contact"])
-def on_contact(m: types.Message):
-    try:
-        st = _get(m.from_user.id)
-        lang = settings.DEFAULT_LANG
-        with db_session() as db:
-            pr = db.query(Parent).filter_by(tg_id=str(m.from_user.id)).first()
-            if pr:
-                lang = pr.language
-
-        phone = _normalize_phone(getattr(m.contact, "phone_number", ""))
-
-        if st.get("step") == "parent:phone":
-            if not _looks_like_phone(phone):
-                safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=phone_kb(lang))
-                return
-            with db_session() as db:
-                p = get_or_create_parent(db, str(m.from_user.id), lang=lang)
-                p.phone = phone
-                fname = p.full_name
-            _clear(m.from_user.id)
-            _send_main_menu(m.chat.id, lang, greet_name=_first_name(fname))
+    phone = _normalize_phone(getattr(m.contact, "phone_number", ""))
+
+    if st.get("step") == "parent:phone":
+        if not _looks_like_phone(phone):
+            safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=phone_kb(lang))
             return
+        p = ctx.ensure_parent(lang)
+        p.phone = phone
+        ctx.clear_state()
+        _send_main_menu(ctx, m.chat.id, lang, greet_name=_first_name(p.full_name))
+        return
 
-        if st.get("step") == "kid:phone":
-            child_id = st.get("child_id")
-            if not _looks_like_phone(phone):
-                safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=kid_phone_kb(lang))
-                return
-            _set_child_phone(child_id, phone)
-            _clear(m.from_user.id)
-            safe_send_message(m.chat.id, _ZWSP, reply_markup=kid_main_kb(lang))
+    if st.get("step") == "kid:phone":
+        child_id = st.get("child_id")
+        if not _looks_like_phone(phone):
+            safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=kid_phone_kb(lang))
             return
-    except Exception:
-        print("on_contact error:\n", traceback.format_exc())
+        _set_child_phone(ctx, child_id, phone)
+        ctx.clear_state()
+        safe_send_message(m.chat.id, _ZWSP, reply_markup=kid_main_kb(lang))
+        return
 
-@bot.message_handler(commands=["menu"])
-def on_menu(m: types.Message):
+@_unit_of_work
+def on_menu(m: types.Message, ctx: UpdateContext):
     if _seen_message(m):
         return
-    try:
-        kid = _find_child_by_tg(m.from_user.id)
-        if kid:
-            parent_lang = settings.DEFAULT_LANG
-            with db_session() as db:
-                p = db.query(Parent).filter(Parent.id == kid.parent_id).first()
-                if p:
-                    parent_lang = p.language
-            _clear(m.from_user.id)
-            _send_main_menu(m.chat.id, parent_lang, is_kid=True)
-            return
+    if ctx.is_kid:
+        ctx.clear_state()
+        _send_main_menu(ctx, m.chat.id, ctx.lang, is_kid=True)
+        return
 
-        with db_session() as db:
-            parent = get_or_create_parent(db, str(m.from_user.id), lang=settings.DEFAULT_LANG)
-            lang = parent.language
-        _clear(m.from_user.id)
-        _send_main_menu(m.chat.id, lang, greet_name=_first_name(parent.full_name))
-    except Exception:
-        print("on_menu error:\n", traceback.format_exc())
+    if not ctx.is_parent:
+        ctx.ensure_parent()
+    ctx.clear_state()
+    _send_main_menu(ctx, m.chat.id, ctx.lang, greet_name=_first_name(ctx.name))
 
 # ──────────────────────────────
 # Выбор языка при первом запуске (родитель)
 # ──────────────────────────────
-@bot.message_handler(func=lambda msg: _get(msg.from_user.id).get("step") == "choose_lang")
-def choose_lang(m: types.Message):
-    if _seen_message(m):
-        return
-    try:
-        lang = "ru" if "Рус" in (m.text or "") else "uz"
-        ref_code = _get(m.from_user.id).get("ref_code", "")
-
-        with db_session() as db:
-            parent = get_or_create_parent(db, str(m.from_user.id), lang=lang)
-            parent.language = lang  # фикс
-        safe_send_message(m.chat.id, t(lang, "ask_parent_name"), reply_markup=step_kb(lang))
-        _set(m.from_user.id, step="parent:name", lang=lang, ref_code=ref_code)
-    except Exception:
-        print("choose_lang error:\n", traceback.format_exc())
+def _choose_lang(m: types.Message, ctx: UpdateContext):
+    lang = "ru" if "Рус" in (m.text or "") else "uz"
+    ref_code = ctx.state.get("ref_code", "")
+
+    parent = ctx.ensure_parent(lang)
+    parent.language = lang  # фикс
+    safe_send_message(m.chat.id, t(lang, "ask_parent_name"), reply_markup=step_kb(lang))
+    ctx.set_state(step="parent:name", lang=lang, ref_code=ref_code)
 
 # ──────────────────────────────
-# ОБРАБОТЧИК ТЕКСТА
+# Кнопки меню родителя: ключ кнопки (app.core.i18n.PARENT_BUTTONS) -> действие
 # ──────────────────────────────
-@bot.message_handler(content_types=["text"])
-def on_text(m: types.Message):
-    if _seen_message(m):
-        return
-    try:
-        txt = (m.text or "").strip()
-
-        # --- игнорируем команды ---
-        if txt.startswith("/"):
-            return
-
-            # Ребёнок
-        kid = _find_child_by_tg(m.from_user.id)
-        if kid:
-            return _handle_kid_text(m, kid)
-
-        # Родитель
-        with db_session() as db:
-            parent = get_or_create_parent(db, str(m.from_user.id), lang=settings.DEFAULT_LANG)
-            lang = parent.language
-        parent_name = _first_name(parent.full_name)
-
-        # FSM
-        st = _get(m.from_user.id)
-        step = st.get("step")
-
-        if txt == t(lang, "btn_back"):
-            if step in ("child:age", "support:ask", "parent:name"):
-                if step == "child:age":
-                    _set(m.from_user.id, step="child:name", lang=lang)
-                    safe_send_message(m.chat.id, t(lang, "ask_child_name"), reply_markup=step_kb(lang))
-                    return
-                _clear(m.from_user.id)
-                _send_main_menu(m.chat.id, lang, greet_name=parent_name)
-                return
-            if step == "after_sign":
-                _clear(m.from_user.id)
-                safe_send_message(m.chat.id, t(lang, "sign_when"), reply_markup=schedule_inline(lang))
-                return
-            _clear(m.from_user.id)
-            _send_main_menu(m.chat.id, lang, greet_name=parent_name)
-            return
-
-        if step == "parent:name":
-            full_name = txt[:24]
-            with db_session() as db:
-                p = get_or_create_parent(db, str(m.from_user.id), lang=lang)
-                p.full_name = full_name
-            safe_send_message(m.chat.id, t(lang, "ask_parent_phone"), reply_markup=phone_kb(lang))
-            _set(m.from_user.id, step="parent:phone", lang=lang)
-            return
-
-        # ---- родитель вводит телефон вручную ----
-        if step == "parent:phone":
-            if _looks_like_phone(txt):
-                phone = _normalize_phone(txt)
-                with db_session() as db:
-                    p = get_or_create_parent(db, str(m.from_user.id), lang=lang)
-                    p.phone = phone
-                    fname = p.full_name
-                _clear(m.from_user.id)
-                _send_main_menu(m.chat.id, lang, greet_name=_first_name(fname))
+def _act_main_menu(m: types.Message, ctx: UpdateContext, lang: str):
+    ctx.clear_state()
+    _send_main_menu(ctx, m.chat.id, lang, greet_name=_first_name(ctx.name))
+
+def _act_prices(m: types.Message, ctx: UpdateContext, lang: str):
+    safe_send_message(m.chat.id, t(lang, "prices_text"),
+                      reply_markup=_parent_menu_for(ctx, lang))
+
+def _act_schedule(m: types.Message, ctx: UpdateContext, lang: str):
+    parts = [t(lang, "schedule_text")]
+    kids = list_children(ctx.db, ctx.ensure_parent())
+
+    if kids:
+        parts.append("")
+        parts.append(t(lang, "my_kids_schedule_title"))
+        for c in kids:
+            paid = 1 if getattr(c, "paid", 0) else 0
+            sched = (getattr(c, "schedule_text", "") or "").strip()
+            if paid and sched:
+                line = f"• {c.name}: {sched}"
+            elif not paid:
+                line = f"• {c.name}: {t(lang, 'sched_wait_payment')}"
             else:
-                safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=phone_kb(lang))
-            return
+                line = f"• {c.name}: {t(lang, 'sched_not_set')}"
+            parts.append(line)
 
-        if step == "child:name":
-            _set(m.from_user.id, step="child:age", child_name=txt[:80], lang=lang)
-            safe_send_message(m.chat.id, t(lang, "ask_child_age"), reply_markup=step_kb(lang))
-            return
+    safe_send_message(m.chat.id, "\n".join(parts), reply_markup=_parent_menu_for(ctx, lang))
 
-        if step == "child:age":
-            try:
-                age = int(txt)
-                if not (5 <= age <= 25):
-                    raise ValueError
-            except Exception:
-                safe_send_message(m.chat.id, "Введите возраст числом", reply_markup=step_kb(lang))
-                return
+def _act_create_child(m: types.Message, ctx: UpdateContext, lang: str):
+    safe_send_message(m.chat.id, t(lang, "ask_child_name"), reply_markup=step_kb(lang))
+    ctx.set_state(step="child:name", lang=lang)
 
-            child_name = _get(m.from_user.id).get("child_name", "Ребёнок")
-            with db_session() as db:
-                parent = get_or_create_parent(db, str(m.from_user.id), lang=settings.DEFAULT_LANG)
-                lang_local = parent.language
-                recent = (db.query(Child)
-                          .filter(Child.parent_id == parent.id,
-                                  Child.name == child_name,
-                                  Child.age == age,
-                                  Child.created_at > datetime.now(UTC) - timedelta(seconds=90))
-                          .order_by(Child.id.desc())
-                          .first())
-                ch = recent or add_child(db, parent, child_name, age)
-
-            safe_send_message(
-                m.chat.id,
-                (
-                    f"Готово! Ребёнок <b>{child_name}</b> сохранён ✅\n"
-                    f"ID ребёнка: <code>{ch.id}</code>\n"
-                    f"Ссылку для привязки отправьте ребёнку и откройте с ЕГО устройства:\n"
-                    f"<code>t.me/{settings.BOT_USERNAME}?start={ch.id}</code>"
-                ),
-                reply_markup=child_added_kb(lang_local),
-            )
-            _clear(m.from_user.id)
-            return
+def _act_my_children(m: types.Message, ctx: UpdateContext, lang: str):
+    kids = list_children(ctx.db, ctx.ensure_parent())
+    if not kids:
+        safe_send_message(m.chat.id, "Пока нет добавленных детей.",
+                          reply_markup=_parent_menu_for(ctx, lang))
+    else:
+        msg = "\n".join([f"• {c.name}, {c.age} лет — ID: <code>{c.id}</code>" for c in kids])
+        safe_send_message(m.chat.id, msg, reply_markup=_parent_menu_for(ctx, lang))
+
+def _act_pay(m: types.Message, ctx: UpdateContext, lang: str):
+    safe_send_message(m.chat.id, settings.PAYMENT_DETAILS,
+                      reply_markup=_parent_menu_for(ctx, lang))
+
+def _act_sign(m: types.Message, ctx: UpdateContext, lang: str):
+    safe_send_message(m.chat.id, t(lang, "sign_when"), reply_markup=schedule_inline(lang))
+
+def _act_help(m: types.Message, ctx: UpdateContext, lang: str):
+    safe_send_message(m.chat.id, t(lang, "help_text"), reply_markup=step_kb(lang))
+    ctx.set_state(step="support:ask", lang=lang)
+
+_PARENT_ACTIONS = {
+    "main_menu": _act_main_menu,
+    "btn_prices": _act_prices,
+    "btn_schedule": _act_schedule,
+    "btn_create_child": _act_create_child,
+    "btn_my_children": _act_my_children,
+    "btn_pay": _act_pay,
+    "btn_sign": _act_sign,
+    "btn_help": _act_help,
+}
+# эти кнопки имеют смысл только когда ребёнок уже добавлен
+_NEED_CHILD = frozenset({"btn_sign", "btn_prices", "btn_pay"})
 
-        if step == "support:ask":
-            question = txt
-            for admin_id in _admin_ids():
-                try:
-                    safe_send_message(
-                        admin_id,
-                        f"🆘 Вопрос от родителя tg={m.from_user.id}:\n\n{question}"
-                    )
-                except Exception:
-                    pass
-            safe_send_message(m.chat.id, "✅ Сообщение отправлено тренеру.",
-                              reply_markup=_parent_menu_for(m.from_user.id, lang))
-            _clear(m.from_user.id)
-            return
+# ──────────────────────────────
+# ОБРАБОТЧИК ТЕКСТА
+# ──────────────────────────────
+@_unit_of_work
+def on_text(m: types.Message, ctx: UpdateContext):
+    if _seen_message(m):
+        return
+    txt = (m.text or "").strip()
 
-        # Глобальные кнопки
-        if txt in ("Русский", "O'zbekcha"):
-            lang = "ru" if "Рус" in txt else "uz"
-            with db_session() as db:
-                get_or_create_parent(db, str(m.from_user.id), lang=lang)
-            _send_main_menu(m.chat.id, lang, greet_name=_first_name(parent.full_name))
-            return
+    # --- игнорируем команды ---
+    if txt.startswith("/"):
+        return
 
-        if txt == t(lang, "main_menu"):
-            _clear(m.from_user.id)
-            _send_main_menu(m.chat.id, lang, greet_name=parent_name)
+    # FSM
+    step = ctx.step
+
+    # первый запуск: ждём выбор языка
+    if step == "choose_lang":
+        return _choose_lang(m, ctx)
+
+    # Ребёнок
+    if ctx.is_kid:
+        return _handle_kid_text(m, ctx)
+
+    # Родитель
+    if not ctx.is_parent:
+        ctx.ensure_parent()
+    lang = ctx.lang
+    parent_name = _first_name(ctx.name)
+    button = i18n.PARENT_BUTTONS.get(txt)
+
+    if button == "btn_back":
+        if step in ("child:age", "support:ask", "parent:name"):
+            if step == "child:age":
+                ctx.set_state(step="child:name", lang=lang)
+                safe_send_message(m.chat.id, t(lang, "ask_child_name"), reply_markup=step_kb(lang))
+                return
+            ctx.clear_state()
+            _send_main_menu(ctx, m.chat.id, lang, greet_name=parent_name)
             return
-
-        if txt in (t(lang, "btn_sign"), t(lang, "btn_prices"), t(lang, "btn_pay")) and not _has_child_for(m.from_user.id):
-            safe_send_message(m.chat.id, "Сначала добавьте ребёнка 🙂", reply_markup=step_kb(lang))
-            safe_send_message(m.chat.id, t(lang, "ask_child_name"), reply_markup=step_kb(lang))
-            _set(m.from_user.id, step="child:name", lang=lang)
+        if step == "after_sign":
+            ctx.clear_state()
+            safe_send_message(m.chat.id, t(lang, "sign_when"), reply_markup=schedule_inline(lang))
             return
+        ctx.clear_state()
+        _send_main_menu(ctx, m.chat.id, lang, greet_name=parent_name)
+        return
 
-        if txt == t(lang, "btn_prices"):
-            safe_send_message(m.chat.id, t(lang, "prices_text"),
-                              reply_markup=_parent_menu_for(m.from_user.id, lang))
-            return
+    if step == "parent:name":
+        ctx.ensure_parent().full_name = txt[:24]
+        safe_send_message(m.chat.id, t(lang, "ask_parent_phone"), reply_markup=phone_kb(lang))
+        ctx.set_state(step="parent:phone", lang=lang)
+        return
 
-        if txt == t(lang, "btn_schedule"):
-            parts = [t(lang, "schedule_text")]
-            with db_session() as db:
-                parent = get_or_create_parent(db, str(m.from_user.id), lang=lang)
-                kids = list_children(db, parent)
-
-            if kids:
-                parts.append("")
-                parts.append(t(lang, "my_kids_schedule_title"))
-                for c in kids:
-                    paid = 1 if getattr(c, "paid", 0) else 0
-                    sched = (getattr(c, "schedule_text", "") or "").strip()
-                    if paid and sched:
-                        line = f"• {c.name}: {sched}"
-                    elif not paid:
-                        line = f"• {c.name}: {t(lang, 'sched_wait_payment')}"
-                    else:
-                        line = f"• {c.name}: {t(lang, 'sched_not_set')}"
-                    parts.append(line)
-
-            safe_send_message(m.chat.id, "\n".join(parts), reply_markup=_parent_menu_for(m.from_user.id, lang))
-            return
+    # ---- родитель вводит телефон вручную ----
+    if step == "parent:phone":
+        if _looks_like_phone(txt):
+            parent = ctx.ensure_parent()
+            parent.phone = _normalize_phone(txt)
+            ctx.clear_state()
+            _send_main_menu(ctx, m.chat.id, lang, greet_name=_first_name(parent.full_name))
+        else:
+            safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=phone_kb(lang))
+        return
 
-        if txt == t(lang, "btn_create_child"):
-            safe_send_message(m.chat.id, t(lang, "ask_child_name"), reply_markup=step_kb(lang))
-            _set(m.from_user.id, step="child:name", lang=lang)
-            return
+    if step == "child:name":
+        ctx.set_state(step="child:age", child_name=txt[:80], lang=lang)
+        safe_send_message(m.chat.id, t(lang, "ask_child_age"), reply_markup=step_kb(lang))
+        return
 
-        if txt == t(lang, "btn_my_children"):
-            with db_session() as db:
-                parent = get_or_create_parent(db, str(m.from_user.id), lang=lang)
-                kids = list_children(db, parent)
-            if not kids:
-                safe_send_message(m.chat.id, "Пока нет добавленных детей.",
-                                  reply_markup=_parent_menu_for(m.from_user.id, lang))
-            else:
-                msg = "\n".join([f"• {c.name}, {c.age} лет — ID: <code>{c.id}</code>" for c in kids])
-                safe_send_message(m.chat.id, msg, reply_markup=_parent_menu_for(m.from_user.id, lang))
+    if step == "child:age":
+        try:
+            age = int(txt)
+            if not (5 <= age <= 25):
+                raise ValueError
+        except Exception:
+            safe_send_message(m.chat.id, "Введите возраст числом", reply_markup=step_kb(lang))
             return
 
-        if txt == t(lang, "btn_pay"):
-            safe_send_message(m.chat.id, settings.PAYMENT_DETAILS,
-                              reply_markup=_parent_menu_for(m.from_user.id, lang))
-            return
+        # апдейты чата обрабатываются последовательно: повторное сообщение с возрастом
+        # увидит уже очищенный шаг, так что отдельная защита от дублей не нужна
+        child_name = ctx.state.get("child_name", "Ребёнок")
+        ch = ctx.add_child(child_name, age)
 
-        if txt == t(lang, "btn_sign"):
-            safe_send_message(m.chat.id, t(lang, "sign_when"), reply_markup=schedule_inline(lang))
-            return
+        safe_send_message(
+            m.chat.id,
+            (
+                f"Готово! Ребёнок <b>{child_name}</b> сохранён ✅\n"
+                f"ID ребёнка: <code>{ch.id}</code>\n"
+                f"Ссылку для привязки отправьте ребёнку и откройте с ЕГО устройства:\n"
+                f"<code>t.me/{settings.BOT_USERNAME}?start={ch.id}</code>"
+            ),
+            reply_markup=child_added_kb(lang),
+        )
+        ctx.clear_state()
+        return
 
-        if txt == t(lang, "btn_help"):
-            safe_send_message(m.chat.id, t(lang, "help_text"), reply_markup=step_kb(lang))
-            _set(m.from_user.id, step="support:ask", lang=lang)
-            return
+    if step == "support:ask":
+        question = txt
+        for admin_id in _admin_ids():
+            try:
+                safe_send_message(
+                    admin_id,
+                    f"🆘 Вопрос от родителя tg={m.from_user.id}:\n\n{question}"
+                )
+            except Exception:
+                pass
+        safe_send_message(m.chat.id, "✅ Сообщение отправлено тренеру.",
+                          reply_markup=_parent_menu_for(ctx, lang))
+        ctx.clear_state()
+        return
 
-        _send_main_menu(m.chat.id, lang, greet_name=parent_name)
+    # Глобальные кнопки
+    if txt in i18n.LANG_BUTTONS:
+        lang = i18n.LANG_BUTTONS[txt]
+        ctx.ensure_parent().language = lang
+        _send_main_menu(ctx, m.chat.id, lang, greet_name=parent_name)
+        return
 
-    except Exception:
-        print("on_text error:\n", traceback.format_exc())
+    action = _PARENT_ACTIONS.get(button)
+    if action is None:
+        _send_main_menu(ctx, m.chat.id, lang, greet_name=parent_name)
+        return
+    if button in _NEED_CHILD and not ctx.has_child:
+        safe_send_message(m.chat.id, "Сначала добавьте ребёнка 🙂", reply_markup=step_kb(lang))
+        safe_send_message(m.chat.id, t(lang, "ask_child_name"), reply_markup=step_kb(lang))
+        ctx.set_state(step="child:name", lang=lang)
+        return
+    action(m, ctx, lang)
 
 
-@bot.message_handler(commands=["whoami"])
 def whoami(m):
     bot.reply_to(m, f"Твой ID: {m.from_user.id}\nИмя: {m.from_user.first_name}")
 
@@ -720,137 +719,176 @@ def whoami(m):
 # ──────────────────────────────
 # Детский обработчик текста
 # ──────────────────────────────
-def _handle_kid_text(m: types.Message, kid: Child):
-    try:
-        lang = settings.DEFAULT_LANG
-        with db_session() as db:
-            p = db.query(Parent).filter(Parent.id == kid.parent_id).first()
-            if p:
-                lang = p.language
-
-        txt = (m.text or "").strip()
-
-        if txt == t(lang, "kid_schedule"):
-            status = getattr(kid, "paid", 0)
-            sched = (kid.schedule_text or "").strip() if getattr(kid, "schedule_text", None) is not None else ""
-            if not status:
-                safe_send_message(m.chat.id, "Вы записаны на пробное занятие. После оплаты тренер установит расписание.",
-                                  reply_markup=kid_main_kb(lang))
-            else:
-                safe_send_message(m.chat.id, sched or "Расписание пока пустое — уточните у тренера.",
-                                  reply_markup=kid_main_kb(lang))
-            return
-
-        if txt == t(lang, "kid_help"):
-            safe_send_message(m.chat.id, "Напиши свой вопрос. Мы передадим его тренеру.", reply_markup=step_kb(lang))
-            _set(m.from_user.id, step="kid:support", lang=lang)
-            return
+def _handle_kid_text(m: types.Message, ctx: UpdateContext):
+    lang = ctx.lang
+    txt = (m.text or "").strip()
+    button = i18n.KID_BUTTONS.get(txt)
+
+    if button == "kid_schedule":
+        kid = ctx.kid
+        status = getattr(kid, "paid", 0)
+        sched = (kid.schedule_text or "").strip() if getattr(kid, "schedule_text", None) is not None else ""
+        if not status:
+            safe_send_message(m.chat.id, "Вы записаны на пробное занятие. После оплаты тренер установит расписание.",
+                              reply_markup=kid_main_kb(lang))
+        else:
+            safe_send_message(m.chat.id, sched or "Расписание пока пустое — уточните у тренера.",
+                              reply_markup=kid_main_kb(lang))
+        return
 
-        st = _get(m.from_user.id)
-        if txt == t(lang, "btn_back"):
-            _clear(m.from_user.id)
-            safe_send_message(m.chat.id, t(lang, "main_menu"), reply_markup=kid_main_kb(lang))
-            return
+    if button == "kid_help":
+        safe_send_message(m.chat.id, "Напиши свой вопрос. Мы передадим его тренеру.", reply_markup=step_kb(lang))
+        ctx.set_state(step="kid:support", lang=lang)
+        return
 
-        if st.get("step") == "kid:phone":
-            if _looks_like_phone(txt):
-                _set_child_phone(kid.id, _normalize_phone(txt))
-                _clear(m.from_user.id)
-                safe_send_message(m.chat.id, _ZWSP, reply_markup=kid_main_kb(lang))
-            else:
-                safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=kid_phone_kb(lang))
-            return
+    st = ctx.state
+    if button == "btn_back":
+        ctx.clear_state()
+        safe_send_message(m.chat.id, t(lang, "main_menu"), reply_markup=kid_main_kb(lang))
+        return
 
-        if st.get("step") == "kid:support":
-            question = txt
+    if st.get("step") == "kid:phone":
+        if _looks_like_phone(txt):
+            _set_child_phone(ctx, ctx.identity.child_id, _normalize_phone(txt))
+            ctx.clear_state()
+            safe_send_message(m.chat.id, _ZWSP, reply_markup=kid_main_kb(lang))
+        else:
+            safe_send_message(m.chat.id, t(lang, "ask_phone_retry"), reply_markup=kid_phone_kb(lang))
+        return
 
-            # данные ребёнка
-            child_name = (kid.name or "").strip() or "—"
-            child_phone = (getattr(kid, "phone", "") or "").strip() or "—"
+    if st.get("step") == "kid:support":
+        question = txt
 
-            # username/ссылка на профиль
-            uname = (getattr(m.from_user, "username", "") or "").strip()
-            if uname:
-                tg_line = f"Telegram: @{uname} (id={m.from_user.id})"
-            else:
-                # у нас parse_mode="HTML", можно дать кликабельную ссылку
-                tg_line = f'Telegram: <a href="tg://user?id={m.from_user.id}">профиль</a> (id={m.from_user.id})'
-
-            msg = (
-                "🧒 <b>Вопрос от ребёнка</b>\n"
-                f"Имя: {child_name}\n"
-                f"Телефон: {child_phone}\n"
-                f"{tg_line}\n\n"
-                f"Вопрос: {question}"
-            )
+        # данные ребёнка
+        kid = ctx.kid
+        child_name = (kid.name or "").strip() or "—"
+        child_phone = (getattr(kid, "phone", "") or "").strip() or "—"
 
-            for admin_id in _admin_ids():
-                try:
-                    safe_send_message(admin_id, msg)
-                except Exception:
-                    pass
+        # username/ссылка на профиль
+        uname = (getattr(m.from_user, "username", "") or "").strip()
+        if uname:
+            tg_line = f"Telegram: @{uname} (id={m.from_user.id})"
+        else:
+            # у нас parse_mode="HTML", можно дать кликабельную ссылку
+            tg_line = f'Telegram: <a href="tg://user?id={m.from_user.id}">профиль</a> (id={m.from_user.id})'
+
+        msg = (
+            "🧒 <b>Вопрос от ребёнка</b>\n"
+            f"Имя: {child_name}\n"
+            f"Телефон: {child_phone}\n"
+            f"{tg_line}\n\n"
+            f"Вопрос: {question}"
+        )
 
-            safe_send_message(m.chat.id, "✅ Сообщение отправлено тренеру.", reply_markup=kid_main_kb(lang))
-            _clear(m.from_user.id)
-            return
+        for admin_id in _admin_ids():
+            try:
+                safe_send_message(admin_id, msg)
+            except Exception:
+                pass
 
-        safe_send_message(m.chat.id, t(lang, "main_menu"), reply_markup=kid_main_kb(lang))
+        safe_send_message(m.chat.id, "✅ Сообщение отправлено тренеру.", reply_markup=kid_main_kb(lang))
+        ctx.clear_state()
+        return
 
-    except Exception:
-        print("_handle_kid_text error:\n", traceback.format_exc())
+    safe_send_message(m.chat.id, t(lang, "main_menu"), reply_markup=kid_main_kb(lang))
 
 # ──────────────────────────────
 # Callback — запись на пробное (родитель)
 # ──────────────────────────────
-@bot.callback_query_handler(func=lambda c: c.data.startswith("sign:"))
-def cb_sign(call: types.CallbackQuery):
+@_unit_of_work
+def cb_sign(call: types.CallbackQuery, ctx: UpdateContext):
     if _seen_callback(call):
         try:
             bot.answer_callback_query(call.id)
         except Exception:
             pass
         return
-    try:
-        time_str = call.data.split(":", 1)[1]
-        with db_session() as db:
-            parent = db.query(Parent).filter_by(tg_id=str(call.from_user.id)).first()
-            if not parent:
-                bot.answer_callback_query(call.id, "Сначала нажмите /start"); return
-            kids = list_children(db, parent)
-            if not kids:
-                bot.answer_callback_query(call.id, "Сначала добавьте ребёнка"); return
-            lang_local = parent.language
-            create_appointment(db, child_id=kids[0].id, datetime_str=time_str)
+    time_str = call.data.split(":", 1)[1]
+    if not ctx.is_parent:
+        bot.answer_callback_query(call.id, "Сначала нажмите /start"); return
+    kids = list_children(ctx.db, ctx.parent)
+    if not kids:
+        bot.answer_callback_query(call.id, "Сначала добавьте ребёнка"); return
+    lang_local = ctx.lang
+    create_appointment(ctx.db, child_id=kids[0].id, datetime_str=time_str)
+    ctx.db.flush()  # ошибку записи увидим до того, как скажем «Записал!»
 
-        try:
-            bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
-        except Exception:
-            pass
-        bot.answer_callback_query(call.id, "OK")
+    try:
+        bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id, reply_markup=None)
+    except Exception:
+        pass
+    bot.answer_callback_query(call.id, "OK")
+
+    ctx.set_state(step="after_sign", lang=lang_local)
+    safe_send_message(
+        call.message.chat.id,
+        t(lang_local, "sign_done"),
+        reply_markup=after_sign_kb(lang_local)
+    )
 
-        _set(call.from_user.id, step="after_sign", lang=lang_local)
-        safe_send_message(
-            call.message.chat.id,
-            t(lang_local, "sign_done"),
-            reply_markup=after_sign_kb(lang_local)
+# ──────────────────────────────
+# Сборка бота
+# ──────────────────────────────
+def create_bot() -> TeleBot:
+    """Схема БД, клиент, хендлеры, диспетчер, прогрев клавиатур. Повторный вызов вернёт тот же бот."""
+    global bot, dispatcher
+    with _create_lock:
+        if bot is not None:
+            return bot
+        init_db()  # схема БД — см. app.core.migrations
+        b = get_client()
+        b.register_message_handler(on_start, commands=["start"])
+        b.register_message_handler(on_contact, content_types=["contact"])
+        b.register_message_handler(on_menu, commands=["menu"])
+        b.register_message_handler(on_text, content_types=["text"])
+        b.register_message_handler(whoami, commands=["whoami"])
+        b.register_callback_query_handler(cb_sign, func=lambda c: c.data.startswith("sign:"))
+        dispatcher = UpdateDispatcher(
+            lambda update: b.process_new_updates([update]),
+            workers=settings.BOT_WORKERS,
+            queue_size=settings.BOT_QUEUE_SIZE,
         )
-    except Exception:
-        print("cb_sign error:\n", traceback.format_exc())
+        keyboards.warm()
+        bot = b
+    return bot
+
 
 # ──────────────────────────────
 # Запуск
 # ──────────────────────────────
 
 def _run_polling():
+    # polling и webhook взаимоисключающие: снимаем вебхук, если он остался от webhook-режима
+    try:
+        bot.remove_webhook()
+    except Exception as e:
+        print("remove_webhook failed:", repr(e))
+
+    dispatcher.start()
+
+    # накопившиеся апдейты пропускаем один раз при старте процесса;
+    # дальше offset живёт между перезапусками цикла и ничего не теряется
+    offset = None
+    try:
+        pending = bot.get_updates(offset=-1, timeout=10)
+        if pending:
+            offset = pending[-1].update_id + 1
+    except Exception as e:
+        print("skip pending failed:", repr(e))
+
     # устойчивый цикл с перезапуском при сетевых таймаутах/ошибках
     while True:
         try:
-            bot.infinity_polling(
+            updates = bot.get_updates(
+                offset=offset,
                 timeout=120,                # сетевой таймаут requests
                 long_polling_timeout=60,    # сервер держит соединение до N сек.
-                skip_pending=True,
                 allowed_updates=_ALLOWED_UPDATES,
             )
+            for update in updates:
+                offset = update.update_id + 1
+                # если очередь чата полна — ждём: это и есть backpressure для polling
+                dispatcher.submit(update)
         except requests.exceptions.ReadTimeout:
             print("polling ReadTimeout — retry in 2s")
             time.sleep(2)
@@ -866,5 +904,10 @@ def _run_polling():
 
 
 if __name__ == "__main__":
+    create_bot()
     print("Bot is running…")
-    _run_polling()
\ No newline at end of file
+    start_sqlite_maintenance()
+    start_identity_sync()  # правки из админки и API
+    if settings.METRICS_ENABLED and settings.BOT_METRICS_PORT:
+        metrics.serve(settings.BOT_METRICS_PORT, settings.BOT_METRICS_HOST)
+    _run_polling()
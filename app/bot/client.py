@@ -0,0 +1,43 @@
+"""
+Клиент Bot API (TeleBot) — один на процесс, создаётся при первом обращении.
+
+Отправлять сообщения из API/админки/рассылок — через get_client(): так не тянем
+хендлеры, FSM и клавиатуры бота (app.bot.bot), а telebot/requests импортируются
+только когда действительно что-то отправляем.
+"""
+import threading
+
+from app.core.config import settings
+
+_client = None
+_lock = threading.Lock()
+
+
+def _configure_transport() -> None:
+    """Все вызовы apihelper — через общий транспорт (app.bot.transport): пул, повторы, дедлайны."""
+    from telebot import apihelper
+    from app.bot.transport import get_transport
+
+    apihelper.API_URL = settings.BOT_API_URL.rstrip("/") + "/bot{0}/{1}"
+    apihelper.CUSTOM_REQUEST_SENDER = get_transport().request
+    apihelper.READ_TIMEOUT = settings.BOT_API_READ_TIMEOUT
+    apihelper.CONNECT_TIMEOUT = settings.BOT_API_CONNECT_TIMEOUT
+
+
+def get_client():
+    """TeleBot без хендлеров; app.bot.bot.create_bot() вешает их на этот же объект."""
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            if not settings.BOT_TOKEN or settings.BOT_TOKEN.startswith("000000000"):
+                raise RuntimeError("BOT_TOKEN не задан. Заполни .env по образцу .env.example")
+            from telebot import TeleBot
+
+            _configure_transport()
+            # Апдейты (и в polling, и в webhook) обрабатывает наш пул: апдейты одного чата — строго
+            # по очереди, разные чаты — параллельно. Поэтому собственный пул telebot выключен:
+            # хендлеры выполняются прямо в потоке воркера диспетчера.
+            _client = TeleBot(settings.BOT_TOKEN, parse_mode="HTML", threaded=False)
+    return _client
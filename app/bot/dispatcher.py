@@ -0,0 +1,109 @@
+import queue
+import threading
+import traceback
+from typing import Callable, Optional
+
+from telebot import types
+
+from app.core import sqltrace
+
+
+def chat_key(update: types.Update) -> int:
+    """
+    Ключ упорядочивания апдейта: chat_id сообщения, для callback — чат сообщения с кнопкой.
+    Апдейты без чата (inline и т.п.) порядка не требуют — раскидываем их по update_id.
+    """
+    for attr in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = getattr(update, attr, None)
+        if msg is not None:
+            return msg.chat.id
+    cb = getattr(update, "callback_query", None)
+    if cb is not None:
+        if cb.message is not None:
+            return cb.message.chat.id
+        return cb.from_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """
+    Пул из N воркеров, у каждого своя ограниченная очередь.
+    Апдейты одного чата всегда попадают в одну и ту же очередь и обрабатываются строго
+    по порядку, разные чаты — параллельно. Переполненная очередь — сигнал backpressure
+    для источника апдейтов (webhook отвечает 503, polling ждёт).
+
+        dispatcher = UpdateDispatcher(lambda u: bot.process_new_updates([u]))
+        dispatcher.start()
+        dispatcher.submit(update)
+    """
+
+    def __init__(self, handler: Callable[[types.Update], None], workers: int = 8, queue_size: int = 100):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self._queues = [queue.Queue(maxsize=max(1, int(queue_size))) for _ in range(self.workers)]
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def start(self) -> "UpdateDispatcher":
+        with self._lock:
+            if self._threads:
+                return self
+            for i, q in enumerate(self._queues):
+                th = threading.Thread(target=self._worker, args=(q,), name=f"update-worker-{i}", daemon=True)
+                th.start()
+                self._threads.append(th)
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for q in self._queues:
+            q.put(None)
+        if wait:
+            for th in threads:
+                th.join()
+
+    def submit(self, update: types.Update, timeout: Optional[float] = None) -> bool:
+        """
+        Ставит апдейт в очередь его чата.
+        timeout=None — ждать свободного места; 0 — не ждать. False — очередь переполнена.
+        """
+        q = self._queues[chat_key(update) % self.workers]
+        try:
+            if timeout == 0:
+                q.put_nowait(update)
+            else:
+                q.put(update, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": sum(q.qsize() for q in self._queues),
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            update = q.get()
+            if update is None:
+                break
+            try:
+                with sqltrace.handler("bot:update"):   # хендлеры с _unit_of_work уточнят метку
+                    self.handler(update)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                print("update handler error:\n", traceback.format_exc())
+            finally:
+                with self._lock:
+                    self.processed += 1
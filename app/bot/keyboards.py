@@ -1,55 +1,165 @@
+"""
+Клавиатуры бота.
+
+Разметка зависит только от (вида, языка), поэтому каждая собирается один раз и хранится
+уже сериализованной в JSON: telebot передаёт строку reply_markup как есть, без to_json()
+на каждое сообщение. Кэш сбрасывается сам, когда меняются переводы (app.core.i18n.VERSION).
+"""
+import threading
+
 from telebot import types
-from core.i18n import t
-
-def main_kb(lang: str, has_child: bool = False):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-
-    if has_child:
-        # после добавления ребёнка
-        kb.add(
-            types.KeyboardButton(t(lang, "btn_sign")),
-            types.KeyboardButton(t(lang, "btn_schedule")),
-        )
-        kb.add(
-            types.KeyboardButton(t(lang, "btn_my_children")),
-            types.KeyboardButton(t(lang, "btn_prices")),     # ← цены только после
-        )
-        kb.add(
-            types.KeyboardButton(t(lang, "btn_create_child")),
-            types.KeyboardButton(t(lang, "btn_help")),
-        )
-    else:
-        # до добавления ребёнка — убираем «Записаться» и «Цены»
-        kb.add(
-            types.KeyboardButton(t(lang, "btn_create_child")),
-            types.KeyboardButton(t(lang, "btn_schedule")),
-        )
-        kb.add(
-            types.KeyboardButton(t(lang, "btn_my_children")),
-            types.KeyboardButton(t(lang, "btn_help")),
-        )
-
-    return kb
-
-
-def step_kb(lang: str):
-    # ОДНА версия: Назад + (по желанию) Главный экран
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.row(
-        types.KeyboardButton(t(lang, "btn_back")),
-        types.KeyboardButton(t(lang, "main_menu")),
+
+from app.core import i18n
+from app.core.i18n import t
+
+
+# ──────────────────────────────
+# Сборка разметки
+# ──────────────────────────────
+
+def _step(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "btn_back")))
+    kb.add(types.KeyboardButton(t(lang, "main_menu")))
+    return kb
+
+def _lang(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
+    kb.add(types.KeyboardButton("Русский"), types.KeyboardButton("O'zbekcha"))
+    return kb
+
+def _phone(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "btn_share_phone"), request_contact=True))
+    kb.add(types.KeyboardButton(t(lang, "btn_back")))
+    kb.add(types.KeyboardButton(t(lang, "main_menu")))
+    return kb
+
+def _kid_phone(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "btn_share_phone"), request_contact=True))
+    kb.add(types.KeyboardButton(t(lang, "btn_back")))
+    return kb
+
+def _no_child(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "btn_create_child")))
+    kb.add(types.KeyboardButton(t(lang, "btn_help")))
+    kb.add(types.KeyboardButton(t(lang, "btn_back")))
+    return kb
+
+def _child_added(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "btn_sign")))
+    kb.add(types.KeyboardButton(t(lang, "btn_help")))
+    kb.add(types.KeyboardButton(t(lang, "btn_back")))
+    return kb
+
+def _after_sign(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "main_menu")))
+    return kb
+
+def _main_parent(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(
+        types.KeyboardButton(t(lang, "btn_sign")),
+        types.KeyboardButton(t(lang, "btn_schedule"))
+    )
+    kb.add(
+        types.KeyboardButton(t(lang, "btn_prices")),
+        types.KeyboardButton(t(lang, "btn_my_children"))
     )
+    kb.add(types.KeyboardButton(t(lang, "btn_create_child")))
+    kb.add(types.KeyboardButton(t(lang, "btn_pay")))
+    kb.add(types.KeyboardButton(t(lang, "btn_help")))
     return kb
 
+def _kid_main(lang: str):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add(types.KeyboardButton(t(lang, "kid_schedule")))
+    kb.add(types.KeyboardButton(t(lang, "kid_help")))
+    return kb
 
-def schedule_inline(lang: str):
+def _schedule_inline(lang: str):
     kb = types.InlineKeyboardMarkup()
-    for time in ("Пн 17:00", "Ср 17:00", "Пт 17:00"):
-        kb.add(types.InlineKeyboardButton(text=time, callback_data=f"sign:{time}"))
+    for time_label in ("Пн 17:00", "Ср 17:00", "Пт 17:00"):
+        kb.add(types.InlineKeyboardButton(text=time_label, callback_data=f"sign:{time_label}"))
     return kb
 
 
-def lang_kb():
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
-    kb.row(types.KeyboardButton("Русский"), types.KeyboardButton("O'zbekcha"))
-    return kb
\ No newline at end of file
+BUILDERS = {
+    "step": _step,
+    "lang": _lang,
+    "phone": _phone,
+    "kid_phone": _kid_phone,
+    "no_child": _no_child,
+    "child_added": _child_added,
+    "after_sign": _after_sign,
+    "main_parent": _main_parent,
+    "kid_main": _kid_main,
+    "schedule_inline": _schedule_inline,
+}
+
+# ──────────────────────────────
+# Кэш: (вид, язык) -> JSON
+# ──────────────────────────────
+_cache: dict[tuple[str, str], str] = {}
+_cache_version = -1
+_lock = threading.Lock()
+
+
+def markup(kind: str, lang: str) -> str:
+    """Готовый JSON клавиатуры `kind` на языке `lang` — отдаётся прямо в reply_markup."""
+    if _cache_version != i18n.VERSION:
+        warm()
+    try:
+        return _cache[(kind, lang)]
+    except KeyError:
+        payload = BUILDERS[kind](lang).to_json()
+        with _lock:
+            _cache[(kind, lang)] = payload
+        return payload
+
+
+def warm(langs=None) -> None:
+    """Пересобрать все клавиатуры (на старте и после смены переводов)."""
+    global _cache_version
+    with _lock:
+        version = i18n.VERSION
+        langs = list(langs or i18n.I18N)
+        fresh = {(kind, lang): build(lang).to_json() for kind, build in BUILDERS.items() for lang in langs}
+        _cache.clear()
+        _cache.update(fresh)
+        _cache_version = version
+
+
+def step_kb(lang: str) -> str:
+    return markup("step", lang)
+
+def lang_kb() -> str:
+    return markup("lang", "")
+
+def phone_kb(lang: str) -> str:
+    return markup("phone", lang)
+
+def kid_phone_kb(lang: str) -> str:
+    return markup("kid_phone", lang)
+
+def no_child_kb(lang: str) -> str:
+    return markup("no_child", lang)
+
+def child_added_kb(lang: str) -> str:
+    return markup("child_added", lang)
+
+def after_sign_kb(lang: str) -> str:
+    return markup("after_sign", lang)
+
+def main_parent_kb(lang: str) -> str:
+    return markup("main_parent", lang)
+
+def kid_main_kb(lang: str) -> str:
+    return markup("kid_main", lang)
+
+def schedule_inline(lang: str) -> str:
+    return markup("schedule_inline", lang)
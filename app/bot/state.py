@@ -0,0 +1,213 @@
+"""
+Хранилища FSM-состояния бота: tg_id -> dict ({"step": ..., "lang": ..., ...}).
+У каждой записи TTL — брошенные диалоги исчезают сами.
+
+    memory — LRU в процессе (ограничен BOT_STATE_MAX_SIZE), не переживает рестарт;
+    sqlite — таблица bot_state в основной БД, переживает рестарт, общая для процессов;
+    redis  — любой сервер с протоколом Redis (нужен пакет redis); общий для нескольких ботов.
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.db import db_session
+from app.core.models import BotState
+
+
+class StateStore(ABC):
+    """
+    Интерфейс хранилища. get() всегда возвращает новый dict (пустой, если записи нет).
+    db — сессия текущего апдейта: sqlite работает в ней (в той же транзакции),
+    остальные бэкенды её игнорируют.
+    """
+
+    @abstractmethod
+    def get(self, uid, db: Optional[Session] = None) -> dict:
+        ...
+
+    @abstractmethod
+    def set(self, uid, data: dict, db: Optional[Session] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, uid, db: Optional[Session] = None) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class MemoryStateStore(StateStore):
+    """
+    LRU + TTL. Порядок OrderedDict — порядок последней записи, он же порядок истечения,
+    поэтому протухшие записи всегда в голове и чистятся за O(1) на операцию.
+    При переполнении вытесняется диалог, который дольше всех не менялся.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = float(ttl)
+        self.max_size = max(1, int(max_size))
+        self._data: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid, db: Optional[Session] = None) -> dict:
+        key = str(uid)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return {}
+            expires_at, data = item
+            if expires_at < time.time():
+                del self._data[key]
+                return {}
+            return dict(data)
+
+    def _evict(self, now: float) -> None:
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at >= now and len(self._data) <= self.max_size:
+                break
+            del self._data[key]
+
+    def set(self, uid, data: dict, db: Optional[Session] = None) -> None:
+        key = str(uid)
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + self.ttl, dict(data))
+            self._data.move_to_end(key)
+            self._evict(now)
+
+    def delete(self, uid, db: Optional[Session] = None) -> None:
+        with self._lock:
+            self._data.pop(str(uid), None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(time.time())
+            return len(self._data)
+
+
+class SqliteStateStore(StateStore):
+    """Таблица bot_state. Протухшие строки чистим раз в `purge_every` записей."""
+
+    def __init__(self, ttl: float, purge_every: int = 500):
+        self.ttl = float(ttl)
+        self.purge_every = max(1, int(purge_every))
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _session(self, db: Optional[Session]):
+        if db is not None:
+            yield db
+        else:
+            with db_session() as own:
+                yield own
+
+    def get(self, uid, db: Optional[Session] = None) -> dict:
+        with self._session(db) as s:
+            row = s.get(BotState, str(uid))
+            if row is None or (row.expires_at or 0) < time.time():
+                return {}
+            try:
+                return json.loads(row.data or "{}")
+            except ValueError:
+                return {}
+
+    def _upsert(self, dialect: str):
+        # INSERT ... ON CONFLICT — один запрос вместо SELECT + INSERT/UPDATE у merge()
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(BotState.__table__)
+        return stmt.on_conflict_do_update(
+            index_elements=[BotState.tg_id],
+            set_={"data": stmt.excluded.data, "expires_at": stmt.excluded.expires_at},
+        )
+
+    def set(self, uid, data: dict, db: Optional[Session] = None) -> None:
+        row = {"tg_id": str(uid), "data": json.dumps(data, ensure_ascii=False),
+               "expires_at": time.time() + self.ttl}
+        with self._session(db) as s:
+            dialect = s.get_bind().dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                s.execute(self._upsert(dialect), row)
+            else:
+                s.merge(BotState(**row))
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self.purge(db)
+
+    def delete(self, uid, db: Optional[Session] = None) -> None:
+        with self._session(db) as s:
+            s.query(BotState).filter(BotState.tg_id == str(uid)).delete()
+
+    def purge(self, db: Optional[Session] = None) -> int:
+        with self._session(db) as s:
+            return s.query(BotState).filter(BotState.expires_at < time.time()).delete()
+
+    def __len__(self) -> int:
+        with db_session() as db:
+            return db.query(BotState).filter(BotState.expires_at >= time.time()).count()
+
+
+class RedisStateStore(StateStore):
+    """
+    Ключи fsm:<tg_id> с EX=ttl — истечением занимается сам сервер.
+    client — любой объект с get/set(ex=)/delete/scan_iter (redis.Redis или bench/fake_redis.py).
+    """
+
+    def __init__(self, ttl: float, url: Optional[str] = None, client=None, prefix: str = "fsm:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("BOT_STATE_BACKEND=redis требует пакет redis: pip install redis")
+            client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.client = client
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+
+    def _key(self, uid) -> str:
+        return f"{self.prefix}{uid}"
+
+    def get(self, uid, db: Optional[Session] = None) -> dict:
+        raw = self.client.get(self._key(uid))
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {}
+
+    def set(self, uid, data: dict, db: Optional[Session] = None) -> None:
+        self.client.set(self._key(uid), json.dumps(data, ensure_ascii=False), ex=self.ttl)
+
+    def delete(self, uid, db: Optional[Session] = None) -> None:
+        self.client.delete(self._key(uid))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=f"{self.prefix}*"))
+
+
+def create_state_store(backend: Optional[str] = None) -> StateStore:
+    backend = (backend or settings.BOT_STATE_BACKEND or "memory").strip().lower()
+    ttl = settings.BOT_STATE_TTL
+    if backend == "memory":
+        return MemoryStateStore(ttl, settings.BOT_STATE_MAX_SIZE)
+    if backend == "sqlite":
+        return SqliteStateStore(ttl)
+    if backend == "redis":
+        return RedisStateStore(ttl)
+    raise RuntimeError(f"Неизвестный BOT_STATE_BACKEND: {backend!r} (memory | sqlite | redis)")
@@ -0,0 +1,224 @@
+"""
+Транспорт Bot API: keep-alive пул, одна политика повторов, дедлайны connect / read / total, статистика.
+
+Синхронный — BotApiTransport (requests). TeleBot ходит через него (apihelper.CUSTOM_REQUEST_SENDER,
+см. app.bot.client), поэтому бот, рассылки и уведомления делят один пул соединений и одну политику.
+
+Повторы (до BOT_API_RETRIES, пауза BOT_API_RETRY_BACKOFF * 2^n):
+  * соединение не открылось (connect timeout / refused / DNS) — любой метод: запрос не ушёл;
+  * 5xx, таймаут или обрыв при чтении ответа — только get* (getUpdates, getMe, ...): sendMessage мог
+    уже дойти, повтор — дубль сообщения у пользователя;
+  * 429 не повторяем: retry_after выдерживают вызывающие (TokenBucket рассылки, backoff outbox).
+Попытки и паузы вместе укладываются в BOT_API_TOTAL_TIMEOUT (или в read-таймаут вызова, если он
+больше — long polling getUpdates). Сдались — наверх уходит последнее исключение клиента.
+
+stats() — вызовы, попытки, повторы, открытые соединения и доля переиспользованных, задержки p50/p95;
+в /metrics — bot_api_*.
+"""
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+
+CALL_SECONDS = metrics.histogram(
+    "bot_api_request_duration_seconds", "Вызов Bot API целиком, с повторами", ["transport", "method"]
+)
+CALLS = metrics.counter(
+    "bot_api_requests_total", "Вызовы Bot API по исходу: ok | http_<код> | timeout | connection",
+    ["transport", "method", "result"],
+)
+RETRIES = metrics.counter("bot_api_retries_total", "Повторы по политике транспорта", ["transport", "method"])
+
+
+def retryable(method_name: str, failure: str, has_files: bool = False) -> bool:
+    """failure: connect — запрос не ушёл; read — ушёл, ответа нет; status — ответ 5xx."""
+    if failure == "connect":
+        return True
+    # файл уже вычитан первой попыткой — повтор ушёл бы пустым
+    return method_name.startswith("get") and not has_files
+
+
+def _method_name(url: str) -> str:
+    # .../bot<token>/sendMessage -> sendMessage: токен в метки и логи не попадает
+    return url.rsplit("/", 1)[-1].split("?", 1)[0] or "-"
+
+
+class _Stats:
+    def __init__(self, transport: str):
+        self.transport = transport
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failed = 0
+        self._latency = deque(maxlen=2048)   # мс последних вызовов — p50/p95 без Prometheus
+        self._lock = threading.Lock()
+
+    def retry(self, method: str) -> None:
+        with self._lock:
+            self.retries += 1
+        RETRIES.inc(transport=self.transport, method=method)
+
+    def done(self, method: str, result: str, elapsed: float, attempts: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.attempts += attempts
+            self.failed += result in ("timeout", "connection")
+            self._latency.append(elapsed * 1000)
+        CALL_SECONDS.observe(elapsed, transport=self.transport, method=method)
+        CALLS.inc(transport=self.transport, method=method, result=result)
+
+    def snapshot(self, connections: int) -> dict:
+        with self._lock:
+            latency = sorted(self._latency)
+            calls, attempts, retries, failed = self.calls, self.attempts, self.retries, self.failed
+
+        def pct(p: float) -> float:
+            return round(latency[min(len(latency) - 1, int(len(latency) * p))], 2) if latency else 0.0
+
+        return {
+            "calls": calls,
+            "attempts": attempts,
+            "retries": retries,
+            "failed": failed,
+            "connections": connections,
+            # попытка без нового соединения — переиспользовала keep-alive
+            "reuse": round(max(0.0, 1 - connections / attempts), 3) if attempts else 0.0,
+            "p50_ms": pct(0.5),
+            "p95_ms": pct(0.95),
+        }
+
+
+# ──────────────────────────────
+# Синхронный: requests
+# ──────────────────────────────
+def _not_sent(error) -> bool:
+    """ConnectionError requests: соединение не открылось (а не оборвалось после отправки)."""
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
+
+
+class BotApiTransport:
+    """
+    Сессия requests с keep-alive пулом на BOT_API_POOL_SIZE соединений. request() — подпись
+    requests.Session.request, её и ждёт apihelper.CUSTOM_REQUEST_SENDER.
+    """
+
+    def __init__(
+        self,
+        *,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+        pool_size: Optional[int] = None,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.retries = max(0, settings.BOT_API_RETRIES if retries is None else retries)
+        self.backoff = settings.BOT_API_RETRY_BACKOFF if backoff is None else backoff
+        self.connect_timeout = connect_timeout or settings.BOT_API_CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or settings.BOT_API_READ_TIMEOUT
+        self.total_timeout = total_timeout or settings.BOT_API_TOTAL_TIMEOUT
+        self.session = requests.Session()
+        # повторы — только в request(): у адаптера свои выключены, иначе политики перемножатся
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size or settings.BOT_API_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self._stats = _Stats("sync")
+
+    def request(self, method: str, url: str, params=None, files=None, timeout=None, proxies=None, **kwargs):
+        import requests
+
+        name = _method_name(url)
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        # telebot при timeout= ставит его и на connect — соединение дольше BOT_API_CONNECT_TIMEOUT не ждём
+        connect = min(connect or self.connect_timeout, self.connect_timeout)
+        read = read or self.read_timeout
+        started = time.monotonic()
+        deadline = started + max(self.total_timeout, connect + read)
+        attempt = 0
+        while True:
+            attempt += 1
+            left = max(deadline - time.monotonic(), 0.001)
+            response = error = failure = None
+            try:
+                response = self.session.request(
+                    method, url, params=params, files=files, proxies=proxies,
+                    timeout=(min(connect, left), min(read, left)), **kwargs,
+                )
+                if response.status_code in RETRY_STATUSES:
+                    failure = "status"
+            except requests.exceptions.ConnectTimeout as e:
+                error, failure = e, "connect"
+            except requests.exceptions.ConnectionError as e:
+                error, failure = e, "connect" if _not_sent(e) else "read"
+            except requests.exceptions.Timeout as e:
+                error, failure = e, "read"
+            if failure is None or attempt > self.retries or not retryable(name, failure, bool(files)):
+                break
+            pause = self.backoff * 2 ** (attempt - 1)
+            if time.monotonic() + pause >= deadline:
+                break
+            self._stats.retry(name)
+            time.sleep(pause)
+
+        if error is not None:
+            result = "timeout" if isinstance(error, requests.exceptions.Timeout) else "connection"
+        else:
+            result = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+        self._stats.done(name, result, time.monotonic() - started, attempt)
+        if error is not None:
+            raise error
+        return response
+
+    def connections(self) -> int:
+        """Соединений открыто за жизнь пула (urllib3 num_connections)."""
+        pools = self._adapter.poolmanager.pools
+        return sum(getattr(pools.get(key), "num_connections", 0) for key in pools.keys())
+
+    def stats(self) -> dict:
+        return self._stats.snapshot(self.connections())
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_transport: Optional[BotApiTransport] = None
+_lock = threading.Lock()
+
+
+def get_transport() -> BotApiTransport:
+    """Один транспорт (и пул) на процесс."""
+    global _transport
+    if _transport is None:
+        with _lock:
+            if _transport is None:
+                _transport = BotApiTransport()
+    return _transport
+
+
+def _transport_metrics() -> list[str]:
+    live = [("sync", _transport.stats())] if _transport is not None else []
+    return (
+        metrics.gauge_family("bot_api_connections_opened_total", "Новых соединений к Bot API",
+                             [({"transport": t}, s["connections"]) for t, s in live], "counter")
+        + metrics.gauge_family("bot_api_attempts_total", "HTTP-попыток к Bot API (включая повторы)",
+                               [({"transport": t}, s["attempts"]) for t, s in live], "counter")
+    )
+
+
+metrics.REGISTRY.collector("bot_api", _transport_metrics)
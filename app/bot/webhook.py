@@ -0,0 +1,70 @@
+"""
+Webhook-режим бота (BOT_MODE=webhook).
+
+Апдейты принимает POST /tg/webhook и складывает в UpdateDispatcher: ограниченный пул
+воркеров с порядком внутри чата. Если очередь чата переполнена — отвечаем 503,
+Telegram доставит апдейт повторно позже.
+
+Встроен в app.main (подключается при BOT_MODE=webhook) или запускается отдельно:
+    uvicorn app.bot.webhook:create_webhook_app --factory --port 8081
+
+Локальная проверка без Telegram (BOT_WEBHOOK_URL пустой):
+    curl -X POST localhost:8081/tg/webhook -H 'Content-Type: application/json' -d @update.json
+"""
+import json
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Request, Response
+from telebot import types
+
+from app.core.config import settings
+from app.bot import bot as bot_module
+from app.bot.bot import create_bot, _ALLOWED_UPDATES
+from app.core.identity import start_identity_sync
+
+WEBHOOK_PATH = "/tg/webhook"
+
+router = APIRouter(tags=["bot"])
+
+
+@router.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(None),
+):
+    if settings.BOT_WEBHOOK_SECRET and x_telegram_bot_api_secret_token != settings.BOT_WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="bad secret token")
+    try:
+        update = types.Update.de_json(json.loads(await request.body()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="bad update")
+
+    # не блокируем event loop: места нет (или бот ещё не поднят) — пусть Telegram повторит
+    dispatcher = bot_module.dispatcher
+    if dispatcher is None or not dispatcher.submit(update, timeout=0):
+        return Response(status_code=503, headers={"Retry-After": "1"})
+    return {"ok": True}
+
+
+def start_webhook() -> None:
+    bot = create_bot()
+    bot_module.dispatcher.start()
+    start_identity_sync()  # правки из админки
+    if settings.BOT_WEBHOOK_URL:
+        bot.set_webhook(
+            url=settings.BOT_WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=settings.BOT_WEBHOOK_SECRET or None,
+            allowed_updates=_ALLOWED_UPDATES,
+            max_connections=max(1, settings.BOT_WORKERS),
+        )
+
+
+def stop_webhook() -> None:
+    if bot_module.dispatcher is not None:
+        bot_module.dispatcher.stop()
+
+
+def create_webhook_app() -> FastAPI:
+    """Отдельное ASGI-приложение только с вебхуком."""
+    app = FastAPI(title="Boxing School Bot", on_startup=[start_webhook], on_shutdown=[stop_webhook])
+    app.include_router(router)
+    return app
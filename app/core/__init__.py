@@ -1,2 +1,14 @@
-from app.core.config import settings
-from app.core.db import Base, engine, SessionLocal
\ No newline at end of file
+# Ленивые ре-экспорты: `from app.core.config import settings` не должен тянуть SQLAlchemy и создавать engine
+_EXPORTS = {
+    "settings": "app.core.config",
+    "Base": "app.core.db",
+    "engine": "app.core.db",
+    "SessionLocal": "app.core.db",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module 'app.core' has no attribute {name!r}")
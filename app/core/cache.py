@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class DedupCache:
+    """
+    Множество «недавно виденных» ключей с TTL и ограничением размера.
+
+    TTL у всех ключей одинаковый, поэтому порядок вставки в OrderedDict совпадает
+    с порядком истечения: протухшие ключи всегда в голове и снимаются оттуда.
+    Вставка/проверка — амортизированно O(1), без полного прохода по кэшу.
+
+        seen = DedupCache(ttl=120)
+        if seen.seen((chat_id, message_id)):
+            return  # дубль
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = float(ttl)
+        self.max_size = max(1, int(max_size))
+        self._data: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self, now: float) -> None:
+        data = self._data
+        while data:
+            key, expires_at = next(iter(data.items()))
+            if expires_at > now and len(data) <= self.max_size:
+                break
+            del data[key]
+            self.evictions += 1
+
+    def seen(self, key: Hashable) -> bool:
+        """True — ключ уже встречался за последние ttl секунд; иначе запоминаем его и False."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            if key in self._data:
+                self.hits += 1
+                return True
+            self.misses += 1
+            self._data[key] = now + self.ttl
+            if len(self._data) > self.max_size:
+                self._evict(now)
+            return False
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            self._evict(time.monotonic())
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """
+    Словарь с TTL и ограничением размера — как DedupCache, но хранит значения.
+
+        recent = TTLCache(ttl=120)
+        hit = recent.get(key)
+        if hit is None:
+            recent.set(key, compute())
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = float(ttl)
+        self.max_size = max(1, int(max_size))
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _evict(self, now: float) -> None:
+        data = self._data
+        while data:
+            key, (expires_at, _) = next(iter(data.items()))
+            if expires_at > now and len(data) <= self.max_size:
+                break
+            del data[key]
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._data.pop(key, None)  # переставляем в хвост: порядок = порядок истечения
+            self._data[key] = (now + self.ttl, value)
+            self._evict(now)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -8,9 +8,65 @@ class Settings(BaseSettings):
     BOT_TOKEN: str = Field("", description="Telegram bot token")
     BOT_USERNAME: str = "boxing_school_bot"
     BASE_URL: str = "http://127.0.0.1:8000"
+    # polling | webhook. В webhook-режиме BOT_WEBHOOK_URL — публичный https-адрес сервиса;
+    # пустой адрес = вебхук в Telegram не регистрируем (удобно для локальных POST-ов)
+    BOT_MODE: str = "polling"
+    BOT_WEBHOOK_URL: str = ""
+    BOT_WEBHOOK_SECRET: str = ""
+    # пул обработки апдейтов: воркеры и размер очереди каждого
+    BOT_WORKERS: int = 8
+    BOT_QUEUE_SIZE: int = 100
+    # FSM-состояние диалогов: memory | sqlite | redis (redis — нужен пакет redis)
+    BOT_STATE_BACKEND: str = "sqlite"
+    BOT_STATE_TTL: int = 24 * 3600       # брошенный диалог забываем через сутки
+    BOT_STATE_MAX_SIZE: int = 10000      # предел для memory-бэкенда (LRU)
+    REDIS_URL: str = "redis://localhost:6379/0"
+    # кэш tg_id -> роль/язык/дети; изменения из другого процесса (админка) — через identity_events
+    IDENTITY_CACHE_TTL: int = 300
+    IDENTITY_CACHE_MAX_SIZE: int = 50000
+    IDENTITY_SYNC_INTERVAL: float = 2.0   # сек между опросами identity_events в процессе бота; 0 — только TTL
+    # Транспорт Bot API (app.bot.transport): одна политика повторов и дедлайны на все вызовы
+    BOT_API_URL: str = "https://api.telegram.org"  # фейковый сервер в бенче — http://127.0.0.1:<port>
+    BOT_API_CONNECT_TIMEOUT: float = 5.0
+    BOT_API_READ_TIMEOUT: float = 30.0
+    BOT_API_TOTAL_TIMEOUT: float = 45.0   # на вызов целиком — с повторами и паузами между ними
+    BOT_API_RETRIES: int = 2              # соединение не открылось — любой метод; 5xx/таймаут ответа — только get*
+    BOT_API_RETRY_BACKOFF: float = 0.5    # 0.5, 1, 2 ... сек
+    BOT_API_POOL_SIZE: int = 32           # keep-alive соединений: воркеры бота + рассылки + уведомления
 
     # ДБ
     DATABASE_URL: str = "sqlite:///./data/boxing.db"
+    # SQLite: в одну базу пишут бот, API и админка. WAL — читатели не ждут писателя,
+    # busy_timeout — писатель ждёт блокировку, а не падает с "database is locked".
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"       # в WAL безопасно: теряется только последний коммит при сбое ОС
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE: int = -65536          # отрицательное — в КиБ (64 МиБ на соединение)
+    SQLITE_TEMP_STORE: str = "MEMORY"
+    SQLITE_MAINTENANCE_INTERVAL: int = 600   # сек между wal_checkpoint + optimize; 0 — выключить
+    # дашборд админки: счётчики в stats_counters (app.core.stats) и их сверка с таблицами
+    STATS_RECONCILE_INTERVAL: int = 3600     # сек между пересчётами; 0 — выключить
+    STATS_DASHBOARD_DAYS: int = 14           # заявок по дням на дашборде
+    # трассировка SQL (app.core.sqltrace): время/строки/источник запросов, лог медленных, top-N отчёт
+    SQL_TRACE: bool = False
+    SQL_SLOW_MS: float = 100.0               # порог лога медленных запросов; 0 — не логировать
+    SQL_TRACE_PARAMS: bool = False           # параметры в логе медленных (там телефоны — осторожно)
+    SQL_TRACE_TOP: int = 20                  # строк в отчёте
+    SQL_TRACE_MAX_KEYS: int = 5000           # предел (источник, запрос) в памяти процесса
+    SQL_TRACE_TOKEN: str = ""                # X-Debug-Token для GET /debug/sql в API; пусто — эндпоинта нет
+
+    # Метрики Prometheus (app.core.metrics): GET /metrics в API и админке, у бота в polling — свой порт
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str = ""                  # если задан — нужен Authorization: Bearer <token>
+    BOT_METRICS_HOST: str = "127.0.0.1"
+    BOT_METRICS_PORT: int = 9102             # 0 — не поднимать
+    # async-движок для FastAPI-роутов заявок и кабинета родителя (бот и админка — всегда sync).
+    # Нужны sqlalchemy[asyncio] и драйвер: aiosqlite / asyncpg. Пустой URL — DATABASE_URL с async-драйвером
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: str = ""
+    ASYNC_DB_POOL_SIZE: int = 20          # соединений async-движка: корутин на воркер больше, чем потоков пула
+    ASYNC_DB_MAX_OVERFLOW: int = 30
 
     # Секреты/админка
     SECRET_KEY: str = "change-me"
@@ -26,6 +82,42 @@ class Settings(BaseSettings):
     # Локали
     DEFAULT_LANG: str = "ru"
 
+    # Заявки с сайта: телефоны храним в E.164; без кода страны — считаем местным номером
+    PHONE_DEFAULT_COUNTRY_CODE: str = "998"
+    LEAD_DEDUP_WINDOW: int = 3600           # сек: повтор той же трубы в статусе new — не новая заявка
+    LEAD_RECENT_CACHE_TTL: int = 120        # сек: повторы (двойной клик, спам) отвечаем из памяти, без БД
+    LEAD_RECENT_CACHE_MAX_SIZE: int = 10000
+    LEAD_BULK_MAX_ITEMS: int = 50000        # предел строк в одном POST /api/leads/bulk
+    LEAD_BULK_MAX_BYTES: int = 16 * 1024 * 1024  # предел тела пакета — проверяем до разбора
+    LEAD_BULK_TOKEN: str = ""               # Authorization: Bearer <token>; пусто — пакетная загрузка выключена
+
+    # Лимиты публичных эндпоинтов заявок (скользящее окно): N запросов за окно, сек; 0 — без лимита
+    RATE_LIMIT_BACKEND: str = "memory"      # memory | redis (общий счёт для всех воркеров, нужен пакет redis)
+    RATE_LIMIT_MAX_KEYS: int = 100000       # предел ключей memory-бэкенда (LRU)
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # брать IP из X-Forwarded-For (только за своим прокси!)
+    LEAD_RATE_LIMIT_IP: int = 20
+    LEAD_RATE_LIMIT_IP_WINDOW: int = 60
+    LEAD_RATE_LIMIT_PHONE: int = 5
+    LEAD_RATE_LIMIT_PHONE_WINDOW: int = 3600
+
+    # Рассылки: лимиты Telegram — ~30 сообщений/сек на бота и ~1/сек в один чат
+    BROADCAST_RATE: float = 30.0
+    BROADCAST_CHAT_INTERVAL: float = 1.0
+    BROADCAST_WORKERS: int = 8
+    BROADCAST_MAX_RETRIES: int = 3
+    BROADCAST_BATCH_SIZE: int = 200       # чекпоинт фоновой рассылки — после каждой пачки
+    BROADCAST_POLL_INTERVAL: float = 2.0  # как часто воркер ищет новые задания
+
+    # Уведомления админам о заявках: outbox lead_notifications + фоновый диспетчер
+    NOTIFY_DISPATCHER_IN_API: bool = True  # False — только отдельным процессом (python -m app.services.telegram_notify)
+    NOTIFY_WORKERS: int = 4
+    NOTIFY_BATCH_SIZE: int = 50
+    NOTIFY_POLL_INTERVAL: float = 2.0
+    NOTIFY_SEND_TIMEOUT: int = 15         # сек на один запрос к Bot API
+    NOTIFY_MAX_ATTEMPTS: int = 8
+    NOTIFY_RETRY_BASE: float = 2.0        # backoff: 2, 4, 8 ... сек
+    NOTIFY_RETRY_MAX: float = 600.0
+
     PAYMENT_DETAILS: str = (
         "Реквизиты для оплаты:\n"
         "Карта Uzcard: 8600 **** **** 1234 (И.О. Фамилия)\n"
@@ -1,13 +1,19 @@
 from __future__ import annotations
+import threading
+import time
 from contextlib import contextmanager
-from typing import Generator, Iterator
+from typing import TYPE_CHECKING, AsyncIterator, Generator, Iterator, Optional
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import Session, sessionmaker, declarative_base
-from core.config import settings
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 # -------- Engine --------
 DB_URL = settings.DATABASE_URL
 IS_SQLITE = DB_URL.startswith(("sqlite", "sqlite+pysqlite"))
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in DB_URL or DB_URL.rstrip("/").endswith(":"))
 
 engine = create_engine(
     DB_URL,
@@ -16,14 +22,36 @@ engine = create_engine(
     future=True,
 )
 
-# Включаем внешние ключи в SQLite
+# SQLite: внешние ключи + профиль для нескольких процессов (настройки SQLITE_*)
+def sqlite_pragmas() -> list[str]:
+    pragmas = ["PRAGMA foreign_keys=ON"]
+    if settings.SQLITE_BUSY_TIMEOUT_MS:
+        pragmas.append(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    if settings.SQLITE_JOURNAL_MODE and not IS_SQLITE_MEMORY:
+        pragmas.append(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    if settings.SQLITE_SYNCHRONOUS:
+        pragmas.append(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    if settings.SQLITE_MMAP_SIZE:
+        pragmas.append(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    if settings.SQLITE_CACHE_SIZE:
+        pragmas.append(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    if settings.SQLITE_TEMP_STORE:
+        pragmas.append(f"PRAGMA temp_store={settings.SQLITE_TEMP_STORE}")
+    return pragmas
+
 if IS_SQLITE:
     @event.listens_for(engine, "connect")
     def _set_sqlite_pragma(dbapi_connection, connection_record) -> None:
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON;")
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
         cursor.close()
 
+# Трассировка SQL (SQL_TRACE): время/источник каждого запроса, лог медленных — app.core.sqltrace
+if settings.SQL_TRACE:
+    from app.core.sqltrace import install as _install_sqltrace
+    _install_sqltrace(engine)
+
 # -------- Session factory --------
 SessionLocal = sessionmaker(
     bind=engine,
@@ -56,6 +84,27 @@ def db_session() -> Iterator[Session]:
     finally:
         db.close()
 
+# -------- Счётчик запросов (бенчи, проверка N+1) --------
+@contextmanager
+def count_queries(bind=None) -> Iterator[list[str]]:
+    """
+    SQL, ушедший через движок внутри блока (все потоки):
+        with count_queries() as queries:
+            client.get("/parents")
+        assert len(queries) == 2
+    """
+    bind = bind if bind is not None else engine
+    queries: list[str] = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        queries.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _before)
+    try:
+        yield queries
+    finally:
+        event.remove(bind, "before_cursor_execute", _before)
+
 # -------- Dependency for FastAPI --------
 def get_db() -> Generator[Session, None, None]:
     """
@@ -75,16 +124,138 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+# -------- Async-движок (FastAPI при DB_ASYNC) --------
+# Бот, админка и фоновые воркеры остаются на sync-движке выше; async-движок создаётся
+# лениво при первом запросе, чтобы без DB_ASYNC не требовать aiosqlite/asyncpg.
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+def async_database_url(url: Optional[str] = None) -> str:
+    """ASYNC_DATABASE_URL или DATABASE_URL с async-драйвером: sqlite:// -> sqlite+aiosqlite://."""
+    if url is None and settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = url or DB_URL
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect not in _ASYNC_DRIVERS:
+        raise RuntimeError(f"Нет async-драйвера для {scheme!r}: задай ASYNC_DATABASE_URL")
+    return _ASYNC_DRIVERS[dialect] + sep + rest
+
+def get_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        return _async_engine
+    with _async_lock:
+        if _async_engine is None:
+            if IS_SQLITE_MEMORY:
+                raise RuntimeError("DB_ASYNC не работает с SQLite :memory: — у async-движка была бы своя пустая база")
+            from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+            eng = create_async_engine(
+                async_database_url(),
+                pool_pre_ping=True,
+                pool_size=settings.ASYNC_DB_POOL_SIZE,
+                max_overflow=settings.ASYNC_DB_MAX_OVERFLOW,
+            )
+            if IS_SQLITE:
+                @event.listens_for(eng.sync_engine, "connect")
+                def _set_async_sqlite_pragma(dbapi_connection, connection_record) -> None:
+                    cursor = dbapi_connection.cursor()
+                    for pragma in sqlite_pragmas():
+                        cursor.execute(pragma)
+                    cursor.close()
+
+            if settings.SQL_TRACE:
+                from app.core.sqltrace import install as _install_sqltrace
+                _install_sqltrace(eng.sync_engine)
+
+            _async_sessionmaker = async_sessionmaker(eng, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+            _async_engine = eng
+    return _async_engine
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Зависимость FastAPI для async-роутов:
+        async def handler(..., db: AsyncSession = Depends(get_async_db)):
+            ...
+
+    Как get_db: коммит по завершении обработчика, откат при исключении.
+    Ленивых relationship-ов в async нет — всё нужное грузим явно.
+    """
+    get_async_engine()
+    db = _async_sessionmaker()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+async def dispose_async_engine() -> None:
+    """Закрыть пул async-движка (shutdown приложения)."""
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+# -------- Обслуживание SQLite --------
+_maintenance_started = False
+_maintenance_lock = threading.Lock()
+
+def sqlite_maintenance() -> None:
+    """Сбросить WAL в основной файл (не мешая писателям) и обновить статистику планировщика."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+        conn.exec_driver_sql("PRAGMA optimize")
+
+def start_sqlite_maintenance() -> None:
+    """Фоновый поток: sqlite_maintenance() раз в SQLITE_MAINTENANCE_INTERVAL сек. Повторный вызов — no-op."""
+    global _maintenance_started
+    interval = settings.SQLITE_MAINTENANCE_INTERVAL
+    if not IS_SQLITE or IS_SQLITE_MEMORY or interval <= 0:
+        return
+    with _maintenance_lock:
+        if _maintenance_started:
+            return
+        _maintenance_started = True
+
+    def loop() -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                sqlite_maintenance()
+            except Exception as e:
+                print("sqlite maintenance failed:", repr(e))
+
+    threading.Thread(target=loop, name="sqlite-maintenance", daemon=True).start()
+
 # -------- Bootstrap --------
 def init_db() -> None:
-    """Создаём таблицы, если их ещё нет (простая инициализация без Alembic)."""
-    Base.metadata.create_all(bind=engine)
+    """Довести схему до актуальной версии (app.core.migrations); на актуальной базе — один SELECT."""
+    from app.core.migrations import migrate
+    migrate()
 
 __all__ = [
     "engine",
     "SessionLocal",
     "Base",
     "db_session",
+    "count_queries",
     "get_db",
+    "get_async_engine",
+    "get_async_db",
+    "dispose_async_engine",
     "init_db",
+    "sqlite_maintenance",
+    "start_sqlite_maintenance",
 ]
\ No newline at end of file
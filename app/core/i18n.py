@@ -1,4 +1,7 @@
-from core.config import settings
+from types import MappingProxyType
+from typing import Mapping
+
+from app.core.config import settings
 
 # --- Переводы для бота ---
 I18N = {
@@ -82,10 +85,73 @@ I18N = {
     }
 }
 
+# --- Скомпилированные каталоги бота ---
+# I18N — исходник; на импорте собираем из него неизменяемые каталоги по языкам
+# (недостающие ключи — из языка по умолчанию) и обратные индексы «текст кнопки -> ключ».
+# Индексы раздельные для родителя и ребёнка: «Помощь» у них — разные кнопки.
+PARENT_BUTTON_KEYS = (
+    "btn_sign", "btn_back", "btn_prices", "btn_schedule", "btn_create_child",
+    "btn_my_children", "btn_help", "btn_pay", "main_menu",
+)
+KID_BUTTON_KEYS = ("kid_schedule", "kid_help", "btn_back")
+# кнопки выбора языка одинаковы для всех языков
+LANG_BUTTONS = MappingProxyType({"Русский": "ru", "O'zbekcha": "uz"})
+
+CATALOGS: Mapping[str, Mapping[str, str]] = MappingProxyType({})
+PARENT_BUTTONS: Mapping[str, str] = MappingProxyType({})
+KID_BUTTONS: Mapping[str, str] = MappingProxyType({})
+MISSING: Mapping[str, frozenset] = MappingProxyType({})
+_default_catalog: Mapping[str, str] = MappingProxyType({})
+
+# Версия переводов бота: растёт при каждой перекомпиляции (update_i18n()).
+# Кто кэширует производные от текстов (клавиатуры бота), сверяется с ней.
+VERSION = 0
+
+
+def _button_index(catalogs: dict, keys: tuple) -> MappingProxyType:
+    index: dict[str, str] = {}
+    for lang, cat in catalogs.items():
+        for key in keys:
+            text = cat[key]
+            if index.get(text, key) != key:
+                raise RuntimeError(f"i18n: кнопка {text!r} ({lang}) совпадает у {index[text]!r} и {key!r}")
+            index[text] = key
+    return MappingProxyType(index)
+
+
+def compile_i18n() -> None:
+    """Пересобрать каталоги и индексы из I18N. Ключи без перевода пишем в MISSING и в лог."""
+    global CATALOGS, PARENT_BUTTONS, KID_BUTTONS, MISSING, _default_catalog, VERSION
+    default = I18N[settings.DEFAULT_LANG]
+    all_keys = set().union(*I18N.values())
+    catalogs, missing = {}, {}
+    for lang, texts in I18N.items():
+        lost = all_keys - set(texts)
+        if lost:
+            missing[lang] = frozenset(lost)
+            print(f"i18n: в '{lang}' нет ключей: {', '.join(sorted(lost))}")
+        catalogs[lang] = MappingProxyType({**{k: default.get(k, k) for k in lost}, **texts})
+
+    PARENT_BUTTONS = _button_index(catalogs, PARENT_BUTTON_KEYS)
+    KID_BUTTONS = _button_index(catalogs, KID_BUTTON_KEYS)
+    CATALOGS = MappingProxyType(catalogs)
+    MISSING = MappingProxyType(missing)
+    _default_catalog = catalogs[settings.DEFAULT_LANG]
+    VERSION += 1
+
+
 def t(lang: str, key: str) -> str:
     """Переводы для бота."""
-    lang = lang if lang in I18N else settings.DEFAULT_LANG
-    return I18N.get(lang, I18N[settings.DEFAULT_LANG]).get(key, key)
+    return CATALOGS.get(lang, _default_catalog).get(key, key)
+
+
+def update_i18n(lang: str, items: dict) -> None:
+    """Поменять/добавить переводы бота на лету; каталоги пересобираются, кэши клавиатур — тоже."""
+    I18N.setdefault(lang, {}).update(items)
+    compile_i18n()
+
+
+compile_i18n()
 
 # --- Тексты для сайта (RU/UZ) ---
 TX = {
@@ -0,0 +1,233 @@
+"""
+Кэш «кто это»: tg_id -> Identity (ребёнок / родитель / новый, язык, есть ли дети).
+
+Бот смотрит на это при каждом апдейте, поэтому для вернувшегося пользователя
+ответ берём из памяти процесса, без запросов в БД.
+
+Инвалидация:
+  * ORM — автоматически: после коммита любой сессии, в которой менялись
+    parents/children, выкидываем затронутые tg_id, а по parent_id — и самого родителя,
+    и его детей (у них в Identity язык родителя); см. _collect/_apply ниже;
+  * другой процесс (админка, API) — те же события ORM пишут строки в identity_events в той же
+    транзакции; процесс бота раз в IDENTITY_SYNC_INTERVAL сек дочитывает новые и инвалидирует
+    (start_identity_sync). Горячий путь в БД по-прежнему не ходит;
+  * сырой SQL — вызовите IDENTITIES.invalidate(tg_id) / invalidate_parent(parent_id);
+  * всё остальное — TTL (IDENTITY_CACHE_TTL).
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Identity:
+    role: str                     # "kid" | "parent" | "new"
+    language: str
+    parent_id: Optional[int] = None
+    child_id: Optional[int] = None
+    has_child: bool = False
+    name: str = ""                # ФИО родителя / имя ребёнка — для приветствий
+
+
+class IdentityCache:
+    """TTL + LRU по последней записи; плюс индекс parent_id -> tg_id родителя и его детей."""
+
+    def __init__(self, ttl: float, max_size: int = 50000):
+        self.ttl = float(ttl)
+        self.max_size = max(1, int(max_size))
+        self._data: "OrderedDict[str, tuple[float, Identity]]" = OrderedDict()
+        self._by_parent: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tg_id) -> Optional[Identity]:
+        key = str(tg_id)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[1]
+
+    def put(self, tg_id, ident: Identity) -> None:
+        key = str(tg_id)
+        now = time.monotonic()
+        with self._lock:
+            self._drop(key)
+            self._data[key] = (now + self.ttl, ident)
+            if ident.parent_id is not None:
+                self._by_parent.setdefault(ident.parent_id, set()).add(key)
+            while self._data:
+                head, (expires_at, _) = next(iter(self._data.items()))
+                if expires_at >= now and len(self._data) <= self.max_size:
+                    break
+                self._drop(head)
+
+    def invalidate(self, tg_id) -> None:
+        if tg_id is None:
+            return
+        with self._lock:
+            self._drop(str(tg_id))
+
+    def invalidate_parent(self, parent_id) -> None:
+        if parent_id is None:
+            return
+        with self._lock:
+            for key in list(self._by_parent.get(parent_id, ())):
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._by_parent.clear()
+
+    def _drop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None and item[1].parent_id is not None:
+            keys = self._by_parent.get(item[1].parent_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_parent[item[1].parent_id]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+IDENTITIES = IdentityCache(settings.IDENTITY_CACHE_TTL, settings.IDENTITY_CACHE_MAX_SIZE)
+
+
+# ──────────────────────────────
+# Инвалидация по событиям ORM
+# ──────────────────────────────
+# Таблицы сравниваем по имени, а не по классу: так проще и не тянет app.core.models при импорте.
+_PENDING = "identity_invalidate"
+
+
+def _old_and_new(obj, attr: str) -> list:
+    hist = inspect(obj).attrs[attr].history
+    return [v for v in (*hist.deleted, *hist.added, *hist.unchanged) if v is not None]
+
+
+def _events_table():
+    from app.core.models import IdentityEvent
+    return IdentityEvent.__table__
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session: Session, flush_context) -> None:
+    tg_ids, parent_ids = set(), set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table == "parents":
+            tg_ids.update(_old_and_new(obj, "tg_id"))
+            parent_ids.update(_old_and_new(obj, "id"))
+        elif table == "children":
+            tg_ids.update(_old_and_new(obj, "tg_id"))
+            parent_ids.update(_old_and_new(obj, "parent_id"))
+    if not (tg_ids or parent_ids):
+        return
+    pending_tg, pending_parents = session.info.setdefault(_PENDING, (set(), set()))
+    pending_tg.update(tg_ids)
+    pending_parents.update(parent_ids)
+    # для других процессов — в той же транзакции: откат сессии откатывает и события
+    now = time.time()
+    rows = [{"tg_id": str(t), "parent_id": None, "created_at": now} for t in tg_ids]
+    rows += [{"tg_id": None, "parent_id": p, "created_at": now} for p in parent_ids]
+    session.connection().execute(_events_table().insert(), rows)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    tg_ids, parent_ids = pending
+    for tg_id in tg_ids:
+        IDENTITIES.invalidate(tg_id)
+    for parent_id in parent_ids:
+        IDENTITIES.invalidate_parent(parent_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+# ──────────────────────────────
+# События других процессов (identity_events)
+# ──────────────────────────────
+_sync_lock = threading.Lock()
+_sync_started = False
+_last_event_id: Optional[int] = None
+_last_purge = 0.0
+
+
+def sync_identities() -> int:
+    """
+    Инвалидировать то, что поменяли другие процессы с прошлого вызова; возвращает число событий.
+    Первый вызов только запоминает, докуда дочитано. Раз в IDENTITY_CACHE_TTL чистим события
+    старше двух TTL — кэш столько не живёт.
+    """
+    global _last_event_id, _last_purge
+    from app.core.db import engine
+
+    table = _events_table()
+    with _sync_lock, engine.connect() as conn:
+        if _last_event_id is None:
+            _last_event_id = conn.execute(select(func.max(table.c.id))).scalar() or 0
+            return 0
+        rows = conn.execute(
+            select(table.c.id, table.c.tg_id, table.c.parent_id)
+            .where(table.c.id > _last_event_id).order_by(table.c.id)
+        ).all()
+        for _, tg_id, parent_id in rows:
+            IDENTITIES.invalidate(tg_id)
+            IDENTITIES.invalidate_parent(parent_id)
+        if rows:
+            _last_event_id = rows[-1][0]
+        now = time.time()
+        ttl = max(settings.IDENTITY_CACHE_TTL, 60)
+        if now - _last_purge >= ttl:
+            _last_purge = now
+            conn.execute(table.delete().where(table.c.created_at < now - 2 * ttl))
+            conn.commit()
+        return len(rows)
+
+
+def start_identity_sync() -> None:
+    """Фоновый поток: sync_identities() раз в IDENTITY_SYNC_INTERVAL сек. Повторный вызов — no-op."""
+    global _sync_started
+    interval = settings.IDENTITY_SYNC_INTERVAL
+    if interval <= 0:
+        return
+    with _sync_lock:
+        if _sync_started:
+            return
+        _sync_started = True
+
+    def loop() -> None:
+        while True:
+            try:
+                sync_identities()
+            except Exception as e:
+                print("identity sync failed:", repr(e))
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="identity-sync", daemon=True).start()
@@ -0,0 +1,303 @@
+"""
+Метрики в текстовом формате Prometheus (exposition 0.0.4) — без prometheus_client и внешних сервисов.
+
+    LEADS = counter("leads_total", "Заявки по исходу", ["result"])
+    LEADS.inc(result="created")
+    with UPDATE_SECONDS.time(handler="on_text"):
+        ...
+    watch_cache("seen_msg", SEEN_MSG)
+    REGISTRY.collector("fsm", lambda: gauge_family("bot_fsm_states", "...", [({}, len(STATE))]))
+
+Отдают их: GET /metrics в API (app.main) и в админке, у бота в polling-режиме — маленький
+HTTP-сервер сбоку (serve(), BOT_METRICS_PORT). METRICS_TOKEN — если задан, нужен
+заголовок Authorization: Bearer <token>.
+
+Метрики и коллекторы регистрируются по имени: повторный counter()/collector() с тем же именем
+вернёт/заменит существующий (модуль бота бывает импортирован дважды — как __main__ и как app.bot.bot).
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Iterator, Optional, Sequence
+
+from app.core.config import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# секунды: от быстрых запросов к БД до долгих вызовов Bot API
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ──────────────────────────────
+# Метрики
+# ──────────────────────────────
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {sorted(self.labelnames)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {_escape(self.doc)}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                item = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            item[0][i] += 1
+            item[1] += value
+            item[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            item = self._values.get(self._key(labels))
+            return item[2] if item else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = self._header()
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                acc += n
+                lines.append(f"{self.name}_bucket{_labels(names, key + (_num(bound),))} {acc}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def gauge_family(name: str, doc: str, samples: Iterable[tuple[dict, float]], kind: str = "gauge") -> list[str]:
+    """Строки одной метрики для коллектора: samples — [({метка: значение}, число), ...]."""
+    lines = [f"# HELP {name} {_escape(doc)}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_num(value)}")
+    return lines
+
+
+# ──────────────────────────────
+# Реестр
+# ──────────────────────────────
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: dict[str, Callable[[], list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def collector(self, name: str, fn: Callable[[], list[str]]) -> None:
+        """fn() -> строки в формате exposition (см. gauge_family); вызывается на каждый scrape."""
+        with self._lock:
+            self._collectors[name] = fn
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines: list[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        for name, fn in collectors:
+            try:
+                lines += fn()
+            except Exception as e:
+                # сломанный коллектор не должен ронять весь scrape
+                lines.append(f"# collector {name} failed: {_escape(repr(e))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, doc, labelnames))
+
+
+def histogram(name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, doc, labelnames, buckets))
+
+
+def authorized(auth_header: Optional[str]) -> bool:
+    """METRICS_TOKEN не задан — открыто; иначе Authorization: Bearer <token>."""
+    return not settings.METRICS_TOKEN or auth_header == f"Bearer {settings.METRICS_TOKEN}"
+
+
+# ──────────────────────────────
+# Общие метрики процессов
+# ──────────────────────────────
+HTTP_SECONDS = histogram(
+    "http_request_duration_seconds", "Время ответа HTTP по маршруту", ["app", "method", "route", "status"]
+)
+
+
+def _db_pool() -> list[str]:
+    from app.core import db
+
+    samples = {"checked_out": [], "size": [], "overflow": []}
+    engines = [("sync", db.engine)]
+    if db._async_engine is not None:
+        engines.append(("async", db._async_engine.sync_engine))
+    for label, eng in engines:
+        pool = eng.pool
+        if not hasattr(pool, "checkedout"):
+            continue
+        samples["checked_out"].append(({"engine": label}, pool.checkedout()))
+        samples["size"].append(({"engine": label}, pool.size()))
+        samples["overflow"].append(({"engine": label}, max(0, pool.overflow())))
+    return (
+        gauge_family("db_pool_checked_out", "Соединений пула выдано сейчас", samples["checked_out"])
+        + gauge_family("db_pool_size", "Размер пула соединений", samples["size"])
+        + gauge_family("db_pool_overflow", "Соединений сверх pool_size", samples["overflow"])
+    )
+
+
+REGISTRY.collector("db_pool", _db_pool)
+
+
+_CACHES: dict = {}
+
+
+def watch_cache(name: str, cache) -> None:
+    """Отдавать размер и попадания/промахи кэша (DedupCache, TTLCache, IdentityCache — всё, у чего есть .stats())."""
+    _CACHES[name] = cache
+
+
+def _caches() -> list[str]:
+    stats = {name: cache.stats() for name, cache in sorted(_CACHES.items())}
+    return (
+        gauge_family("cache_size", "Ключей в кэше процесса", [({"cache": n}, s["size"]) for n, s in stats.items()])
+        + gauge_family("cache_hits_total", "Попаданий в кэш",
+                       [({"cache": n}, s.get("hits", 0)) for n, s in stats.items()], "counter")
+        + gauge_family("cache_misses_total", "Промахов кэша",
+                       [({"cache": n}, s.get("misses", 0)) for n, s in stats.items()], "counter")
+    )
+
+
+REGISTRY.collector("caches", _caches)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware FastAPI: время ответа по шаблону маршрута (/parent/{tg_id}, а не каждому id)."""
+
+    def __init__(self, app, app_name: str = "api"):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                app=self.app_name, method=scope.get("method", ""),
+                route=getattr(route, "path", None) or "<unmatched>", status=status[0],
+            )
+
+
+# ──────────────────────────────
+# HTTP-сервер сбоку (бот в polling)
+# ──────────────────────────────
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        if not authorized(self.headers.get("Authorization")):
+            self.send_error(401)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # без строки в stdout на каждый scrape
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """GET /metrics на host:port в фоновом потоке. port=0 — любой свободный (server.server_port)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"metrics: http://{host}:{server.server_port}/metrics")
+    return server
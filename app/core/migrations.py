@@ -0,0 +1,227 @@
+"""
+Версионные миграции схемы (без Alembic).
+
+Таблица schema_version хранит номера применённых миграций. migrate() на старте любого
+процесса делает один SELECT; если схема актуальна — больше ничего. Иначе берёт
+блокировку записи (SQLite: BEGIN IMMEDIATE), перечитывает версию — вдруг соседний процесс
+уже всё сделал — и применяет недостающие миграции по порядку в одной транзакции.
+
+Новая миграция — функция ниже + строка в MIGRATIONS со следующим номером.
+Применённые миграции не редактируем: существующие базы их уже прошли.
+"""
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.core.db import Base, engine, IS_SQLITE
+import app.core.models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+
+def _create_tables(conn: Connection, *names: str) -> None:
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables[n] for n in names])
+
+
+def _add_columns(conn: Connection, table: str, columns: dict[str, str]) -> None:
+    have = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, ddl in columns.items():
+        if name not in have:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def _m1_baseline(conn: Connection) -> None:
+    """Исходная схема + колонки, которые раньше досоздавали бот, админка и migrate_children_phone.sql."""
+    _create_tables(conn, "parents", "children", "leads", "appointments", "message_templates", "admin_users")
+    _add_columns(conn, "parents", {"phone": "VARCHAR", "tg_username": "VARCHAR"})
+    _add_columns(conn, "children", {
+        "tg_id": "VARCHAR",
+        "schedule_text": "TEXT",
+        "paid": "BOOLEAN DEFAULT 0",
+        "phone": "VARCHAR",
+        "tg_username": "VARCHAR",
+    })
+    _add_columns(conn, "leads", {
+        "name": "VARCHAR",
+        "age": "INTEGER",
+        "processed": "BOOLEAN DEFAULT 0",
+        "source": "VARCHAR",
+        "tg_username": "VARCHAR",
+    })
+    _add_columns(conn, "appointments", {"created_at": "DATETIME"})
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_children_phone ON children (phone)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_children_tg_id ON children (tg_id)"))
+
+
+def _m2_broadcast_jobs(conn: Connection) -> None:
+    _create_tables(conn, "broadcast_jobs")
+
+
+def _m3_bot_state(conn: Connection) -> None:
+    _create_tables(conn, "bot_state")
+
+
+def _m4_lead_notifications(conn: Connection) -> None:
+    _create_tables(conn, "lead_notifications")
+
+
+def _m5_lead_dedup(conn: Connection) -> None:
+    """Телефоны заявок -> E.164; вместо индекса по phone — составной под запрос антидубля."""
+    from app.core.phone import to_e164
+
+    for lead_id, phone in conn.execute(text("SELECT id, phone FROM leads")).all():
+        try:
+            normalized = to_e164(phone)
+        except ValueError:
+            continue  # мусор оставляем как есть — старые заявки не теряем
+        if normalized != phone:
+            conn.execute(text("UPDATE leads SET phone = :p WHERE id = :id"), {"p": normalized, "id": lead_id})
+    conn.execute(text("DROP INDEX IF EXISTS ix_leads_phone"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_leads_phone_status_created ON leads (phone, status, created_at)"
+    ))
+
+
+_LIST_INDEXES = {
+    "ix_parents_language_id": "parents (language, id)",
+    "ix_parents_created_id": "parents (created_at, id)",
+    "ix_children_paid_id": "children (paid, id)",
+    "ix_children_created_id": "children (created_at, id)",
+    "ix_leads_processed_id": "leads (processed, id)",
+    "ix_leads_source_id": "leads (source, id)",
+    "ix_leads_created_id": "leads (created_at, id)",
+    "ix_appointments_created_id": "appointments (created_at, id)",
+}
+
+
+def _m6_admin_list_indexes(conn: Connection) -> None:
+    """Индексы под фильтры и keyset-пагинацию списков админки (app.admin.listing)."""
+    for name, target in _LIST_INDEXES.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+
+
+def _m7_stats_counters(conn: Connection) -> None:
+    """Счётчики дашборда: таблица и начальные значения по существующим данным."""
+    from app.core.stats import actual_counts
+
+    _create_tables(conn, "stats_counters")
+    table = Base.metadata.tables["stats_counters"]
+    conn.execute(table.delete())
+    rows = [{"key": k, "value": v} for k, v in actual_counts(conn).items()]
+    if rows:
+        conn.execute(table.insert(), rows)
+
+
+def _m8_broadcast_claim(conn: Connection) -> None:
+    """Владелец задания рассылки: heartbeat и чекпоинт пишет только он (app.services.broadcast_jobs)."""
+    _add_columns(conn, "broadcast_jobs", {"claimed_by": "VARCHAR"})
+
+
+def _m9_children_created_at(conn: Connection) -> None:
+    """
+    children.created_at заполнял server_default CURRENT_TIMESTAMP — в SQLite это строка без
+    микросекунд, а параметры SQLAlchemy приходят с «.000000». Строки сравниваются посимвольно:
+    курсор keyset-пагинации не отсекал свою же строку, граница date_from — строки ровно на полночь.
+    Теперь значение ставит Python (как в остальных таблицах); старые строки приводим к тому же виду.
+    """
+    if IS_SQLITE:
+        conn.execute(text(
+            "UPDATE children SET created_at = created_at || '.000000' WHERE length(created_at) = 19"
+        ))
+
+
+def _m10_stats_parents_paid(conn: Connection) -> None:
+    """Счётчик parents_paid (родители с оплаченным ребёнком) — начальное значение по данным."""
+    from app.core.stats import actual_counts
+
+    table = Base.metadata.tables["stats_counters"]
+    conn.execute(table.delete().where(table.c.key == "parents_paid"))
+    conn.execute(table.insert().values(key="parents_paid", value=actual_counts(conn)["parents_paid"]))
+
+
+def _m11_identity_events(conn: Connection) -> None:
+    """Журнал изменений parents/children для кэша личностей других процессов (app.core.identity)."""
+    _create_tables(conn, "identity_events")
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline", _m1_baseline),
+    (2, "broadcast_jobs", _m2_broadcast_jobs),
+    (3, "bot_state", _m3_bot_state),
+    (4, "lead_notifications", _m4_lead_notifications),
+    (5, "lead_dedup", _m5_lead_dedup),
+    (6, "admin_list_indexes", _m6_admin_list_indexes),
+    (7, "stats_counters", _m7_stats_counters),
+    (8, "broadcast_claim", _m8_broadcast_claim),
+    (9, "children_created_at", _m9_children_created_at),
+    (10, "stats_parents_paid", _m10_stats_parents_paid),
+    (11, "identity_events", _m11_identity_events),
+]
+LATEST = MIGRATIONS[-1][0]
+
+_lock = threading.Lock()
+_done = False
+
+
+def current_version(conn: Connection) -> int:
+    try:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0  # таблицы ещё нет
+
+
+def migrate() -> int:
+    """Довести схему до LATEST. Возвращает, сколько миграций применено (0 — схема была актуальна)."""
+    global _done
+    if _done:
+        return 0
+    with _lock:
+        if _done:
+            return 0
+        with engine.connect() as conn:
+            if current_version(conn) >= LATEST:
+                _done = True
+                return 0
+        applied = _apply_pending()
+        _done = True
+        return applied
+
+
+def _apply_pending() -> int:
+    with engine.connect() as conn:
+        if IS_SQLITE:
+            # pysqlite сам открывает транзакцию только перед DML; берём блокировку записи явно
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.begin()
+        try:
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at FLOAT NOT NULL)"
+            ))
+            version = current_version(conn)
+            applied = 0
+            for num, name, func in MIGRATIONS:
+                if num <= version:
+                    continue
+                func(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": num, "n": name, "t": time.time()},
+                )
+                print(f"schema migration {num} ({name}) applied")
+                applied += 1
+        except Exception:
+            if IS_SQLITE:
+                conn.exec_driver_sql("ROLLBACK")
+            else:
+                conn.rollback()
+            raise
+        if IS_SQLITE:
+            conn.exec_driver_sql("COMMIT")
+        else:
+            conn.commit()
+        return applied
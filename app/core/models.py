@@ -1,15 +1,20 @@
 from __future__ import annotations
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Boolean, ForeignKey, Text, UniqueConstraint, Index, func
+    Column, Integer, BigInteger, String, DateTime, Boolean, Float, ForeignKey, Text, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship, Mapped
-from core.db import Base
+from app.core.db import Base
 
 # --------------------------- CRM ---------------------------
 
 class Parent(Base):
     __tablename__ = "parents"
+    __table_args__ = (
+        # списки админки: фильтр + keyset по (колонка, id)
+        Index("ix_parents_language_id", "language", "id"),
+        Index("ix_parents_created_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = Column(Integer, primary_key=True)
     tg_id: Mapped[str | None] = Column(String, unique=True, index=True)
@@ -30,6 +35,11 @@ class Parent(Base):
 
 class Child(Base):
     __tablename__ = "children"
+    __table_args__ = (
+        Index("ix_children_parent_name", "parent_id", "name"),
+        Index("ix_children_paid_id", "paid", "id"),
+        Index("ix_children_created_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = Column(Integer, primary_key=True)
     parent_id: Mapped[int] = Column(
@@ -41,10 +51,9 @@ class Child(Base):
     token: Mapped[str | None] = Column(String, unique=True, index=True)
     has_telegram: Mapped[bool] = Column(Boolean, default=True)
 
-    # сделаем timezone-aware и на стороне БД
-    created_at: Mapped[datetime] = Column(
-        DateTime(timezone=True), server_default=func.now()
-    )
+    # значение ставит Python, как в остальных таблицах: server_default в SQLite писал время
+    # без микросекунд, и keyset/фильтры по дате с ним не сходились (миграция 9)
+    created_at: Mapped[datetime] = Column(DateTime(timezone=True), default=datetime.utcnow)
 
     tg_id: Mapped[str | None] = Column(String, index=True, nullable=True)
     phone: Mapped[str | None] = Column(String, index=True, nullable=True)  # ⬅️ добавили
@@ -56,18 +65,22 @@ class Child(Base):
         "Appointment", back_populates="child", cascade="all, delete-orphan"
     )
 
-    __table_args__ = (
-        Index("ix_children_parent_name", "parent_id", "name"),
-    )
-
 
 class Lead(Base):
     __tablename__ = "leads"
+    __table_args__ = (
+        # антидубль: phone = ? AND status = 'new' AND created_at >= ? — целиком по индексу
+        Index("ix_leads_phone_status_created", "phone", "status", "created_at"),
+        # списки админки
+        Index("ix_leads_processed_id", "processed", "id"),
+        Index("ix_leads_source_id", "source", "id"),
+        Index("ix_leads_created_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = Column(Integer, primary_key=True, index=True)
     # форма сайта:
     name: Mapped[str] = Column(String(120), nullable=False)
-    phone: Mapped[str] = Column(String(64), nullable=False, index=True)
+    phone: Mapped[str] = Column(String(64), nullable=False)   # E.164, см. app.core.phone
     age: Mapped[str | None] = Column(String(16))
     comment: Mapped[str | None] = Column(String(600))
     # CRM:
@@ -83,6 +96,9 @@ class Lead(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("ix_appointments_created_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = Column(Integer, primary_key=True)
     child_id: Mapped[int] = Column(Integer, ForeignKey("children.id", ondelete="CASCADE"), index=True)
@@ -105,6 +121,58 @@ class MessageTemplate(Base):
     created_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow)
 
 
+class BroadcastJob(Base):
+    """Рассылка в очереди. last_tg_id — чекпоинт: всё до него (по порядку tg_id) уже отправлено."""
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = Column(Integer, primary_key=True)
+    audience: Mapped[str] = Column(String, default="parents")   # parents|children
+    text: Mapped[str] = Column(Text, default="")
+    status: Mapped[str] = Column(String, default="queued", index=True)   # queued|running|done|failed
+    total: Mapped[int] = Column(Integer, default=0)
+    sent: Mapped[int] = Column(Integer, default=0)
+    failed: Mapped[int] = Column(Integer, default=0)
+    rate: Mapped[float] = Column(Float, default=0.0)
+    last_tg_id: Mapped[str | None] = Column(String, nullable=True)
+    error: Mapped[str | None] = Column(Text, nullable=True)
+    created_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+    heartbeat_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+    claimed_by: Mapped[str | None] = Column(String, nullable=True)   # токен воркера, который ведёт задание
+    finished_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+
+
+class LeadNotification(Base):
+    """
+    Outbox уведомлений админам: строка = одно сообщение в один чат.
+    Пишется в той же транзакции, что и заявка; доставляет app.services.telegram_notify.
+    """
+    __tablename__ = "lead_notifications"
+    __table_args__ = (Index("ix_lead_notifications_due", "status", "next_attempt_at"),)
+
+    id: Mapped[int] = Column(Integer, primary_key=True)
+    lead_id: Mapped[int | None] = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), index=True, nullable=True)
+    chat_id: Mapped[int] = Column(BigInteger, nullable=False)
+    text: Mapped[str] = Column(Text, default="")
+    status: Mapped[str] = Column(String, default="pending")   # pending|sending|sent|failed
+    attempts: Mapped[int] = Column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow)
+    claimed_by: Mapped[str | None] = Column(String, nullable=True)
+    claimed_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = Column(Text, nullable=True)
+    created_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+
+
+class BotState(Base):
+    """FSM-состояние диалога бота (бэкенд BOT_STATE_BACKEND=sqlite)."""
+    __tablename__ = "bot_state"
+
+    tg_id: Mapped[str] = Column(String, primary_key=True)
+    data: Mapped[str] = Column(Text, default="{}")              # JSON
+    expires_at: Mapped[float] = Column(Float, index=True)      # unix time
+
+
 class AdminUser(Base):
     __tablename__ = "admin_users"
 
@@ -112,4 +180,26 @@ class AdminUser(Base):
     login: Mapped[str] = Column(String, unique=True, index=True)
     password_hash: Mapped[str] = Column(String)
     created_at: Mapped[datetime] = Column(DateTime, default=datetime.utcnow)
-    is_active: Mapped[bool] = Column(Boolean, default=True)
\ No newline at end of file
+    is_active: Mapped[bool] = Column(Boolean, default=True)
+
+class StatCounter(Base):
+    """Счётчик дашборда (app.core.stats): ведётся событиями ORM, сверяется с таблицами reconcile()."""
+    __tablename__ = "stats_counters"
+
+    key: Mapped[str] = Column(String, primary_key=True)   # parents | leads_day:2025-01-31 | appts_slot:...
+    value: Mapped[int] = Column(Integer, nullable=False, default=0)
+
+
+class IdentityEvent(Base):
+    """Изменение parents/children — для кэша личностей в других процессах (app.core.identity)."""
+    __tablename__ = "identity_events"
+
+    id: Mapped[int] = Column(Integer, primary_key=True)
+    tg_id: Mapped[str | None] = Column(String, nullable=True)
+    parent_id: Mapped[int | None] = Column(Integer, nullable=True)
+    created_at: Mapped[float] = Column(Float, index=True)      # unix time
+
+
+# события ORM, которые ведут stats_counters и identity_events, — во всех процессах, что пишут в эти таблицы
+import app.core.stats  # noqa: E402,F401
+import app.core.identity  # noqa: E402,F401
@@ -0,0 +1,32 @@
+"""
+Телефоны в E.164 (+998901234567) — одна запись одного номера, чтобы антидубль заявок
+сравнивал строки, а не «+998 90 123-45-67» с «8 90 1234567».
+"""
+from typing import Optional
+
+from app.core.config import settings
+
+
+def to_e164(raw: str, default_cc: Optional[str] = None) -> str:
+    """
+    Привести номер к E.164. Без кода страны считаем номер местным (PHONE_DEFAULT_COUNTRY_CODE).
+    ValueError — если это не похоже на телефон.
+    """
+    s = (raw or "").strip()
+    if s[:1] == "+" and s[1:].isdigit() and 8 <= len(s) - 1 <= 15 and s[1] != "0":
+        return s                                    # уже E.164 — частый случай в пакетной загрузке
+    cc = (default_cc or settings.PHONE_DEFAULT_COUNTRY_CODE).lstrip("+")
+    digits = "".join(ch for ch in s if ch.isdigit())
+    if s.startswith("+"):
+        pass                                        # уже международный
+    elif digits.startswith("00"):
+        digits = digits[2:]                         # 00998... — международный префикс
+    elif digits.startswith(cc) and len(digits) > 9:
+        pass                                        # 998901234567 без плюса
+    elif len(digits) == 10 and digits.startswith("8"):
+        digits = cc + digits[1:]                    # 8 90 1234567 — старый междугородний префикс
+    elif len(digits) == 9:
+        digits = cc + digits                        # 90 123 45 67 — местный
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        raise ValueError("invalid phone number")
+    return "+" + digits
@@ -0,0 +1,145 @@
+"""
+Ограничение частоты запросов: скользящее окно (sliding window counter).
+
+На ключ храним три числа — номер текущего окна, счётчики текущего и прошлого окна.
+Оценка «сколько было за последние `window` секунд» = прошлое * (доля прошлого окна,
+ещё попадающая в скользящее) + текущее. Память O(ключей), проверка O(1) — единицы мкс.
+
+    memory — в процессе (LRU на RATE_LIMIT_MAX_KEYS ключей); у каждого воркера свой счёт;
+    redis  — общий счёт для всех процессов (нужен пакет redis).
+
+    limiter = create_rate_limiter()
+    wait = limiter.hit("ip:1.2.3.4", limit=20, window=60)
+    if wait:
+        ...  # 429, Retry-After: ceil(wait)
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import settings
+
+
+def _estimate(prev: int, curr: int, frac: float) -> float:
+    return prev * (1.0 - frac) + curr
+
+
+def _retry_after(prev: int, curr: int, frac: float, limit: int, window: float) -> float:
+    """Через сколько секунд оценка опустится настолько, что пройдёт ещё один запрос."""
+    if curr + 1 > limit:
+        # до конца текущего окна не пройдёт; в следующем curr станет prev и должен «остыть»:
+        # curr * (1 - f) <= limit - 1
+        return window * (1.0 - frac) + window * max(0.0, 1.0 - (limit - 1) / curr)
+    need = 1.0 - (limit - 1 - curr) / prev  # доля окна, после которой prev*(1-f) + curr <= limit - 1
+    return max((need - frac) * window, 0.001)
+
+
+class RateLimiter(ABC):
+    """
+    Интерфейс. hit() — 0.0, если запрос пропущен (и засчитан), иначе сколько секунд ждать.
+    Счётчики stats() — по правилам: правило = префикс ключа до двоеточия ("ip", "phone").
+    """
+
+    def __init__(self):
+        self._counters: dict[str, list[int]] = {}   # правило -> [пропущено, отклонено]
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def hit(self, key: str, limit: int, window: float) -> float:
+        ...
+
+    def _count(self, key: str, wait: float) -> float:
+        rule = key.partition(":")[0]
+        with self._stats_lock:
+            c = self._counters.get(rule)
+            if c is None:
+                c = self._counters[rule] = [0, 0]
+            c[1 if wait else 0] += 1
+        return wait
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {rule: {"allowed": a, "limited": l} for rule, (a, l) in self._counters.items()}
+
+
+class MemoryRateLimiter(RateLimiter):
+    def __init__(self, max_keys: int = 100000):
+        super().__init__()
+        self.max_keys = max(1, int(max_keys))
+        self._data: "OrderedDict[str, list]" = OrderedDict()   # key -> [окно, prev, curr]
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float) -> float:
+        now = time.monotonic()
+        idx, rem = divmod(now, window)
+        frac = rem / window
+        with self._lock:
+            rec = self._data.get(key)
+            if rec is None:
+                rec = self._data[key] = [idx, 0, 0]
+                if len(self._data) > self.max_keys:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(key)
+                if rec[0] != idx:
+                    rec[1] = rec[2] if rec[0] == idx - 1 else 0
+                    rec[2] = 0
+                    rec[0] = idx
+            if _estimate(rec[1], rec[2], frac) + 1 > limit:
+                wait = _retry_after(rec[1], rec[2], frac, limit, window)
+            else:
+                rec[2] += 1
+                wait = 0.0
+        return self._count(key, wait)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "keys": len(self)}
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Ключи rl:<key>:<номер окна> с EXPIRE на два окна. За запрос — один pipeline (INCR + EXPIRE + GET).
+    client — любой объект с pipeline()/decr (redis.Redis или bench/fake_redis.py).
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "rl:"):
+        super().__init__()
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis требует пакет redis: pip install redis")
+            client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key: str, limit: int, window: float) -> float:
+        idx, rem = divmod(time.time(), window)
+        idx, frac = int(idx), rem / window
+        curr_key = f"{self.prefix}{key}:{idx}"
+        pipe = self.client.pipeline()
+        pipe.incr(curr_key)
+        pipe.expire(curr_key, int(window * 2) + 1)
+        pipe.get(f"{self.prefix}{key}:{idx - 1}")
+        curr, _, prev = pipe.execute()
+        prev = int(prev or 0)
+        curr = int(curr) - 1  # без этого запроса
+        if _estimate(prev, curr, frac) + 1 > limit:
+            self.client.decr(curr_key)  # отклонённые не считаем — иначе бот сам себя держит в бане
+            return self._count(key, _retry_after(prev, curr, frac, limit, window))
+        return self._count(key, 0.0)
+
+
+def create_rate_limiter(backend: Optional[str] = None) -> RateLimiter:
+    backend = (backend or settings.RATE_LIMIT_BACKEND or "memory").strip().lower()
+    if backend == "memory":
+        return MemoryRateLimiter(settings.RATE_LIMIT_MAX_KEYS)
+    if backend == "redis":
+        return RedisRateLimiter()
+    raise RuntimeError(f"Неизвестный RATE_LIMIT_BACKEND: {backend!r} (memory | redis)")
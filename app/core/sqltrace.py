@@ -0,0 +1,210 @@
+"""
+Трассировка SQL (по умолчанию выключена, SQL_TRACE=1): время, строки и источник каждого запроса.
+
+Источник — метка обработчика, в котором идёт запрос: bot:on_start, api:POST /api/leads,
+admin:leads_view. Ставят её обёртки бота (handler()), SqlTraceMiddleware в FastAPI и
+before_request админки; вне них — "-".
+
+  * запрос дольше SQL_SLOW_MS — сразу строкой в лог (slow sql ...), с параметрами при SQL_TRACE_PARAMS;
+  * агрегаты по (источник, текст запроса): число, суммарное и максимальное время, строки;
+    report() — top-N по суммарному времени: /sql в админке, GET /debug/sql в API (X-Debug-Token),
+    SIGUSR1 и выход процесса — печать в лог.
+
+Строки — rowcount драйвера: для INSERT/UPDATE/DELETE везде, для SELECT — только где драйвер
+его знает (psycopg2 — да, sqlite3 — нет, там «-»).
+"""
+import atexit
+import re
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+_SOURCE: ContextVar = ContextVar("sql_source", default="-")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s)(?:\s*,\s*(?:\?|%\(\w+\)s))+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+# ──────────────────────────────
+# Источник запроса
+# ──────────────────────────────
+@contextmanager
+def handler(name: str) -> Iterator[None]:
+    """Метка источника на время блока: with handler("bot:on_start"): ..."""
+    token = _SOURCE.set(name)
+    try:
+        yield
+    finally:
+        _SOURCE.reset(token)
+
+
+def set_source(name: str) -> None:
+    """Метка до следующей (Flask: before_request в потоке запроса)."""
+    _SOURCE.set(name)
+
+
+def current_source() -> str:
+    source = _SOURCE.get()
+    if isinstance(source, dict):
+        # ASGI scope: маршрут роутер дописывает в него уже после middleware
+        route = source.get("route")
+        return f"api:{source.get('method', '')} {getattr(route, 'path', None) or source.get('path', '')}"
+    return source
+
+
+class SqlTraceMiddleware:
+    """ASGI-middleware FastAPI: запросы внутри HTTP-запроса помечаются его маршрутом."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _SOURCE.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _SOURCE.reset(token)
+
+
+# ──────────────────────────────
+# Агрегаты
+# ──────────────────────────────
+@lru_cache(maxsize=4096)   # текстов запросов в процессе немного, а регулярки — половина цены записи
+def normalize(statement: str) -> str:
+    """Один ключ на запрос: IN (?, ?, ...) любой длины -> IN (...), пробелы схлопнуты."""
+    return _SPACES.sub(" ", _IN_LIST.sub("(...)", statement)).strip()
+
+
+class SqlTrace:
+    """(источник, запрос) -> [число, всего ms, max ms, строк]; не больше max_keys ключей."""
+
+    def __init__(self, slow_ms: float, with_params: bool = False, max_keys: int = 5000):
+        self.slow_ms = float(slow_ms)
+        self.with_params = with_params
+        self.max_keys = max(1, int(max_keys))
+        self._data: dict[tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.slow = 0
+        self.dropped = 0
+
+    def record(self, source: str, statement: str, elapsed_ms: float, rows: Optional[int], parameters=None) -> None:
+        key = (source, normalize(statement))
+        with self._lock:
+            self.queries += 1
+            item = self._data.get(key)
+            if item is None:
+                if len(self._data) >= self.max_keys:
+                    self.dropped += 1
+                else:
+                    self._data[key] = [1, elapsed_ms, elapsed_ms, rows or 0]
+            else:
+                item[0] += 1
+                item[1] += elapsed_ms
+                item[2] = max(item[2], elapsed_ms)
+                item[3] += rows or 0
+            if self.slow_ms and elapsed_ms >= self.slow_ms:
+                self.slow += 1
+            else:
+                return
+        line = f"slow sql {elapsed_ms:.1f} ms [{source}] rows={'-' if rows is None else rows}: {key[1][:500]}"
+        if self.with_params and parameters:
+            line += f" params={str(parameters)[:300]}"
+        print(line)
+
+    def top(self, n: Optional[int] = None) -> list[dict]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._data.items()]
+        items.sort(key=lambda kv: kv[1][1], reverse=True)
+        return [
+            {"source": source, "sql": sql, "count": count, "total_ms": round(total, 2),
+             "avg_ms": round(total / count, 3), "max_ms": round(peak, 2), "rows": rows}
+            for (source, sql), (count, total, peak, rows) in items[:n or settings.SQL_TRACE_TOP]
+        ]
+
+    def by_source(self) -> list[tuple[str, int, float]]:
+        """(источник, запросов, всего ms) — кто нагружает БД."""
+        totals: dict[str, list] = {}
+        with self._lock:
+            for (source, _), (count, total, _, _) in self._data.items():
+                t = totals.setdefault(source, [0, 0.0])
+                t[0] += count
+                t[1] += total
+        return sorted(((s, c, round(ms, 2)) for s, (c, ms) in totals.items()), key=lambda x: -x[2])
+
+    def report(self, n: Optional[int] = None) -> str:
+        lines = [f"SQL: {self.queries} запросов, медленных (>= {self.slow_ms:g} ms): {self.slow}"
+                 + (f", ключей не влезло: {self.dropped}" if self.dropped else "")]
+        lines.append("по источникам:")
+        for source, count, total in self.by_source():
+            lines.append(f"  {total:10.1f} ms {count:8}  {source}")
+        lines.append("top запросов по суммарному времени:")
+        lines.append(f"  {'всего ms':>10} {'число':>8} {'сред ms':>8} {'max ms':>8} {'строк':>8}  источник / запрос")
+        for r in self.top(n):
+            lines.append(f"  {r['total_ms']:10.1f} {r['count']:8} {r['avg_ms']:8.2f} {r['max_ms']:8.1f} "
+                         f"{r['rows']:8}  {r['source']}")
+            lines.append(f"      {r['sql'][:300]}")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.queries = self.slow = self.dropped = 0
+
+
+TRACE = SqlTrace(settings.SQL_SLOW_MS, settings.SQL_TRACE_PARAMS, settings.SQL_TRACE_MAX_KEYS)
+
+
+# ──────────────────────────────
+# События движка
+# ──────────────────────────────
+_installed: set = set()
+_install_lock = threading.Lock()
+
+
+def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("sqltrace_start", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.get("sqltrace_start")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    rowcount = getattr(cursor, "rowcount", -1)
+    TRACE.record(current_source(), statement, elapsed_ms, rowcount if rowcount >= 0 else None, parameters)
+
+
+def _error(exception_context) -> None:
+    conn = exception_context.connection
+    started = conn.info.get("sqltrace_start") if conn is not None else None
+    if started:
+        started.pop()
+
+
+def install(engine) -> None:
+    """Подписаться на события движка (sync; для async — eng.sync_engine). Повторный вызов — no-op."""
+    with _install_lock:
+        if id(engine) in _installed:
+            return
+        _installed.add(id(engine))
+        first = len(_installed) == 1
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _error)
+    if first:
+        atexit.register(lambda: TRACE.queries and print(TRACE.report()))
+        # SIGUSR1 — отчёт в лог; чужой обработчик (gunicorn) не трогаем
+        usr1 = getattr(signal, "SIGUSR1", None)
+        if usr1 and threading.current_thread() is threading.main_thread() \
+                and signal.getsignal(usr1) in (signal.SIG_DFL, None):
+            signal.signal(usr1, lambda *_: print(TRACE.report()))
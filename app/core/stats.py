@@ -0,0 +1,324 @@
+"""
+Счётчики дашборда админки: таблица stats_counters (ключ -> число) вместо COUNT(*) по таблицам.
+
+Ключи:
+  parents, parents_paid (есть хотя бы один оплаченный ребёнок), children, children_paid, leads, leads_open (не обработаны), leads_converted (есть родитель),
+  appointments, leads_day:YYYY-MM-DD (заявки за день, UTC), appts_slot:<слот> (записи на слот).
+
+Поддержка:
+  * ORM — автоматически: в after_flush считаем дельты по new/dirty/deleted и в той же транзакции
+    делаем UPSERT value = value + d (откат сессии откатывает и счётчики);
+  * Core / сырой SQL — вызовите add(db, counts) сами (см. пакетную загрузку заявок);
+  * то, что мимо обоих (ON DELETE CASCADE в БД, ручные правки) — reconcile(): пересчёт по таблицам,
+    раз в STATS_RECONCILE_INTERVAL сек (start_stats_reconcile) или `python -m app.core.stats`.
+
+Дашборд читает всё одним запросом (read()) — время не зависит от размера таблиц.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+TOTALS = ("parents", "parents_paid", "children", "children_paid", "leads", "leads_open", "leads_converted", "appointments")
+DAY_PREFIX = "leads_day:"
+SLOT_PREFIX = "appts_slot:"
+
+# колонки, от которых зависят счётчики; таблицы — по имени, как в app.core.identity
+_TRACKED = {
+    "parents": (),
+    "children": ("paid", "parent_id"),
+    "leads": ("processed", "parent_id", "created_at"),
+    "appointments": ("datetime_str",),
+}
+
+
+def keys_for(table: str, row: dict) -> list[str]:
+    """Счётчики, в которые входит строка таблицы (row — значения колонок из _TRACKED)."""
+    if table == "parents":
+        return ["parents"]
+    if table == "children":
+        return ["children", "children_paid"] if row.get("paid") else ["children"]
+    if table == "leads":
+        keys = ["leads"]
+        if not row.get("processed"):
+            keys.append("leads_open")
+        if row.get("parent_id") is not None:
+            keys.append("leads_converted")
+        if row.get("created_at"):
+            keys.append(DAY_PREFIX + row["created_at"].date().isoformat())
+        return keys
+    if table == "appointments":
+        return ["appointments", SLOT_PREFIX + (row.get("datetime_str") or "")]
+    return []
+
+
+# ──────────────────────────────
+# Запись: UPSERT value = value + d
+# ──────────────────────────────
+def _table():
+    from app.core.models import StatCounter
+    return StatCounter.__table__
+
+
+_UPSERT: dict = {}   # диалект -> готовый INSERT ... ON CONFLICT: сборка заметна на каждом flush
+
+
+def _upsert(dialect: str):
+    stmt = _UPSERT.get(dialect)
+    if stmt is None:
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        table = _table()
+        stmt = insert(table)
+        stmt = _UPSERT[dialect] = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"value": table.c.value + stmt.excluded.value},
+        )
+    return stmt
+
+
+def add(db, counts: dict) -> None:
+    """Прибавить дельты {ключ: d} в текущей транзакции db (Session или Connection). Нули пропускаем."""
+    rows = [{"key": k, "value": d} for k, d in sorted(counts.items()) if d]
+    if not rows:
+        return
+    conn = db.connection() if isinstance(db, Session) else db
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        conn.execute(_upsert(dialect), rows)
+        return
+    table = _table()
+    # прочие БД — UPDATE, а где строки ещё нет — INSERT
+    for row in rows:
+        res = conn.execute(
+            table.update().where(table.c.key == row["key"]).values(value=table.c.value + row["value"])
+        )
+        if not res.rowcount:
+            conn.execute(table.insert().values(**row))
+
+
+# ──────────────────────────────
+# Дельты по событиям ORM
+# ──────────────────────────────
+def _row(obj, cols: Iterable[str], old: bool) -> dict:
+    """Значения колонок объекта до (old) или после flush."""
+    state = inspect(obj)
+    row = {}
+    for col in cols:
+        hist = state.attrs[col].history
+        if old:
+            values = hist.deleted or hist.unchanged
+        else:
+            values = hist.added or hist.unchanged
+        row[col] = values[0] if values else None
+    return row
+
+
+def _parents_paid_delta(session: Session, paid_by_parent: Counter) -> int:
+    """
+    На сколько изменился parents_paid. paid_by_parent — parent_id -> изменение числа оплаченных
+    детей в этом flush; текущее число дочитываем одним запросом (flush уже в транзакции),
+    прежнее = текущее - изменение. Считается переход родителя через ноль в любую сторону.
+    """
+    changed = {pid: d for pid, d in paid_by_parent.items() if d}
+    if not changed:
+        return 0
+    from app.core.models import Child
+
+    now = dict(session.connection().execute(
+        select(Child.parent_id, func.count())
+        .where(Child.parent_id.in_(changed), Child.paid.is_(True))
+        .group_by(Child.parent_id)
+    ).all())
+    return sum((now.get(pid, 0) > 0) - (now.get(pid, 0) - d > 0) for pid, d in changed.items())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session: Session, flush_context) -> None:
+    delta: Counter = Counter()
+    paid_by_parent: Counter = Counter()   # parent_id -> изменение числа оплаченных детей
+    for objs, sign in ((session.new, 1), (session.deleted, -1), (session.dirty, 0)):
+        for obj in objs:
+            table = getattr(obj, "__tablename__", None)
+            cols = _TRACKED.get(table)
+            if cols is None:
+                continue
+            if sign:
+                changes = [(_row(obj, cols, old=sign < 0), sign)]
+            elif session.is_modified(obj, include_collections=False):
+                changes = [(_row(obj, cols, old=True), -1), (_row(obj, cols, old=False), 1)]
+            else:
+                continue
+            for row, d in changes:
+                for key in keys_for(table, row):
+                    delta[key] += d
+                if table == "children" and row.get("paid") and row.get("parent_id") is not None:
+                    paid_by_parent[row["parent_id"]] += d
+    delta["parents_paid"] += _parents_paid_delta(session, paid_by_parent)
+    if delta:
+        add(session, delta)
+
+
+# ──────────────────────────────
+# Чтение — один запрос
+# ──────────────────────────────
+def read(db: Session, days: Optional[int] = None, today: Optional[date] = None) -> dict:
+    """
+    {"totals": {...}, "days": [(date, n), ...] за последние days дней, "slots": [(слот, n), ...],
+     "conversion": {"lead_parent": %, "parent_paid": %}}
+    """
+    days = days or settings.STATS_DASHBOARD_DAYS
+    today = today or datetime.utcnow().date()
+    first = today - timedelta(days=days - 1)
+    c = _table().c
+    rows = db.execute(
+        select(c.key, c.value).where(or_(
+            c.key.in_(TOTALS),
+            c.key.between(DAY_PREFIX + first.isoformat(), DAY_PREFIX + today.isoformat()),
+            c.key.startswith(SLOT_PREFIX),
+        ))
+    ).all()
+    values = dict(rows)
+    totals = {k: values.get(k, 0) for k in TOTALS}
+    per_day = [
+        (d, values.get(DAY_PREFIX + d.isoformat(), 0))
+        for d in (first + timedelta(days=i) for i in range(days))
+    ]
+    slots = sorted(
+        ((k[len(SLOT_PREFIX):], v) for k, v in values.items() if k.startswith(SLOT_PREFIX) and v > 0),
+        key=lambda kv: (-kv[1], kv[0]),
+    )
+
+    def pct(a: int, b: int) -> float:
+        return round(100.0 * a / b, 1) if b else 0.0
+
+    return {
+        "totals": totals,
+        "days": per_day,
+        "slots": slots,
+        "conversion": {
+            "lead_parent": pct(totals["leads_converted"], totals["leads"]),
+            "parent_paid": pct(totals["parents_paid"], totals["parents"]),
+        },
+    }
+
+
+# ──────────────────────────────
+# Сверка с таблицами
+# ──────────────────────────────
+def actual_counts(db) -> dict:
+    """Счётчики, посчитанные заново по таблицам (полные проходы — только для reconcile)."""
+    from app.core.models import Appointment, Child, Lead, Parent
+
+    counts: dict = {}
+    counts["parents"] = db.execute(select(func.count()).select_from(Parent)).scalar()
+    counts["children"], counts["children_paid"], counts["parents_paid"] = db.execute(
+        select(
+            func.count(),
+            func.count().filter(Child.paid.is_(True)),
+            func.count(func.distinct(Child.parent_id)).filter(Child.paid.is_(True)),
+        ).select_from(Child)
+    ).one()
+    counts["leads"], counts["leads_open"], counts["leads_converted"] = db.execute(
+        select(
+            func.count(),
+            func.count().filter(Lead.processed.isnot(True)),
+            func.count(Lead.parent_id),
+        ).select_from(Lead)
+    ).one()
+    counts["appointments"] = db.execute(select(func.count()).select_from(Appointment)).scalar()
+    day = func.date(Lead.created_at)
+    for d, n in db.execute(select(day, func.count()).where(Lead.created_at.isnot(None)).group_by(day)):
+        counts[DAY_PREFIX + str(d)[:10]] = n
+    for slot, n in db.execute(select(Appointment.datetime_str, func.count()).group_by(Appointment.datetime_str)):
+        counts[SLOT_PREFIX + (slot or "")] = n
+    return counts
+
+
+def reconcile() -> dict:
+    """
+    Пересчитать счётчики по таблицам и исправить расхождения. Возвращает {ключ: (было, стало)}.
+    Сначала блокируем запись счётчиков (SQLite — BEGIN IMMEDIATE, иначе SELECT ... FOR UPDATE),
+    потом считаем: инкремент, закоммиченный между подсчётом и записью, не потеряется.
+    """
+    from app.core.db import IS_SQLITE, engine
+
+    table = _table()
+    with engine.connect() as conn:
+        if IS_SQLITE:
+            # как в app.core.migrations: pysqlite сам не берёт блокировку записи до первого DML
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.begin()
+        try:
+            stored_q = select(table.c.key, table.c.value)
+            stored = dict(conn.execute(stored_q if IS_SQLITE else stored_q.with_for_update()).all())
+            actual = actual_counts(conn)
+            drift = {
+                k: (stored.get(k, 0), actual.get(k, 0))
+                for k in set(stored) | set(actual)
+                if stored.get(k, 0) != actual.get(k, 0)
+            }
+            for key, (old, new) in drift.items():
+                if key in stored:
+                    conn.execute(table.update().where(table.c.key == key).values(value=new))
+                else:
+                    conn.execute(table.insert().values(key=key, value=new))
+            # дни и слоты, которых больше нет, — не копим нули
+            conn.execute(table.delete().where(table.c.value == 0, table.c.key.notin_(TOTALS)))
+        except Exception:
+            if IS_SQLITE:
+                conn.exec_driver_sql("ROLLBACK")
+            else:
+                conn.rollback()
+            raise
+        if IS_SQLITE:
+            conn.exec_driver_sql("COMMIT")
+        else:
+            conn.commit()
+    if drift:
+        print(f"stats reconcile: fixed {len(drift)} counters:", ", ".join(f"{k} {a}->{b}" for k, (a, b) in sorted(drift.items())))
+    return drift
+
+
+_reconcile_started = False
+_reconcile_lock = threading.Lock()
+
+
+def start_stats_reconcile() -> None:
+    """Фоновый поток: reconcile() раз в STATS_RECONCILE_INTERVAL сек. Повторный вызов — no-op."""
+    global _reconcile_started
+    interval = settings.STATS_RECONCILE_INTERVAL
+    if interval <= 0:
+        return
+    with _reconcile_lock:
+        if _reconcile_started:
+            return
+        _reconcile_started = True
+
+    def loop() -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                reconcile()
+            except Exception as e:
+                print("stats reconcile failed:", repr(e))
+
+    threading.Thread(target=loop, name="stats-reconcile", daemon=True).start()
+
+
+if __name__ == "__main__":
+    from app.core.db import init_db
+
+    init_db()
+    drift = reconcile()
+    print(f"stats: {len(drift)} counters fixed" if drift else "stats: no drift")
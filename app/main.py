@@ -1,37 +1,94 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
-from core.config import settings
-from core.db import init_db
-from api.lead_routes import router as lead_router
-from web.routes_public import router as public_router
-from web.routes_parent import router as parent_router
-
-
-app = FastAPI(title="Boxing School")
-
-# CORS (если фронт отдельно)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # или перечисли конкретные домены
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Статика
-static_dir = os.path.join(os.path.dirname(__file__), "web", "static")
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-# Роуты
-app.include_router(public_router)   # /
-app.include_router(parent_router)   # /parent/...
-app.include_router(lead_router)     # /api/leads
-
-# Таблицы
-init_db()
-
-@app.get("/health")
-def health():
-    return {"ok": True}
\ No newline at end of file
+from app.core.config import settings
+from app.core.db import dispose_async_engine, init_db, start_sqlite_maintenance
+from app.core.stats import start_stats_reconcile
+from app.core.sqltrace import TRACE as sql_trace, SqlTraceMiddleware
+from app.core import metrics
+from app.api.lead_routes import router as lead_router, LIMITER as lead_limiter
+from app.services.telegram_notify import DISPATCHER as notify_dispatcher
+from app.web.routes_public import router as public_router
+from app.web.routes_parent import router as parent_router
+
+
+def create_app() -> FastAPI:
+    """Собрать приложение. БД и фоновые задачи поднимаются в startup, не при импорте."""
+    app = FastAPI(title="Boxing School")
+
+    # CORS (если фронт отдельно)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # или перечисли конкретные домены
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # SQL_TRACE: запросы помечаются маршрутом (api:POST /api/leads), см. app.core.sqltrace
+    if settings.SQL_TRACE:
+        app.add_middleware(SqlTraceMiddleware)
+
+    # время ответа по маршрутам — http_request_duration_seconds{app="api"}
+    if settings.METRICS_ENABLED:
+        app.add_middleware(metrics.MetricsMiddleware, app_name="api")
+
+    # Статика
+    static_dir = os.path.join(os.path.dirname(__file__), "web", "static")
+    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+
+    # Роуты
+    app.include_router(public_router)   # /
+    app.include_router(parent_router)   # /parent/...
+    app.include_router(lead_router)     # /api/leads
+
+    # Таблицы — до бота: create_bot() в start_webhook тоже их трогает
+    app.router.on_startup.append(init_db)
+    app.router.on_startup.append(start_sqlite_maintenance)  # wal_checkpoint + optimize раз в N минут
+    app.router.on_startup.append(start_stats_reconcile)     # сверка счётчиков дашборда с таблицами
+    if settings.DB_ASYNC:
+        app.router.on_shutdown.append(dispose_async_engine)  # async-роуты заявок и кабинета родителя
+
+    # Уведомления о заявках (outbox) — фоновый диспетчер в процессе API
+    if settings.NOTIFY_DISPATCHER_IN_API:
+        app.router.on_startup.append(notify_dispatcher.start)
+        app.router.on_shutdown.append(notify_dispatcher.stop)
+
+    # Бот в webhook-режиме живёт в этом же приложении (в polling — отдельный процесс)
+    if settings.BOT_MODE == "webhook":
+        from app.bot.webhook import router as bot_router, start_webhook, stop_webhook
+        app.include_router(bot_router)  # /tg/webhook
+        app.router.on_startup.append(start_webhook)
+        app.router.on_shutdown.append(stop_webhook)
+
+    @app.get("/health")
+    def health():
+        return {"ok": True, "rate_limit": lead_limiter.stats()}
+
+    if settings.METRICS_ENABLED:
+        metrics.REGISTRY.collector("notify", lambda: metrics.gauge_family(
+            "lead_notify_total", "Уведомления о заявках (outbox) по исходу",
+            [({"result": k}, v) for k, v in notify_dispatcher.stats().items()], "counter",
+        ))
+
+        @app.get("/metrics", include_in_schema=False)
+        def metrics_endpoint(request: Request):
+            if not metrics.authorized(request.headers.get("Authorization")):
+                raise HTTPException(status_code=401)
+            return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+    if settings.SQL_TRACE and settings.SQL_TRACE_TOKEN:
+        @app.get("/debug/sql", include_in_schema=False)
+        def debug_sql(request: Request, top: int = 0):
+            # тексты запросов — не для всех: только с токеном
+            if request.headers.get("X-Debug-Token") != settings.SQL_TRACE_TOKEN:
+                raise HTTPException(status_code=404)
+            return PlainTextResponse(sql_trace.report(top or None))
+
+    return app
+
+
+# uvicorn app.main:app — как раньше; импорт только собирает роуты
+app = create_app()
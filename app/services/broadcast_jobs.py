@@ -0,0 +1,206 @@
+"""
+Фоновые рассылки: задание сохраняется в broadcast_jobs, воркер отправляет его пачками
+по возрастанию tg_id и после каждой пачки пишет чекпоинт (last_tg_id + счётчики).
+Упавший/передеплоенный воркер продолжает с чекпоинта — повторно уйдёт максимум одна пачка.
+
+Владение: при захвате воркер пишет свой токен в claimed_by; heartbeat (отдельный поток, пока идёт
+рассылка — в том числе пауза на 429) и чекпоинт — UPDATE ... WHERE claimed_by = токен.
+Задание перехватили (0 строк) — воркер прекращает отправку, дублей от двух воркеров нет.
+
+Запуск воркера:
+    python3 -m app.services.broadcast_jobs
+"""
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+
+from app.core import sqltrace
+from app.core.config import settings
+from app.core.db import db_session, init_db
+from app.core.models import Parent, Child, BroadcastJob
+from app.services.telegram_broadcast import Audience, BroadcastEngine
+
+# задание в статусе running без heartbeat дольше этого считаем брошенным
+STALE_AFTER = timedelta(seconds=60)
+HEARTBEAT_EVERY = STALE_AFTER.total_seconds() / 4
+
+
+def _tg_column(audience: str):
+    return Child.tg_id if audience == "children" else Parent.tg_id
+
+
+def enqueue_broadcast(db: Session, audience: Audience, text: str) -> BroadcastJob:
+    """Ставит рассылку в очередь. Коммит — на вызывающей стороне."""
+    col = _tg_column(audience)
+    total = db.query(func.count(func.distinct(col))).filter(col.isnot(None)).scalar() or 0
+    job = BroadcastJob(audience=audience, text=(text or "").strip(), status="queued", total=total)
+    db.add(job)
+    db.flush()
+    return job
+
+
+def job_progress(job: BroadcastJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "total": job.total or 0,
+        "sent": job.sent or 0,
+        "failed": job.failed or 0,
+        "remaining": max((job.total or 0) - (job.sent or 0) - (job.failed or 0), 0),
+        "rate": round(job.rate or 0.0, 2),
+        "error": job.error,
+    }
+
+
+def _claim_job() -> Optional[tuple[int, str]]:
+    """
+    Забирает следующее задание: новое или брошенное упавшим воркером. -> (id, токен владельца).
+    Захват — условным UPDATE, поэтому два воркера не возьмут одно задание.
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    with db_session() as db:
+        candidates = (
+            db.query(BroadcastJob.id, BroadcastJob.status, BroadcastJob.heartbeat_at)
+            .filter(or_(
+                BroadcastJob.status == "queued",
+                (BroadcastJob.status == "running") & (BroadcastJob.heartbeat_at < now - STALE_AFTER),
+            ))
+            .order_by(BroadcastJob.id.asc())
+            .limit(5)
+            .all()
+        )
+        for job_id, status, heartbeat in candidates:
+            claimed = db.execute(
+                update(BroadcastJob)
+                .where(BroadcastJob.id == job_id,
+                       BroadcastJob.status == status,
+                       or_(BroadcastJob.heartbeat_at.is_(None), BroadcastJob.heartbeat_at == heartbeat))
+                .values(status="running", heartbeat_at=now, claimed_by=token,
+                        started_at=func.coalesce(BroadcastJob.started_at, now))
+            ).rowcount
+            if claimed:
+                return job_id, token
+    return None
+
+
+def _owned_update(job_id: int, token: str, **values) -> bool:
+    """UPDATE задания, только пока им владеет token. False — задание перехватил другой воркер."""
+    with db_session() as db:
+        return bool(db.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.claimed_by == token)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        ).rowcount)
+
+
+def _heartbeat(job_id: int, token: str, done: threading.Event, lost: threading.Event) -> None:
+    while not done.wait(HEARTBEAT_EVERY):
+        try:
+            if not _owned_update(job_id, token, heartbeat_at=datetime.utcnow()):
+                lost.set()
+                return
+        except Exception as e:
+            print(f"broadcast job #{job_id} heartbeat failed:", repr(e))
+
+
+def _next_batch(db: Session, audience: str, after: Optional[str], limit: int) -> list[str]:
+    col = _tg_column(audience)
+    q = db.query(col).filter(col.isnot(None)).distinct()
+    if after is not None:
+        q = q.filter(col > after)
+    return [tg_id for (tg_id,) in q.order_by(col.asc()).limit(limit)]
+
+
+def run_job(job_id: int, token: str, engine: Optional[BroadcastEngine] = None) -> dict:
+    """Досылает задание с его чекпоинта до конца, пока им владеет token (см. _claim_job)."""
+    engine = engine or BroadcastEngine()
+    batch_size = max(1, settings.BROADCAST_BATCH_SIZE)
+
+    with db_session() as db:
+        job = db.get(BroadcastJob, job_id)
+        audience, text, checkpoint = job.audience, job.text, job.last_tg_id
+
+    done, lost = threading.Event(), threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(job_id, token, done, lost), name=f"broadcast-heartbeat-{job_id}", daemon=True
+    ).start()
+    try:
+        while not lost.is_set():
+            with db_session() as db:
+                batch = _next_batch(db, audience, checkpoint, batch_size)
+            if not batch:
+                break
+
+            chat_ids, bad = [], 0
+            for tg_id in batch:
+                try:
+                    chat_ids.append(int(tg_id))
+                except Exception:
+                    bad += 1
+            stats = engine.run(chat_ids, text, stop=lost)
+            if lost.is_set():
+                break  # пачка оборвана — чекпоинт не двигаем, его ведёт новый владелец
+            checkpoint = batch[-1]
+
+            values = dict(
+                sent=func.coalesce(BroadcastJob.sent, 0) + stats.sent,
+                failed=func.coalesce(BroadcastJob.failed, 0) + stats.failed + bad,
+                last_tg_id=checkpoint,
+                heartbeat_at=datetime.utcnow(),
+            )
+            if stats.sent:
+                values["rate"] = stats.rate
+            if not _owned_update(job_id, token, **values):
+                lost.set()
+
+        if lost.is_set():
+            print(f"broadcast job #{job_id}: claimed by another worker, stopping")
+            return {"id": job_id, "status": "lost"}
+
+        with db_session() as db:
+            job = db.get(BroadcastJob, job_id)
+            finished = datetime.utcnow()
+            # итоговая средняя скорость вместо скорости последней пачки
+            elapsed = (finished - (job.started_at or finished)).total_seconds()
+            rate = (job.sent or 0) / elapsed if elapsed > 0 else job.rate
+        _owned_update(job_id, token, status="done", error=None, finished_at=finished, rate=rate)
+        with db_session() as db:
+            return job_progress(db.get(BroadcastJob, job_id))
+    except Exception:
+        _owned_update(job_id, token, status="failed", error=traceback.format_exc()[-2000:],
+                      finished_at=datetime.utcnow())
+        raise
+    finally:
+        done.set()
+
+
+def run_worker(poll_interval: Optional[float] = None) -> None:
+    """Бесконечный цикл воркера: забрать задание → выполнить → ждать следующее."""
+    poll_interval = settings.BROADCAST_POLL_INTERVAL if poll_interval is None else poll_interval
+    engine = BroadcastEngine()
+    while True:
+        claimed = _claim_job()
+        if claimed is None:
+            time.sleep(poll_interval)
+            continue
+        job_id, token = claimed
+        try:
+            print(f"broadcast job #{job_id} started")
+            with sqltrace.handler("broadcast"):
+                print(f"broadcast job #{job_id} finished: {run_job(job_id, token, engine)}")
+        except Exception:
+            print(f"broadcast job #{job_id} crashed:\n", traceback.format_exc())
+
+
+if __name__ == "__main__":
+    print("Broadcast worker is running…")
+    init_db()
+    run_worker()
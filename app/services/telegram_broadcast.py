@@ -1,27 +1,223 @@
-from time import sleep
-from typing import Iterable, Literal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Literal, Optional
+
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.models import Parent, Child
-from app.bot.bot import safe_send_message
+from app.bot.client import get_client
 
 Audience = Literal["parents", "children"]
 
 
+class RetryAfter(Exception):
+    """Telegram ответил 429 — следующую попытку можно делать не раньше, чем через `seconds`."""
+
+    def __init__(self, seconds: float):
+        super().__init__(f"retry after {seconds}s")
+        self.seconds = float(seconds)
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket: `rate` токенов в секунду, запас до `capacity`.
+    pause() останавливает выдачу токенов всем потокам (ответ 429 глобален для бота).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = max(float(rate), 0.001)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + max(seconds, 0.0))
+            # за время паузы токены не копятся
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ChatThrottle:
+    """Не чаще одного сообщения в `interval` секунд в один чат."""
+
+    def __init__(self, interval: float):
+        self.interval = max(float(interval), 0.0)
+        self._next_at: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id: int) -> float:
+        """Бронирует слот для чата и возвращает, сколько секунд до него ждать."""
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_at.get(chat_id, 0.0))
+            self._next_at[chat_id] = at + self.interval
+        return at - now
+
+
+@dataclass
+class BroadcastStats:
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """Фактическая скорость доставки, сообщений/сек."""
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "elapsed": round(self.elapsed, 2),
+            "rate": round(self.rate, 2),
+        }
+
+
+def telegram_send(chat_id: int, text: str, **kwargs):
+    """Отправка через бота; 429 превращаем в RetryAfter, остальные ошибки — наверх."""
+    from telebot.apihelper import ApiTelegramException
+
+    try:
+        return get_client().send_message(chat_id, text, **kwargs)
+    except ApiTelegramException as e:
+        if e.error_code == 429:
+            params = (e.result_json or {}).get("parameters") or {}
+            raise RetryAfter(params.get("retry_after", 1))
+        raise
+
+
+class BroadcastEngine:
+    """
+    Рассылка через ограниченный пул потоков.
+    Темп задаёт общий TokenBucket (глобальный лимит бота) + ChatThrottle (лимит на чат),
+    на 429 весь пул ждёт retry_after и повторяет отправку.
+
+        engine = BroadcastEngine()
+        stats = engine.run(chat_ids, "Привет!")
+    """
+
+    def __init__(
+        self,
+        send: Optional[Callable[..., object]] = None,
+        *,
+        rate: Optional[float] = None,
+        chat_interval: Optional[float] = None,
+        workers: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.send = send or telegram_send
+        self.workers = max(1, int(workers or settings.BROADCAST_WORKERS))
+        self.max_retries = max(0, int(settings.BROADCAST_MAX_RETRIES if max_retries is None else max_retries))
+        self.bucket = TokenBucket(rate or settings.BROADCAST_RATE)
+        self.chats = ChatThrottle(settings.BROADCAST_CHAT_INTERVAL if chat_interval is None else chat_interval)
+        self._lock = threading.Lock()
+
+    def _deliver(self, chat_id: int, text: str, kwargs: dict, stats: BroadcastStats) -> bool:
+        delay = self.chats.reserve(chat_id)
+        if delay > 0:
+            time.sleep(delay)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return bool(self.send(chat_id, text, **kwargs))
+            except RetryAfter as e:
+                self.bucket.pause(e.seconds)
+                with self._lock:
+                    stats.retried += 1
+            except Exception as e:
+                print(f"broadcast send failed: chat_id={chat_id}, err={e!r}")
+                return False
+        return False
+
+    def run(
+        self,
+        chat_ids: Iterable[int],
+        text: str,
+        on_result: Optional[Callable[[int, bool], None]] = None,
+        stop: Optional[threading.Event] = None,
+        **kwargs,
+    ) -> BroadcastStats:
+        """
+        Отправляет text каждому chat_id (дубли пропускаются).
+        on_result(chat_id, ok) вызывается из рабочего потока после каждой доставки.
+        stop — выставили: новые отправки не начинаем (уже начатые доходят).
+        """
+        stats = BroadcastStats()
+        # не держим в очереди больше двух задач на воркер — генератор id читается лениво
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        seen: set[int] = set()
+
+        def task(chat_id: int) -> None:
+            try:
+                ok = self._deliver(chat_id, text, kwargs, stats)
+                with self._lock:
+                    if ok:
+                        stats.sent += 1
+                    else:
+                        stats.failed += 1
+                if on_result:
+                    on_result(chat_id, ok)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="broadcast") as pool:
+            for chat_id in chat_ids:
+                if stop is not None and stop.is_set():
+                    break
+                if chat_id in seen:
+                    continue
+                seen.add(chat_id)
+                slots.acquire()
+                pool.submit(task, chat_id)
+
+        stats.finished = time.monotonic()
+        return stats
+
+
 def _parent_chat_ids(db: Session) -> Iterable[int]:
-    q = db.query(Parent).filter(Parent.tg_id.isnot(None))
-    for p in q.yield_per(1000):
+    q = db.query(Parent.tg_id).filter(Parent.tg_id.isnot(None))
+    for (tg_id,) in q.yield_per(1000):
         try:
-            yield int(p.tg_id)
+            yield int(tg_id)
         except Exception:
             continue
 
 
 def _child_chat_ids(db: Session) -> Iterable[int]:
-    q = db.query(Child).filter(Child.tg_id.isnot(None))
-    for c in q.yield_per(1000):
+    q = db.query(Child.tg_id).filter(Child.tg_id.isnot(None))
+    for (tg_id,) in q.yield_per(1000):
         try:
-            yield int(c.tg_id)
+            yield int(tg_id)
         except Exception:
             continue
 
@@ -30,24 +226,13 @@ def broadcast_message(db: Session, audience: Audience, text: str) -> dict:
     """
     Рассылает text выбранной аудитории.
     audience: 'parents' | 'children'
-    Возвращает {"sent": N, "failed": M}
+    Возвращает {"sent": N, "failed": M, "retried": R, "elapsed": сек, "rate": msg/s}
     """
     text = (text or "").strip()
     if not text:
-        return {"sent": 0, "failed": 0}
+        return BroadcastStats(finished=time.monotonic()).as_dict()
 
     ids = _child_chat_ids(db) if audience == "children" else _parent_chat_ids(db)
-
-    sent = 0
-    failed = 0
-
-    for chat_id in ids:
-        r = safe_send_message(chat_id, text)
-        if r:
-            sent += 1
-            sleep(0.05)  # лёгкий троттлинг
-        else:
-            failed += 1
-            sleep(0.2)
-
-    return {"sent": sent, "failed": failed}
\ No newline at end of file
+    stats = BroadcastEngine().run(ids, text)
+    print(f"broadcast done: {stats.as_dict()}")
+    return stats.as_dict()
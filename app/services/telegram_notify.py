@@ -1,15 +1,229 @@
+"""
+Уведомления админам о новых заявках — transactional outbox.
+
+notify_new_lead(db, lead) только добавляет строки lead_notifications (по одной на чат админа)
+в ту же сессию: заявка и уведомления коммитятся вместе, а HTTP-ответ Telegram не ждёт.
+
+Доставляет NotificationDispatcher: забирает созревшие строки пачкой (условный UPDATE с
+claimed_by — два процесса одну строку не возьмут), шлёт их параллельно, при ошибке
+повторяет с экспоненциальным backoff (на 429 — через retry_after), после
+NOTIFY_MAX_ATTEMPTS или на 400/403 — failed. Доставка «хотя бы один раз»: если процесс
+упал между отправкой и отметкой, строка уйдёт повторно после STALE_AFTER.
+
+В API диспетчер стартует сам (NOTIFY_DISPATCHER_IN_API), либо отдельным процессом:
+    python3 -m app.services.telegram_notify
+"""
+import html
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from app.core import sqltrace
 from app.core.config import settings
-from app.bot.bot import bot
+from app.core.db import db_session, init_db
+from app.core.models import Lead, LeadNotification
+from app.services.telegram_broadcast import RetryAfter, telegram_send
 
-def notify_new_lead(name: str, phone: str, age: str | None, comment: str | None) -> None:
-    text = (
+# строку в статусе sending дольше этого считаем брошенной упавшим процессом
+STALE_AFTER = timedelta(seconds=max(300, settings.NOTIFY_SEND_TIMEOUT * 10))
+
+# ответы Bot API, которые повтором не исправить: кривой текст/чат, бот заблокирован
+_PERMANENT_CODES = (400, 403)
+
+
+def lead_text(lead: Lead) -> str:
+    esc = lambda v: html.escape(str(v))  # бот шлёт с parse_mode=HTML
+    return (
         "🔥 Новая заявка с сайта\n\n"
-        f"Имя: {name}\nТелефон: {phone}\n"
-        + (f"Возраст: {age}\n" if age else "")
-        + (f"Комментарий: {comment}\n" if comment else "")
+        f"Имя: {esc(lead.name)}\nТелефон: {esc(lead.phone)}\n"
+        + (f"Возраст: {esc(lead.age)}\n" if lead.age else "")
+        + (f"Комментарий: {esc(lead.comment)}\n" if lead.comment else "")
     )
-    for chat_id in settings.ADMIN_CHAT_IDS:
+
+
+def enqueue_notification(db: Session, text: str, lead_id: Optional[int] = None) -> int:
+    """Сообщение каждому админу (settings.admin_ids). Коммит — на вызывающей стороне."""
+    now = datetime.utcnow()
+    rows = [
+        LeadNotification(lead_id=lead_id, chat_id=chat_id, text=text, status="pending", next_attempt_at=now)
+        for chat_id in settings.admin_ids
+    ]
+    db.add_all(rows)
+    return len(rows)
+
+
+def notify_new_lead(db: Session, lead: Lead) -> int:
+    """Уведомление о заявке — в outbox той же транзакции, что и сама заявка."""
+    db.flush()  # нужен lead.id
+    return enqueue_notification(db, lead_text(lead), lead.id)
+
+
+def _backoff(attempts: int) -> float:
+    return min(settings.NOTIFY_RETRY_MAX, settings.NOTIFY_RETRY_BASE * 2 ** max(attempts - 1, 0))
+
+
+class NotificationDispatcher:
+    """
+    Фоновая доставка outbox: поток-цикл забирает пачку, пул из `workers` потоков её отправляет.
+    wake() — не ждать NOTIFY_POLL_INTERVAL (API зовёт после коммита заявки).
+    """
+
+    def __init__(
+        self,
+        send: Optional[Callable[..., object]] = None,
+        *,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.send = send or telegram_send
+        self.workers = max(1, workers or settings.NOTIFY_WORKERS)
+        self.batch_size = max(1, batch_size or settings.NOTIFY_BATCH_SIZE)
+        self.poll_interval = settings.NOTIFY_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    # ---- управление ----
+    def start(self) -> None:
+        """Запустить фоновый поток. Повторный вызов — no-op."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="lead-notify", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+    # ---- цикл ----
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with sqltrace.handler("notify"):
+                    n = self.run_once()
+            except Exception:
+                print("lead notify dispatcher crashed:\n", traceback.format_exc())
+                n = 0
+            if n < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self) -> int:
+        """Забрать и доставить одну пачку. Возвращает её размер."""
+        rows = self._claim()
+        if rows:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="lead-notify")
+                pool = self._pool
+            list(pool.map(self._deliver, rows))
+        return len(rows)
+
+    def _claim(self) -> list:
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        due = or_(
+            (LeadNotification.status == "pending") & (LeadNotification.next_attempt_at <= now),
+            (LeadNotification.status == "sending") & (LeadNotification.claimed_at < now - STALE_AFTER),
+        )
+        with db_session() as db:
+            ids = [
+                nid for (nid,) in db.query(LeadNotification.id)
+                .filter(due)
+                .order_by(LeadNotification.next_attempt_at.asc())
+                .limit(self.batch_size)
+            ]
+            if not ids:
+                return []
+            db.execute(
+                update(LeadNotification)
+                .where(LeadNotification.id.in_(ids), due)
+                .values(status="sending", claimed_by=token, claimed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            return (
+                db.query(LeadNotification.id, LeadNotification.chat_id, LeadNotification.text, LeadNotification.attempts)
+                .filter(LeadNotification.claimed_by == token, LeadNotification.status == "sending")
+                .all()
+            )
+
+    def _deliver(self, row) -> None:
+        nid, chat_id, text, attempts = row
+        attempts = (attempts or 0) + 1
         try:
-            bot.send_message(chat_id, text)
-        except Exception:
-            pass
\ No newline at end of file
+            self.send(chat_id, text, timeout=settings.NOTIFY_SEND_TIMEOUT)
+        except Exception as e:
+            self._failed(nid, attempts, e)
+            return
+        self._finish(nid, status="sent", attempts=attempts, sent_at=datetime.utcnow(), last_error=None)
+        self._count("sent")
+
+    def _failed(self, nid: int, attempts: int, error: Exception) -> None:
+        permanent = getattr(error, "error_code", None) in _PERMANENT_CODES
+        if permanent or attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+            self._finish(nid, status="failed", attempts=attempts, last_error=repr(error)[:1000])
+            self._count("failed")
+            print(f"lead notification #{nid} failed after {attempts} attempt(s): {error!r}")
+            return
+        delay = error.seconds if isinstance(error, RetryAfter) else _backoff(attempts)
+        self._finish(
+            nid, status="pending", attempts=attempts, last_error=repr(error)[:1000],
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        self._count("retried")
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _finish(nid: int, **values) -> None:
+        with db_session() as db:
+            db.execute(
+                update(LeadNotification)
+                .where(LeadNotification.id == nid)
+                .values(claimed_by=None, claimed_at=None, **values)
+                .execution_options(synchronize_session=False)
+            )
+
+
+DISPATCHER = NotificationDispatcher()
+
+
+def run_worker() -> None:
+    """Диспетчер в текущем потоке — для отдельного процесса."""
+    DISPATCHER.run_forever()
+
+
+if __name__ == "__main__":
+    print("Lead notification dispatcher is running…")
+    init_db()
+    run_worker()
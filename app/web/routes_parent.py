@@ -1,12 +1,19 @@
+from typing import TYPE_CHECKING
+
 from fastapi import APIRouter, Request, HTTPException, Depends
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
 
-from app.core.db import db_session
-from app.core.i18n import t
+from app.core.config import settings
+from app.core.db import get_async_db, get_db
+from app.core.i18n import get_tx, t
 from app.core.models import Parent, Lead
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 router = APIRouter()
 templates = Jinja2Templates(directory="app/web/templates")
 
@@ -21,18 +28,50 @@ def get_parent(db: Session, token: str) -> Parent:
     return p
 
 
-@router.get("/parent/{token}", response_class=HTMLResponse)
-def parent_dashboard(token: str, request: Request, db: Session = Depends(db_session)):
-    p = get_parent(db, token)
+def _leads_stmt(parent_id: int):
+    return select(Lead).where(Lead.parent_id == parent_id).order_by(Lead.created_at.desc())
 
-    # Покажем базовую инфу о родителе и его лидах (заявках)
-    leads = db.query(Lead).filter(Lead.parent_id == p.id).order_by(Lead.created_at.desc()).all()
 
+def _render(request: Request, p: Parent, leads: list):
+    # Покажем базовую инфу о родителе и его лидах (заявках)
     ctx = {
-        "request": request,
         "t": t,
+        "tx": get_tx(p.language),   # base.html: шапка и меню
         "lang": p.language,
+        "alt_lang": "uz" if p.language == "ru" else "ru",
         "parent": p,
         "leads": leads,
     }
-    return templates.TemplateResponse("parent_dashboard.html", ctx)
\ No newline at end of file
+    return templates.TemplateResponse(request, "parent_dashboard.html", ctx)
+
+
+def parent_dashboard(token: str, request: Request, db: Session = Depends(get_db)):
+    p = get_parent(db, token)
+    leads = db.execute(_leads_stmt(p.id)).scalars().all()
+    return _render(request, p, leads)
+
+
+# ====== async-версия (DB_ASYNC) ======
+async def get_parent_async(db: "AsyncSession", token: str) -> Parent:
+    # ref_code важнее tg_id — как в get_parent, но одним запросом
+    rows = (
+        await db.execute(select(Parent).where(or_(Parent.ref_code == token, Parent.tg_id == token)))
+    ).scalars().all()
+    p = next((r for r in rows if r.ref_code == token), None) or (rows[0] if rows else None)
+    if not p:
+        raise HTTPException(status_code=404, detail="Parent not found")
+    return p
+
+
+async def parent_dashboard_async(token: str, request: Request, db: "AsyncSession" = Depends(get_async_db)):
+    p = await get_parent_async(db, token)
+    leads = (await db.execute(_leads_stmt(p.id))).scalars().all()
+    return _render(request, p, leads)
+
+
+router.add_api_route(
+    "/parent/{token}",
+    parent_dashboard_async if settings.DB_ASYNC else parent_dashboard,
+    methods=["GET"],
+    response_class=HTMLResponse,
+)
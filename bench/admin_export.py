@@ -0,0 +1,106 @@
+"""
+Память и время выгрузки /export.csv и /export.xlsx админки.
+
+На временной SQLite --parents родителей по --children детей. Ответ читаем кусками через
+тестовый клиент Flask и меряем пик памяти Python (tracemalloc) за весь запрос.
+--legacy — старая выгрузка (.all() -> StringIO -> BytesIO -> send_file) для сравнения.
+
+    python bench/admin_export.py
+    python bench/admin_export.py --parents 200000 --legacy
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _legacy_export():
+    # как было до потоковой выгрузки
+    import csv
+    from io import BytesIO, StringIO
+    from flask import send_file
+    from app.core.db import db_session
+    from app.core.models import Child, Parent
+
+    si = StringIO(newline="")
+    writer = csv.writer(si)
+    writer.writerow(["parent_id", "parent_full_name", "phone", "language",
+                     "child_id", "child_name", "child_age", "paid"])
+    with db_session() as db:
+        rows = (
+            db.query(Parent, Child)
+            .join(Child, Child.parent_id == Parent.id, isouter=True)
+            .order_by(Parent.id.asc())
+            .all()
+        )
+        for p, c in rows:
+            writer.writerow([p.id, p.full_name or "", p.phone or "", p.language or "",
+                             getattr(c, "id", "") or "", getattr(c, "name", "") or "",
+                             getattr(c, "age", "") or "", getattr(c, "paid", 0) or 0])
+    buf = BytesIO()
+    buf.write("\ufeff".encode("utf-8"))
+    buf.write(si.getvalue().encode("utf-8"))
+    buf.seek(0)
+    return send_file(buf, mimetype="text/csv; charset=utf-8", as_attachment=True, download_name="export.csv")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parents", type=int, default=50000)
+    ap.add_argument("--children", type=int, default=2)
+    ap.add_argument("--legacy", action="store_true", help="замерить и старую выгрузку")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-export-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import insert
+    from app.admin.app import app, create_app
+    from app.core.db import engine
+    from app.core.models import Child, Parent
+
+    create_app()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Parent), [
+            {"id": i + 1, "tg_id": str(i), "full_name": f"Родитель {i}", "phone": f"+99890{i:07d}",
+             "language": "ru" if i % 3 else "uz", "city": "", "ref_code": "", "created_at": now}
+            for i in range(args.parents)
+        ])
+        conn.execute(insert(Child), [
+            {"parent_id": i // args.children + 1, "name": f"Ребёнок {i}", "age": 7 + i % 10,
+             "paid": i % 2 == 0, "has_telegram": False, "created_at": now}
+            for i in range(args.parents * args.children)
+        ])
+
+    if args.legacy:
+        app.add_url_rule("/export-legacy.csv", "export_legacy", _legacy_export)
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_logged"] = True
+
+    urls = (["/export-legacy.csv"] if args.legacy else []) + ["/export.csv", "/export.xlsx", "/export.csv?paid=1&lang=uz"]
+    print(f"{args.parents} родителей × {args.children} детей")
+    for url in urls:
+        tracemalloc.start()
+        t = time.perf_counter()
+        size = 0
+        with client.get(url, buffered=False) as r:
+            assert r.status_code == 200, r.data[:200]
+            for chunk in r.response:
+                size += len(chunk)
+        elapsed = time.perf_counter() - t
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"  {url:30} {size / 2**20:7.1f} МиБ за {elapsed:5.2f} s, пик памяти {peak / 2**20:7.1f} МиБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Списки админки и /api/parents на большой таблице: как было (.all() / COUNT + OFFSET) и keyset.
+
+На временной SQLite --rows заявок и родителей. Печатаем время ответа:
+  /leads целиком (старый вид) против первой и «глубокой» страницы keyset (около конца таблицы),
+  /api/parents: COUNT + OFFSET на той же глубине против ?after=.
+Проверка: /children?sort=-created_at по ссылкам «Дальше» до конца — каждый ребёнок ровно один раз.
+
+    python bench/admin_lists.py
+    python bench/admin_lists.py --rows 500000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _legacy_leads():
+    # как было: вся таблица одним .all() и в один HTML
+    from flask import render_template
+    from app.core.db import db_session
+    from app.core.models import Lead
+
+    with db_session() as db:
+        rows = db.query(Lead).order_by(Lead.id.desc()).all()
+    items = [{
+        "id": l.id, "name": l.name or "", "age": l.age or "", "phone": l.phone or "", "tg_username": "",
+        "source": l.source or "", "processed": 1 if l.processed else 0,
+        "created": l.created_at.strftime("%d-%m-%Y") if l.created_at else "",
+    } for l in rows]
+    return render_template("leads.html", items=items, page=None, first_url="", next_url=None)
+
+
+def _legacy_api_parents(offset: int, limit: int):
+    from app.core.db import db_session
+    from app.core.models import Parent
+
+    with db_session() as db:
+        total = db.query(Parent).count()
+        rows = db.query(Parent).order_by(Parent.id.desc()).offset(offset).limit(limit).all()
+        return total, [p.id for p in rows]
+
+
+def _timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--limit", type=int, default=50)
+    ap.add_argument("--children", type=int, default=2000)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-lists-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import insert, text
+    from app.admin.app import app, create_app
+    from app.admin.listing import _encode
+    from app.core.db import engine
+    from app.core.models import Child, Lead, Parent
+
+    create_app()
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Lead), [
+            {"name": f"bench {i}", "phone": f"+99890{i:07d}", "status": "new", "processed": i % 3 == 0,
+             "source": ("site", "ads", "partner")[i % 3], "ref_code": "", "created_at": start + timedelta(seconds=i)}
+            for i in range(args.rows)
+        ])
+        conn.execute(insert(Parent), [
+            {"id": i + 1, "tg_id": str(i), "full_name": f"Родитель {i}", "phone": f"99890{i:07d}",
+             "language": "ru", "city": "", "ref_code": "", "created_at": start + timedelta(seconds=i)}
+            for i in range(args.rows)
+        ])
+        # created_at не задаём — его ставит модель, как у детей из бота и админки
+        conn.execute(insert(Child), [
+            {"parent_id": i % args.rows + 1, "name": f"Ребёнок {i}", "age": 7 + i % 10}
+            for i in range(args.children)
+        ])
+        conn.execute(text("ANALYZE"))
+
+    app.add_url_rule("/leads-legacy", "leads_legacy", _legacy_leads)
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_logged"] = True
+
+    def get(url: str):
+        r = client.get(url)
+        assert r.status_code == 200, r.data[:200]
+
+    # «глубокая» страница — у конца таблицы (сортировка id desc): после id=1001, то есть OFFSET rows-1001
+    after = _encode(1001, 1001)
+    offset = args.rows - 1001
+    lim = args.limit
+    print(f"{args.rows} строк, страница {lim}")
+    print(f"  /leads целиком (как было)           {_timed(lambda: get('/leads-legacy'), 1):9.1f} ms")
+    print(f"  /leads первая страница              {_timed(lambda: get(f'/leads?limit={lim}')):9.1f} ms")
+    print(f"  /leads глубокая страница (after)    {_timed(lambda: get(f'/leads?limit={lim}&after={after}')):9.1f} ms")
+    print(f"  /leads processed=1&source=ads       {_timed(lambda: get(f'/leads?limit={lim}&processed=1&source=ads')):9.1f} ms")
+    print(f"  /api/parents COUNT + OFFSET (как было) {_timed(lambda: _legacy_api_parents(offset, lim)):6.1f} ms")
+    print(f"  /api/parents ?after= (та же глубина)   {_timed(lambda: get(f'/api/parents?limit={lim}&after={after}')):6.1f} ms")
+
+    # все страницы /children по created_at: курсор не должен возвращать свою же страницу
+    url, seen, pages = f"/children?sort=-created_at&limit={lim}", [], 0
+    while url and pages <= args.children:
+        r = client.get(url)
+        assert r.status_code == 200, r.data[:200]
+        html = r.get_data(as_text=True)
+        seen += [int(x) for x in re.findall(r'id="paid-(\d+)"', html)]
+        pages += 1
+        nxt = re.search(r'href="([^"]+)">Дальше', html)
+        url = nxt.group(1).replace("&amp;", "&") if nxt else None
+    ok = len(seen) == len(set(seen)) == args.children
+    print(f"  /children?sort=-created_at: {pages} страниц, {len(seen)} строк из {args.children} — {'OK' if ok else 'FAIL'}")
+    day = datetime.utcnow().date().isoformat()
+    r = client.get(f"/children?date_from={day}&date_to={day}&limit={lim}")
+    found = len(re.findall(r'id="paid-(\d+)"', r.get_data(as_text=True)))
+    ok = ok and found == min(lim, args.children)
+    print(f"  /children?date_from={day}: {found} строк на первой странице — {'OK' if found == min(lim, args.children) else 'FAIL'}")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Сколько SQL-запросов делает каждая страница админки — и что это число не растёт со страницей.
+
+На временной SQLite --rows родителей (по 2 ребёнка и записи) и заявок. Каждую страницу
+открываем с ?limit=10 и ?limit=500 и считаем запросы (app.core.db.count_queries):
+разное число — N+1, скрипт завершается с кодом 1.
+--legacy — для сравнения список родителей «как обычно пишут»: ORM-объекты и parent.children
+по строке (ленивая загрузка на каждого родителя).
+
+    python bench/admin_queries.py
+    python bench/admin_queries.py --rows 20000 --legacy
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ["/", "/parents", "/children", "/leads", "/appointments", "/api/parents"]
+
+
+def _legacy_parents():
+    # ленивая загрузка детей: SELECT на каждого родителя страницы
+    from flask import jsonify, request
+    from app.core.db import db_session
+    from app.core.models import Parent
+
+    limit = int(request.args.get("limit", 50))
+    with db_session() as db:
+        parents = db.query(Parent).order_by(Parent.id.desc()).limit(limit).all()
+        rows = [{"id": p.id, "children": ", ".join(c.name for c in p.children)} for p in parents]
+    return jsonify(rows)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--legacy", action="store_true", help="добавить список родителей с ленивой загрузкой")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-queries-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import insert
+    from app.admin.app import app, create_app
+    from app.core import stats
+    from app.core.db import count_queries, engine
+    from app.core.models import Appointment, Child, Lead, Parent
+
+    create_app()
+    now = datetime.utcnow()
+    n = args.rows
+    with engine.begin() as conn:
+        conn.execute(insert(Parent), [
+            {"id": i, "tg_id": str(i), "full_name": f"Родитель {i}", "phone": f"99890{i:07d}", "language": "ru",
+             "city": "", "ref_code": "", "created_at": now} for i in range(1, n + 1)])
+        conn.execute(insert(Child), [
+            {"id": i, "parent_id": (i + 1) // 2, "name": f"Ребёнок {i}", "age": 8, "paid": i % 2 == 0,
+             "has_telegram": False, "created_at": now} for i in range(1, 2 * n + 1)])
+        conn.execute(insert(Appointment), [
+            {"id": i, "child_id": i, "datetime_str": "Пн 18:00", "location": "", "status": "new", "created_at": now}
+            for i in range(1, n + 1)])
+        conn.execute(insert(Lead), [
+            {"id": i, "name": f"bench {i}", "phone": f"+99890{i:07d}", "status": "new", "processed": False,
+             "source": "site", "ref_code": "", "created_at": now} for i in range(1, n + 1)])
+    stats.reconcile()
+
+    pages = list(PAGES)
+    if args.legacy:
+        app.add_url_rule("/parents-legacy", "parents_legacy", _legacy_parents)
+        pages.append("/parents-legacy")
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_logged"] = True
+
+    def measure(url: str) -> tuple[int, float]:
+        with count_queries() as queries:
+            t = time.perf_counter()
+            r = client.get(url)
+            elapsed = (time.perf_counter() - t) * 1000
+        assert r.status_code == 200, (url, r.data[:200])
+        return len(queries), elapsed
+
+    print(f"{n} родителей, {2 * n} детей; запросов (время) на страницу")
+    print(f"  {'страница':18} {'limit=10':>16} {'limit=500':>16}")
+    bad = []
+    for url in pages:
+        sep = "&" if "?" in url else "?"
+        q10, t10 = measure(f"{url}{sep}limit=10")
+        q500, t500 = measure(f"{url}{sep}limit=500")
+        mark = "" if q10 == q500 else "  <- N+1"
+        print(f"  {url:18} {q10:4} ({t10:6.1f} ms) {q500:4} ({t500:6.1f} ms){mark}")
+        if q10 != q500 and url != "/parents-legacy":
+            bad.append(url)
+    if bad:
+        print("число запросов зависит от размера страницы:", ", ".join(bad))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
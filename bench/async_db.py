@@ -0,0 +1,171 @@
+"""
+Sync vs async (DB_ASYNC) для FastAPI-роутов: requests/sec и p50/p99 под параллельной нагрузкой.
+
+Для каждого режима поднимаем настоящий uvicorn (1 воркер) на временной SQLite с историей:
+--parents родителей по --leads-per-parent заявок. --concurrency клиентов шлют --requests запросов:
+доля --write — POST /api/leads с новыми номерами, остальное — GET /parent/{ref_code}.
+Лимиты частоты на время замера выключены.
+
+--db-latency имитирует сетевую БД (Postgres в соседней зоне): каждый execute драйвера sqlite3
+спит столько секунд — в том потоке, где его зовут (поток пула для sync, поток aiosqlite для async).
+
+    python bench/async_db.py
+    python bench/async_db.py --db-latency 0.02 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# запускается в процессе сервера: задержка на уровне драйвера, затем uvicorn
+_SERVER = """
+import os, sqlite3, sys, time
+import uvicorn
+delay = float(os.environ["BENCH_DB_LATENCY"])
+if delay:
+    class Cursor(sqlite3.Cursor):
+        def execute(self, *a):
+            time.sleep(delay)
+            return super().execute(*a)
+
+        def executemany(self, *a):
+            time.sleep(delay)
+            return super().executemany(*a)
+
+    class Connection(sqlite3.Connection):
+        def cursor(self, factory=Cursor):
+            return super().cursor(factory)
+
+    _connect = sqlite3.connect
+    # pysqlite берёт sqlite3.dbapi2.connect, aiosqlite — sqlite3.connect
+    sqlite3.connect = sqlite3.dbapi2.connect = lambda *a, **kw: _connect(*a, factory=Connection, **kw)
+uvicorn.run("app.main:app", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def _seed(db_url: str, parents: int, per_parent: int) -> None:
+    os.environ["DATABASE_URL"] = db_url
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import insert
+    from app.core.db import engine, init_db
+    from app.core.models import Lead, Parent
+
+    init_db()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(Parent), [
+            {"id": i + 1, "tg_id": str(10_000 + i), "full_name": f"parent {i}", "ref_code": f"ref{i}",
+             "language": "ru", "created_at": now}
+            for i in range(parents)
+        ])
+        conn.execute(insert(Lead), [
+            {"name": f"kid {i}", "phone": f"+99891{i:07d}", "parent_id": i % parents + 1, "status": "won",
+             "processed": True, "source": "seed", "ref_code": "", "created_at": now}
+            for i in range(parents * per_parent)
+        ])
+    engine.dispose()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _load(base: str, args, mode: str) -> list[float]:
+    import httpx
+
+    rnd = random.Random(7)
+    latencies: list[float] = []
+    counter = iter(range(args.requests))
+    errors = 0
+
+    async def client_loop(client: "httpx.AsyncClient") -> None:
+        nonlocal errors
+        for i in counter:
+            t = time.perf_counter()
+            try:
+                if rnd.random() < args.write:
+                    r = await client.post("/api/leads", json={"name": "bench", "phone": f"+99893{mode[0] == 'a'}{i:06d}"})
+                else:
+                    r = await client.get(f"/parent/ref{rnd.randrange(args.parents)}")
+            except httpx.TransportError:
+                errors += 1  # keep-alive соединение закрыто сервером — не роняем замер
+                continue
+            latencies.append(time.perf_counter() - t)
+            if r.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+    if errors:
+        print(f"  ! ошибок: {errors}")
+    return latencies
+
+
+def _run(mode: str, db_url: str, args) -> None:
+    import httpx
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=db_url,
+        BOT_TOKEN="123456:bench",
+        DB_ASYNC="true" if mode == "async" else "false",
+        NOTIFY_DISPATCHER_IN_API="false",
+        LEAD_RATE_LIMIT_IP="0",
+        LEAD_RATE_LIMIT_PHONE="0",
+        BENCH_DB_LATENCY=str(args.db_latency),
+    )
+    proc = subprocess.Popen([sys.executable, "-c", _SERVER, str(port)], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                httpx.get(base + "/health")
+                break
+            except httpx.HTTPError:
+                time.sleep(0.05)
+        t0 = time.perf_counter()
+        latencies = asyncio.run(_load(base, args, mode))
+        elapsed = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    print(f"{mode:5}: {len(latencies) / elapsed:7.0f} req/s   p50 {p(0.5):7.1f} ms   p99 {p(0.99):7.1f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=100)
+    ap.add_argument("--write", type=float, default=0.2, help="доля POST /api/leads")
+    ap.add_argument("--parents", type=int, default=1000)
+    ap.add_argument("--leads-per-parent", type=int, default=20)
+    ap.add_argument("--db-latency", type=float, default=0.0, help="сек на каждый execute драйвера")
+    ap.add_argument("--mode", choices=("sync", "async", "both"), default="both")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-async-")
+    db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    _seed(db_url, args.parents, args.leads_per_parent)
+    print(f"{args.requests} запросов, {args.concurrency} клиентов, записи {args.write:.0%}, "
+          f"задержка БД {args.db_latency * 1000:.0f} ms")
+    for mode in (("sync", "async") if args.mode == "both" else (args.mode,)):
+        _run(mode, db_url, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Транспорт Bot API (app.bot.transport) против фейкового сервера (bench/fake_bot_api.py).
+
+1. Переиспользование соединений: --sends sendMessage из --threads потоков через TeleBot —
+   вызовы, попытки, новые соединения, p50/p95.
+2. Политика повторов на сбоях: 502, ответ дольше read-таймаута, обрыв, закрытый порт —
+   сколько запросов дошло до сервера (дубли sendMessage!) и сколько ждал вызывающий.
+   Таймауты уменьшены: connect 0.5 с, read 1 с, total 3 с, пауза 0.1 с.
+--legacy — то же для старой схемы: сессия requests по умолчанию (Retry(5) из app.bot.client до неё
+не доходил, см. _legacy_transport) + повтор на ReadTimeout в safe_send_message.
+
+    python bench/bot_api.py
+    python bench/bot_api.py --sends 2000 --threads 16 --legacy
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)  # и `python bench/….py`, и `python -m bench.…`
+from bench.fake_bot_api import FakeBotApi  # noqa: E402
+
+TOKEN = "123456:bench"
+CONNECT, READ, TOTAL = 0.5, 1.0, 3.0
+
+
+def _legacy_transport(read: float, connect: float) -> None:
+    # как было в app.bot.client до транспорта. Сессия с Retry(5) ставилась в apihelper.SESSION,
+    # а telebot берёт apihelper.session — настройка не применялась: сессия requests по умолчанию
+    # на каждый поток (пул 10, без повторов). Повторяем как есть.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from telebot import apihelper
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(total=5, connect=5, read=5, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=100, pool_maxsize=100)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    apihelper.CUSTOM_REQUEST_SENDER = None
+    apihelper.SESSION = session
+    apihelper.READ_TIMEOUT = read
+    apihelper.CONNECT_TIMEOUT = connect
+
+
+def _legacy_send(bot, chat_id, text):
+    # старый safe_send_message: второй заход на ReadTimeout
+    import requests
+
+    try:
+        return bot.send_message(chat_id, text)
+    except requests.exceptions.ReadTimeout:
+        return bot.send_message(chat_id, text)
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sends", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--legacy", action="store_true", help="добавить старую схему повторов для сравнения")
+    args = ap.parse_args()
+
+    server = FakeBotApi().start()
+    os.environ.update({
+        "BOT_TOKEN": TOKEN, "BOT_API_URL": server.url,
+        "BOT_API_CONNECT_TIMEOUT": str(CONNECT), "BOT_API_READ_TIMEOUT": str(READ),
+        "BOT_API_TOTAL_TIMEOUT": str(TOTAL), "BOT_API_RETRY_BACKOFF": "0.1", "BOT_API_RETRIES": "2",
+        "DATABASE_URL": "sqlite://",
+    })
+
+    from telebot import TeleBot, apihelper
+    from app.bot.client import _configure_transport
+    from app.bot.transport import get_transport
+
+    bot = TeleBot(TOKEN, threaded=False)
+    _configure_transport()
+
+    # ---- 1. переиспользование соединений
+    print(f"1. {args.sends} sendMessage, {args.threads} потоков")
+    server.reset()
+    t = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda i: bot.send_message(i, "bench"), range(args.sends)))
+    elapsed = time.perf_counter() - t
+    st = get_transport().stats()
+    print(f"  sync  (requests): {elapsed * 1000:7.0f} ms, попыток {st['attempts']} (повторов {st['retries']}), соединений {st['connections']} "
+          f"(сервер принял {server.connections}), reuse {st['reuse']:.1%}, p50 {st['p50_ms']} ms, p95 {st['p95_ms']} ms")
+
+    if args.legacy:
+        _legacy_transport(READ, CONNECT)
+        server.reset()
+        t = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda i: bot.send_message(i, "bench"), range(args.sends)))
+        elapsed = time.perf_counter() - t
+        print(f"  legacy:           {elapsed * 1000:7.0f} ms, сервер принял соединений: {server.connections}")
+        _configure_transport()
+
+    # ---- 2. сбои
+    dead = f"http://127.0.0.1:{_free_port()}"
+    cases = [
+        ("getMe: 502, 502, ok", "getMe", [("status", 502), ("status", 502)], None),
+        ("sendMessage: 502", "sendMessage", [("status", 502)], None),
+        ("sendMessage: ответ через 3 с", "sendMessage", [("delay", 3.0)] * 2, None),
+        ("sendMessage: обрыв без ответа", "sendMessage", ["drop"], None),
+        ("getMe: ответ через 3 с x3", "getMe", [("delay", 3.0)] * 3, None),
+        ("sendMessage: порт закрыт", "sendMessage", [], dead),
+    ]
+    modes = [("транспорт", None)] + ([("legacy", "legacy")] if args.legacy else [])
+    print(f"2. сбои (connect {CONNECT} с, read {READ} с, total {TOTAL} с): запросов на сервер / ждали / исход")
+    for mode, legacy in modes:
+        print(f"  {mode}:")
+        for title, method, actions, url in cases:
+            if legacy:
+                _legacy_transport(READ, CONNECT)
+            else:
+                _configure_transport()
+            apihelper.API_URL = (url or server.url) + "/bot{0}/{1}"
+            server.reset()
+            server.script(method, *actions)
+            t = time.perf_counter()
+            try:
+                if method == "getMe":
+                    bot.get_me()
+                elif legacy:
+                    _legacy_send(bot, 1, "bench")
+                else:
+                    bot.send_message(1, "bench")
+                outcome = "ok"
+            except Exception as e:
+                outcome = type(e).__name__
+            elapsed = time.perf_counter() - t
+            hits = sum(1 for m, _ in server.calls if m == method)
+            print(f"    {title:32} {hits:3} {elapsed:6.2f} с  {outcome}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
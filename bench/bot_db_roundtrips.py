@@ -0,0 +1,147 @@
+"""
+Сколько SQL-запросов и коммитов уходит на одно сообщение боту.
+
+Прогоняет сценарий родителя и ребёнка через bot.process_new_updates на временной SQLite,
+отправка в Telegram подменена заглушкой. Запуск из корня репозитория:
+
+    python bench/bot_db_roundtrips.py
+    python bench/bot_db_roundtrips.py --state memory
+    python bench/bot_db_roundtrips.py --legacy
+
+--legacy — тот же сценарий ещё и на коде до UpdateContext (коммит перед [user-007], берётся
+через git archive во временный каталог) и итог «было -> стало».
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEGACY_REQUEST = "user-007"
+
+
+def _import_bot(root: str):
+    sys.path.insert(0, root)
+    try:
+        import app.bot.bot as B
+        from app.core.db import engine
+    except ModuleNotFoundError:
+        # старое дерево: модули импортировались от app/ — core.*, bot.*
+        sys.path.insert(0, os.path.join(root, "app"))
+        import bot.bot as B
+        from core.db import engine
+    return B, engine
+
+
+def _legacy_tree() -> tuple[str, str]:
+    """Выгружает app/ из коммита перед [user-007] во временный каталог: (каталог, ревизия)."""
+    # первый коммит с этим тегом — сам запрос; более поздние — правки по ревью
+    revs = subprocess.run(
+        ["git", "-C", ROOT, "log", "--reverse", "--format=%h", f"--grep=^\\[{LEGACY_REQUEST}\\]"],
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    rev = revs[0] if revs else ""
+    if not rev:
+        raise SystemExit(f"коммит [{LEGACY_REQUEST}] не найден в git log")
+    tree = tempfile.mkdtemp(prefix="bench-bot-legacy-")
+    archive = subprocess.run(["git", "-C", ROOT, "archive", f"{rev}^", "app"], capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", tree], input=archive.stdout, check=True)
+    return tree, f"{rev}^"
+
+
+def _averages(output: str) -> tuple[float, float]:
+    _, stmts, commits = output.strip().splitlines()[-1].rsplit(None, 2)
+    return float(stmts), float(commits)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--state", default="sqlite", help="BOT_STATE_BACKEND: memory | sqlite")
+    ap.add_argument("--legacy", action="store_true", help="сравнить с кодом до [user-007]")
+    ap.add_argument("--root", default=ROOT, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.legacy:
+        tree, rev = _legacy_tree()
+        run = [sys.executable, os.path.abspath(__file__), "--state", args.state]
+        before = subprocess.run(run + ["--root", tree], capture_output=True, text=True, check=True).stdout
+        after = subprocess.run(run, capture_output=True, text=True, check=True).stdout
+        print(f"до [{LEGACY_REQUEST}] ({rev}):\n{before}\nсейчас:\n{after}")
+        (s0, c0), (s1, c1) = _averages(before), _averages(after)
+        print(f"SQL на сообщение: {s0:.1f} -> {s1:.1f} ({s0 / s1:.1f}x), commit: {c0:.1f} -> {c1:.1f}")
+        return
+
+    tmp = tempfile.mkdtemp(prefix="bench-bot-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    os.environ["BOT_STATE_BACKEND"] = args.state
+
+    from sqlalchemy import event
+    from telebot import types
+    B, engine = _import_bot(args.root)
+    if hasattr(B, "create_bot"):  # в старом дереве бот создавался при импорте
+        B.create_bot()
+
+    sent = []
+
+    def fake_send(chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+        return None
+
+    B.bot.send_message = fake_send
+    B.bot.answer_callback_query = lambda *a, **k: True
+    B.bot.edit_message_reply_markup = lambda *a, **k: True
+
+    counters = {"stmts": 0, "commits": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _on_stmt(*_):
+        counters["stmts"] += 1
+
+    @event.listens_for(engine, "commit")
+    def _on_commit(*_):
+        counters["commits"] += 1
+
+    seq = [0]
+
+    def message(user: int, text: str) -> types.Update:
+        seq[0] += 1
+        msg = {
+            "message_id": seq[0], "date": 0, "text": text,
+            "chat": {"id": user, "type": "private"},
+            "from": {"id": user, "is_bot": False, "first_name": "bench"},
+        }
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return types.Update.de_json({"update_id": seq[0], "message": msg})
+
+    def send(update: types.Update) -> None:
+        B.bot.process_new_updates([update])
+
+    parent, kid = 1001, 2002
+    for text in ("/start", "Русский", "Иван Петров", "+998901234567", "Добавить ребенка", "Петя", "10"):
+        send(message(parent, text))
+    for text in ("/start 1", "+998901111111"):
+        send(message(kid, text))
+
+    scenario = [
+        (parent, "Главное меню"), (parent, "Цены"), (parent, "Расписание"), (parent, "Мои дети"),
+        (parent, "Оплатить курсы"), (parent, "Записать на пробное"), (parent, "Помощь"),
+        (parent, "вопрос тренеру"), (kid, "Мое расписание"), (kid, "Помощь"), (kid, "вопрос"),
+    ]
+    total_stmts = total_commits = 0
+    print(f"state backend: {args.state}")
+    print(f"{'сообщение':24} {'SQL':>4} {'commit':>7}")
+    for user, text in scenario:
+        counters["stmts"] = counters["commits"] = 0
+        send(message(user, text))
+        total_stmts += counters["stmts"]
+        total_commits += counters["commits"]
+        print(f"{text:24} {counters['stmts']:>4} {counters['commits']:>7}")
+    n = len(scenario)
+    print(f"{'в среднем':24} {total_stmts / n:>4.1f} {total_commits / n:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Стоимость reply_markup на одно сообщение: сборка telebot-разметки + to_json()
+против готового JSON из кэша app.bot.keyboards.
+
+    python bench/bot_keyboards.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from telebot import apihelper  # noqa: E402
+
+from app.bot import keyboards  # noqa: E402
+
+N = 20000
+
+
+def main() -> None:
+    print(f"{'клавиатура':18} {'сборка, мкс':>12} {'кэш, мкс':>10}")
+    for kind in ("main_parent", "step", "phone", "kid_main", "schedule_inline"):
+        build = keyboards.BUILDERS[kind]
+        built = timeit.timeit(lambda: apihelper._convert_markup(build("ru")), number=N) / N * 1e6
+        cached = timeit.timeit(lambda: apihelper._convert_markup(keyboards.markup(kind, "ru")), number=N) / N * 1e6
+        print(f"{kind:18} {built:>12.2f} {cached:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Дашборд админки по мере роста таблиц: четыре COUNT(*) (как было) против stats_counters.
+
+На временной SQLite таблицы parents/children/leads/appointments дорастают до каждого из --sizes
+строк; на каждом шаге — лучшее из --repeat время ответа GET / (счётчики) и старого варианта.
+В конце — цена счётчиков на записи: N заявок по одной в своей транзакции с событиями и без.
+
+    python bench/dashboard.py
+    python bench/dashboard.py --sizes 10000,100000,1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _legacy_dashboard():
+    # как было: COUNT(*) по каждой таблице на каждый заход
+    from flask import render_template
+    from app.core.db import db_session
+    from app.core.models import Appointment, Child, Lead, Parent
+
+    with db_session() as db:
+        parents = db.query(Parent).count()
+        children = db.query(Child).count()
+        leads = db.query(Lead).count()
+        appts = db.query(Appointment).count()
+    totals = {"parents": parents, "parents_paid": 0, "children": children, "children_paid": 0, "leads": leads,
+              "leads_open": 0, "leads_converted": 0, "appointments": appts}
+    return render_template("dashboard.html", totals=totals, days=[], slots=[],
+                           conversion={"lead_parent": 0, "parent_paid": 0})
+
+
+def _timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def _grow(conn, have: int, want: int, start: datetime) -> None:
+    from sqlalchemy import insert
+    from app.core.models import Appointment, Child, Lead, Parent
+
+    ids = range(have + 1, want + 1)
+    conn.execute(insert(Parent), [
+        {"id": i, "tg_id": str(i), "full_name": f"Родитель {i}", "phone": f"99890{i:07d}", "language": "ru",
+         "city": "", "ref_code": "", "created_at": start} for i in ids])
+    conn.execute(insert(Child), [
+        {"id": i, "parent_id": i, "name": f"Ребёнок {i}", "age": 8, "paid": i % 4 == 0, "has_telegram": False,
+         "created_at": start} for i in ids])
+    conn.execute(insert(Lead), [
+        {"id": i, "name": f"bench {i}", "phone": f"+99890{i:07d}", "status": "new", "processed": i % 2 == 0,
+         "parent_id": i if i % 3 == 0 else None, "source": "site", "ref_code": "",
+         "created_at": start + timedelta(minutes=i % 20000)} for i in ids])
+    conn.execute(insert(Appointment), [
+        {"id": i, "child_id": i, "datetime_str": f"{['Пн', 'Ср', 'Пт'][i % 3]} {17 + i % 3}:00", "location": "",
+         "status": "new", "created_at": start} for i in ids])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,500000", help="строк в каждой таблице, через запятую")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--writes", type=int, default=2000, help="заявок для замера цены счётчиков на запись")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-dashboard-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from app.admin.app import app, create_app
+    from app.core import stats
+    from app.core.db import db_session, engine
+    from app.core.models import Lead
+
+    create_app()
+    app.add_url_rule("/dashboard-legacy", "dashboard_legacy", _legacy_dashboard)
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin_logged"] = True
+
+    def get(url: str):
+        r = client.get(url)
+        assert r.status_code == 200, r.data[:200]
+
+    start = datetime.utcnow() - timedelta(days=13)
+    have = 0
+    print(f"{'строк':>9}  {'4 × COUNT(*)':>14}  {'stats_counters':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with engine.begin() as conn:
+            _grow(conn, have, size, start)
+        have = size
+        stats.reconcile()  # Core insert выше шёл мимо событий ORM
+        legacy = _timed(lambda: get("/dashboard-legacy"), args.repeat)
+        new = _timed(lambda: get("/"), args.repeat)
+        print(f"{size:>9}  {legacy:>11.1f} ms  {new:>11.1f} ms")
+
+    def write(n: int, prefix: str) -> float:
+        t = time.perf_counter()
+        for i in range(n):
+            with db_session() as db:
+                db.add(Lead(name="w", phone=f"{prefix}{i:07d}"))
+        return (time.perf_counter() - t) / n * 1e6
+
+    event.remove(Session, "after_flush", stats._collect)
+    without = write(args.writes, "+99891")
+    event.listen(Session, "after_flush", stats._collect)
+    with_events = write(args.writes, "+99892")
+    print(f"запись заявки: {without:.0f} мкс без счётчиков, {with_events:.0f} мкс со счётчиками")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Фейковый Bot API на localhost — для бенчей и ручной проверки транспорта (app.bot.transport).
+
+    server = FakeBotApi().start()
+    os.environ["BOT_API_URL"] = server.url          # до импорта app.*
+    server.script("sendMessage", ("status", 502), ("delay", 3.0), "ok")
+    ...
+    server.calls, server.connections; server.stop()
+
+Отвечает как Telegram: {"ok": true, "result": ...}; sendMessage — сообщение, getMe — бот,
+getUpdates — пусто. Сценарий метода — очередь действий на следующие вызовы:
+  "ok" | ("delay", сек) | ("status", код) | ("retry_after", сек) — 429 | "drop" — закрыть соединение без ответа.
+HTTP/1.1 keep-alive: connections — сколько TCP-соединений принято, calls — [(метод, параметры)].
+
+    python bench/fake_bot_api.py --port 8081      # отдельным процессом: BOT_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, как у api.telegram.org
+    server: "FakeBotApi"
+
+    def setup(self):
+        super().setup()
+        # заголовки и тело уходят двумя send — без NODELAY Nagle + delayed ACK дают +40 мс на ответ
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self) -> dict:
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length)
+            ctype = self.headers.get("Content-Type", "")
+            if "json" in ctype:
+                params.update(json.loads(body or b"{}"))
+            elif "x-www-form-urlencoded" in ctype:
+                params.update(parse_qsl(body.decode()))
+        return params
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+        method, params = parts[1], self._params()
+        action = self.server.next_action(method)
+        with self.server.lock:
+            self.server.calls.append((method, params))
+        if isinstance(action, tuple) and action[0] == "delay":
+            time.sleep(action[1])
+        elif action == "drop":
+            self.close_connection = True   # сокет закроет сервер — клиент увидит обрыв без ответа
+            return
+        elif isinstance(action, tuple) and action[0] == "status":
+            return self._reply(action[1], {"ok": False, "error_code": action[1], "description": "Bad Gateway"})
+        elif isinstance(action, tuple) and action[0] == "retry_after":
+            return self._reply(429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                     "parameters": {"retry_after": action[1]}})
+        self._reply(200, {"ok": True, "result": self.server.result(method, params)})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.lock = threading.Lock()
+        self.calls: list = []
+        self.connections = 0
+        self._scripts: dict[str, deque] = {}
+        self._message_id = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_port}"
+
+    def start(self) -> "FakeBotApi":
+        threading.Thread(target=self.serve_forever, name="fake-bot-api", daemon=True).start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # клиент ушёл по своему таймауту раньше ответа — для фейка это норма, не трейсбек
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def script(self, method: str, *actions) -> None:
+        with self.lock:
+            self._scripts.setdefault(method, deque()).extend(actions)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.connections = 0
+            self._scripts.clear()
+
+    def next_action(self, method: str):
+        with self.lock:
+            queue = self._scripts.get(method)
+            return queue.popleft() if queue else "ok"
+
+    def result(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method == "getUpdates":
+            return []
+        if method in ("sendMessage", "editMessageText"):
+            with self.lock:
+                self._message_id += 1
+                message_id = self._message_id
+            chat_id = int(params.get("chat_id") or 0)
+            return {"message_id": message_id, "date": int(time.time()), "text": params.get("text", ""),
+                    "chat": {"id": chat_id, "type": "private"}}
+        return True
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    args = ap.parse_args()
+    server = FakeBotApi(args.host, args.port)
+    print(f"fake Bot API: {server.url}  (BOT_API_URL={server.url})")
+    server.serve_forever()
@@ -0,0 +1,137 @@
+"""
+Redis в процессе — для бенчей и ручной проверки Redis-бэкендов без сервера и пакета redis
+(app.bot.state.RedisStateStore, app.core.ratelimit.RedisRateLimiter).
+
+    client = FakeRedis()
+    RedisStateStore(ttl=60, client=client); RedisRateLimiter(client=client)
+    client.calls — сколько команд дошло до «сервера» (pipeline — одна поездка на execute)
+
+Только нужные бэкендам команды, с семантикой redis-py: значения — bytes, get/set(ex=)/delete/
+incr/decr/expire/scan_iter(match=), pipeline() копит команды и выполняет их разом в execute().
+TTL — по time.monotonic(), протухший ключ исчезает при обращении, как в Redis.
+"""
+import fnmatch
+import threading
+import time
+from typing import Optional
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.calls = 0
+        self._data: dict[str, bytes] = {}
+        self._expires: dict[str, float] = {}
+
+    # ---- служебное
+    def _alive(self, key: str) -> bool:
+        at = self._expires.get(key)
+        if at is not None and at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def _trip(self) -> None:
+        with self.lock:
+            self.calls += 1
+
+    def pttl(self, key: str) -> Optional[float]:
+        """Сколько секунд ключу осталось жить (None — без TTL или ключа нет); для проверок."""
+        with self.lock:
+            if not self._alive(key) or key not in self._expires:
+                return None
+            return self._expires[key] - time.monotonic()
+
+    # ---- команды
+    def get(self, key: str) -> Optional[bytes]:
+        self._trip()
+        with self.lock:
+            return self._data[key] if self._alive(key) else None
+
+    def set(self, key: str, value, ex: Optional[int] = None) -> bool:
+        self._trip()
+        with self.lock:
+            self._data[key] = self._encode(value)
+            self._expires.pop(key, None)
+            if ex is not None:
+                self._expires[key] = time.monotonic() + int(ex)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        self._trip()
+        with self.lock:
+            n = 0
+            for key in keys:
+                if self._alive(key):
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    n += 1
+            return n
+
+    def _incrby(self, key: str, amount: int) -> int:
+        with self.lock:
+            value = int(self._data[key]) if self._alive(key) else 0
+            value += amount
+            self._data[key] = self._encode(value)   # INCR сохраняет TTL ключа
+            return value
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        self._trip()
+        return self._incrby(key, amount)
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        self._trip()
+        return self._incrby(key, -amount)
+
+    def expire(self, key: str, seconds: int) -> bool:
+        self._trip()
+        with self.lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.monotonic() + int(seconds)
+            return True
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None):
+        self._trip()
+        with self.lock:
+            keys = [k for k in list(self._data) if self._alive(k)]
+        for key in keys:
+            if match is None or fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Команды копятся и выполняются под одной блокировкой — как MULTI/EXEC за одну поездку."""
+
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self._queue: list[tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(FakeRedis, name, None)):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._queue.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> list:
+        client = self.client
+        client._trip()
+        with client.lock:
+            calls = client.calls
+            try:
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in self._queue]
+            finally:
+                client.calls = calls   # команды внутри pipeline — не отдельные поездки
+                self._queue.clear()
@@ -0,0 +1,75 @@
+"""
+Пропускная способность POST /api/leads/bulk против поштучных POST /api/leads.
+
+На временной SQLite: --rows заявок (доля --dup повторов телефонов внутри пакета) уходят
+одним JSON-массивом и одним NDJSON-потоком; для сравнения --single заявок — по одной.
+
+    python bench/lead_bulk_ingest.py
+    python bench/lead_bulk_ingest.py --rows 50000 --dup 0.3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _rows(n: int, dup: float, offset: int) -> list[dict]:
+    rnd = random.Random(offset)
+    unique = max(1, int(n * (1 - dup)))
+    numbers = list(range(unique)) + [rnd.randrange(unique) for _ in range(n - unique)]
+    rnd.shuffle(numbers)
+    return [
+        {"name": f"bench {i}", "phone": f"+99891{offset + k:07d}", "age": "9", "source": "ads"}
+        for i, k in enumerate(numbers)
+    ]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--dup", type=float, default=0.1, help="доля повторов телефонов в пакете")
+    ap.add_argument("--single", type=int, default=500, help="сколько заявок отправить поштучно")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-bulk-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    os.environ["ADMIN_CHAT_IDS"] = "[1]"
+    os.environ["NOTIFY_DISPATCHER_IN_API"] = "false"
+    os.environ["LEAD_RATE_LIMIT_IP"] = "0"      # меряем приём заявок, а не лимитер
+    os.environ["LEAD_RATE_LIMIT_PHONE"] = "0"
+    os.environ["LEAD_BULK_TOKEN"] = "bench"
+    sys.path.insert(0, ROOT)
+
+    from fastapi.testclient import TestClient
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        rows = _rows(args.single, 0.0, 0)
+        t = time.perf_counter()
+        for row in rows:
+            assert client.post("/api/leads", json=row).status_code == 201
+        single = time.perf_counter() - t
+        print(f"{'по одной':10} {args.single:6} строк  {args.single / single:8.0f} строк/с")
+
+        for i, (label, ctype) in enumerate((("JSON", "application/json"), ("NDJSON", "application/x-ndjson"))):
+            rows = _rows(args.rows, args.dup, (i + 1) * 10_000_000)
+            if ctype == "application/json":
+                body = json.dumps(rows).encode()
+            else:
+                body = "\n".join(json.dumps(r) for r in rows).encode()
+            t = time.perf_counter()
+            r = client.post("/api/leads/bulk", content=body, headers={"content-type": ctype, "authorization": "Bearer bench"})
+            elapsed = time.perf_counter() - t
+            res = r.json()
+            print(f"{label:10} {args.rows:6} строк  {args.rows / elapsed:8.0f} строк/с  "
+                  f"создано {res['created']}, дублей {res['duplicates']}, ошибок {res['invalid']}")
+
+
+if __name__ == "__main__":
+    main()
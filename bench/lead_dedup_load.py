@@ -0,0 +1,111 @@
+"""
+Нагрузка на POST /api/leads с большой долей дублей (двойные клики, спам ботов).
+
+На временной SQLite заранее лежит история: --seed старых заявок по тем же номерам
+(обработанные, старше окна антидубля) — её и приходилось сканировать по индексу phone.
+Затем --threads потоков шлют --requests заявок по --unique номерам в разных записях
+(+998 90 ..., 90..., 8 90 ...). Печатаем пропускную способность, задержки, SQL на запрос
+и сколько заявок реально создано (должно быть ровно --unique).
+
+    python bench/lead_dedup_load.py
+    python bench/lead_dedup_load.py --no-cache            # только БД-антидубль
+    python bench/lead_dedup_load.py --no-cache --legacy-index   # как было: индекс только по phone
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _formats(n: int) -> list[str]:
+    local = f"90{n:07d}"
+    return [f"+998 {local[:2]} {local[2:5]}-{local[5:7]}-{local[7:]}", local, "8" + local, "998" + local]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=4000)
+    ap.add_argument("--unique", type=int, default=200, help="разных номеров (доля дублей = 1 - unique/requests)")
+    ap.add_argument("--seed", type=int, default=100000, help="старых заявок по этим номерам")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--no-cache", action="store_true", help="выключить кэш недавних заявок")
+    ap.add_argument("--legacy-index", action="store_true", help="индекс только по phone вместо составного")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-leads-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    os.environ["NOTIFY_DISPATCHER_IN_API"] = "false"
+    os.environ["LEAD_RATE_LIMIT_IP"] = "0"      # меряем приём заявок, а не лимитер
+    os.environ["LEAD_RATE_LIMIT_PHONE"] = "0"
+    if args.no_cache:
+        os.environ["LEAD_RECENT_CACHE_TTL"] = "0"
+    sys.path.insert(0, ROOT)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, insert, text
+    from app.api import lead_routes
+    from app.core.db import engine, init_db
+    from app.core.models import Lead
+    from app.main import create_app
+
+    init_db()
+    old = datetime.utcnow() - timedelta(days=30)
+    with engine.begin() as conn:
+        rows = [
+            {"name": "old", "phone": f"+99890{i % args.unique:07d}", "status": random.choice(("won", "lost", "in_work")),
+             "processed": True, "source": "seed", "ref_code": "", "created_at": old}
+            for i in range(args.seed)
+        ]
+        conn.execute(insert(Lead), rows)
+        if args.legacy_index:
+            conn.execute(text("DROP INDEX ix_leads_phone_status_created"))
+            conn.execute(text("CREATE INDEX ix_leads_phone ON leads (phone)"))
+        conn.execute(text("ANALYZE"))
+
+    stmts = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_):
+        stmts[0] += 1
+
+    rnd = random.Random(1)
+    payloads = [
+        {"name": f"bench {n}", "phone": rnd.choice(_formats(n))}
+        for n in (rnd.randrange(args.unique) for _ in range(args.requests))
+    ]
+    latencies = []
+
+    with TestClient(create_app()) as client:
+        def post(payload: dict) -> None:
+            t = time.perf_counter()
+            r = client.post("/api/leads", json=payload)
+            latencies.append(time.perf_counter() - t)
+            assert r.status_code == 201, r.text
+
+        stmts[0] = 0
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(post, payloads))
+        elapsed = time.perf_counter() - t0
+
+    with engine.connect() as conn:
+        created = conn.execute(text("SELECT COUNT(*) FROM leads WHERE source != 'seed'")).scalar()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    mode = ("без кэша" if args.no_cache else "кэш") + (", индекс phone" if args.legacy_index else ", составной индекс")
+    print(f"{mode}: {args.requests} запросов, дублей {1 - args.unique / args.requests:.0%}, {args.threads} потоков")
+    print(f"  {args.requests / elapsed:8.0f} req/s   p50 {p(0.5):6.2f} ms   p99 {p(0.99):6.2f} ms")
+    print(f"  SQL на запрос {stmts[0] / args.requests:5.2f}   создано заявок {created} (ожидалось {args.unique})")
+    print(f"  кэш недавних: {lead_routes.RECENT_LEADS.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Задержка POST /api/leads, когда Telegram отвечает медленно.
+
+Отправка в Bot API подменена заглушкой со сном --delay сек. Режим outbox (по умолчанию) —
+как в проде: ответ сразу после коммита, доставляет фоновый диспетчер. --inline — доставка
+внутри запроса (wake() заменён на run_once()), то есть как было до outbox.
+
+    python bench/lead_notify_latency.py
+    python bench/lead_notify_latency.py --inline --delay 1 --admins 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=20)
+    ap.add_argument("--admins", type=int, default=3, help="чатов в ADMIN_CHAT_IDS")
+    ap.add_argument("--delay", type=float, default=0.5, help="сек на один вызов Bot API")
+    ap.add_argument("--inline", action="store_true", help="доставлять внутри запроса")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-notify-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    os.environ["ADMIN_CHAT_IDS"] = "[" + ",".join(str(1000 + i) for i in range(args.admins)) + "]"
+    os.environ["NOTIFY_POLL_INTERVAL"] = "0.1"
+    sys.path.insert(0, ROOT)
+
+    from fastapi.testclient import TestClient
+    from app.core.db import db_session
+    from app.core.models import LeadNotification
+    from app.main import create_app
+    from app.services import telegram_notify
+
+    def slow_send(chat_id, text, **kwargs):
+        time.sleep(args.delay)
+
+    dispatcher = telegram_notify.DISPATCHER
+    dispatcher.send = slow_send
+    if args.inline:
+        dispatcher.start = lambda: None
+        dispatcher.wake = dispatcher.run_once
+
+    latencies = []
+    with TestClient(create_app()) as client:
+        t0 = time.perf_counter()
+        for i in range(args.requests):
+            t = time.perf_counter()
+            r = client.post("/api/leads", json={"name": f"bench {i}", "phone": f"+99890{i:07d}"})
+            latencies.append(time.perf_counter() - t)
+            assert r.status_code == 201, r.text
+        expected = args.requests * args.admins
+        while True:
+            with db_session() as db:
+                done = db.query(LeadNotification).filter(LeadNotification.status == "sent").count()
+            if done >= expected:
+                break
+            time.sleep(0.05)
+        delivered = time.perf_counter() - t0
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    print(f"{'inline' if args.inline else 'outbox':7} POST /api/leads p50 {p(0.5):7.1f} ms  p99 {p(0.99):7.1f} ms  "
+          f"все {expected} уведомлений доставлены за {delivered:5.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Цена лимитера на запрос и поведение под флудом.
+
+1) MemoryRateLimiter.hit() — мкс на вызов при --keys разных ключах (1 и --threads потоков).
+2) Флуд POST /api/leads с одного IP на временной SQLite: сколько прошло, сколько 429,
+   сколько заявок и уведомлений реально записано.
+
+    python bench/rate_limiter.py
+    python bench/rate_limiter.py --keys 100000 --flood 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=500000)
+    ap.add_argument("--keys", type=int, default=10000)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--flood", type=int, default=1000, help="запросов с одного IP")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-ratelimit-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+    os.environ["ADMIN_CHAT_IDS"] = "[1,2,3]"
+    os.environ["NOTIFY_DISPATCHER_IN_API"] = "false"
+    sys.path.insert(0, ROOT)
+
+    from app.core.ratelimit import MemoryRateLimiter
+
+    keys = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(args.keys)]
+    limiter = MemoryRateLimiter()
+    hit = limiter.hit
+    t = time.perf_counter()
+    for i in range(args.calls):
+        hit(keys[i % args.keys], 20, 60)
+    single = (time.perf_counter() - t) / args.calls * 1e6
+
+    limiter = MemoryRateLimiter()
+    per_thread = args.calls // args.threads
+
+    def worker(offset: int) -> None:
+        for i in range(per_thread):
+            limiter.hit(keys[(offset + i) % args.keys], 20, 60)
+
+    t = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(worker, range(args.threads)))
+    threaded = (time.perf_counter() - t) / (per_thread * args.threads) * 1e6
+    print(f"hit(): {single:.2f} мкс в 1 потоке, {threaded:.2f} мкс/вызов в {args.threads} потоках "
+          f"({args.keys} ключей)")
+
+    from fastapi.testclient import TestClient
+    from app.core.db import db_session
+    from app.core.models import Lead, LeadNotification
+    from app.main import create_app
+
+    codes: dict[int, int] = {}
+    with TestClient(create_app()) as client:
+        t = time.perf_counter()
+        for i in range(args.flood):
+            r = client.post("/api/leads", json={"name": "spam", "phone": f"+99893{i:07d}"})
+            codes[r.status_code] = codes.get(r.status_code, 0) + 1
+        elapsed = time.perf_counter() - t
+        stats = client.get("/health").json()["rate_limit"]
+    with db_session() as db:
+        leads = db.query(Lead).count()
+        notes = db.query(LeadNotification).count()
+    print(f"флуд {args.flood} запросов с одного IP за {elapsed:.1f} s: ответы {codes}, "
+          f"заявок {leads}, уведомлений {notes}; счётчики {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Redis-бэкенды (RedisStateStore, RedisRateLimiter) на FakeRedis из bench/fake_redis.py —
+без сервера и пакета redis, чтобы их код хоть где-то исполнялся.
+
+1. FSM: --ops случайных get/set/delete на --users пользователях параллельно в MemoryStateStore
+   и RedisStateStore — ответы должны совпасть; EX на ключе, истечение TTL, len().
+2. Лимитер: ровно limit пропусков из --threads потоков, отклонённые не засчитываются (DECR),
+   EXPIRE на два окна, прошлое окно тормозит текущее; команд на hit() — поездок к Redis.
+3. Цена вызова, мкс: memory против redis-кода на фейке (сеть сюда не входит — это оверхед клиента).
+
+    python bench/redis_backends.py
+    python bench/redis_backends.py --ops 200000 --threads 16
+    python -m bench.redis_backends
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)  # и `python bench/….py`, и `python -m bench.…`
+from bench.fake_redis import FakeRedis  # noqa: E402
+
+
+def check(ok: bool, what: str) -> None:
+    print(f"  {'OK  ' if ok else 'FAIL'} {what}")
+    if not ok:
+        raise SystemExit(1)
+
+
+def per_call_us(fn, n: int) -> float:
+    t = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t) / n * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ops", type=int, default=50000)
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-redis-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["BOT_TOKEN"] = "123456:bench"
+
+    from app.bot.state import MemoryStateStore, RedisStateStore
+    from app.core.ratelimit import MemoryRateLimiter, RedisRateLimiter
+
+    # ---- 1. FSM
+    print("1. RedisStateStore против MemoryStateStore")
+    client = FakeRedis()
+    memory, redis = MemoryStateStore(ttl=3600, max_size=10 ** 6), RedisStateStore(ttl=3600, client=client)
+    rnd = random.Random(1)
+    script = [(rnd.choice("gsd"), rnd.randrange(args.users), rnd.randrange(1000)) for _ in range(args.ops)]
+    mismatches = 0
+    for op, uid, n in script:
+        if op == "s":
+            data = {"step": f"s{n}", "lang": "uz", "name": "Пётр"}
+            memory.set(uid, data)
+            redis.set(uid, data)
+        elif op == "d":
+            memory.delete(uid)
+            redis.delete(uid)
+        elif memory.get(uid) != redis.get(uid):
+            mismatches += 1
+    check(mismatches == 0, f"{args.ops} операций: get() совпал везде")
+    check(len(memory) == len(redis), f"len(): {len(redis)} ключей")
+    redis.set(1, {"step": "x"})
+    left = client.pttl("fsm:1")
+    check(left is not None and 3590 < left <= 3600, "set() ставит EX=ttl")
+
+    short = RedisStateStore(ttl=1, client=client, prefix="short:")
+    short.set(7, {"step": "x"})
+    time.sleep(1.05)
+    check(short.get(7) == {} and len(short) == 0, "запись истекает по TTL")
+    client.set("fsm:broken", b"{not json")
+    check(redis.get("broken") == {}, "битый JSON -> {}")
+
+    # ---- 2. лимитер
+    print("2. RedisRateLimiter")
+    client = FakeRedis()
+    limiter = RedisRateLimiter(client=client)
+    window, limit, hits = 86400, 100, 1000   # окно в сутки — за прогон не перевалит
+    with ThreadPoolExecutor(args.threads) as pool:
+        waits = list(pool.map(lambda _: limiter.hit("ip:10.0.0.1", limit, window), range(hits)))
+    passed = sum(1 for w in waits if not w)
+    check(passed == limit, f"{hits} hit() из {args.threads} потоков, limit={limit}: пропущено {passed}")
+    check(all(0 < w <= 2 * window for w in waits if w), "отклонённым — Retry-After в пределах двух окон")
+    idx = int(time.time() // window)
+    key = f"rl:ip:10.0.0.1:{idx}"
+    check(int(client.get(key)) == limit, f"в {key} ровно {limit}: отклонённые откачены DECR")
+    left = client.pttl(key)
+    check(left is not None and window * 2 < left <= window * 2 + 1, "EXPIRE на два окна")
+    client.set(f"rl:ip:10.0.0.2:{idx - 1}", 10 ** 9)
+    check(limiter.hit("ip:10.0.0.2", limit, window) > 0, "переполненное прошлое окно отклоняет в текущем")
+    check(limiter.stats()["ip"] == {"allowed": limit, "limited": hits - limit + 1}, f"stats(): {limiter.stats()['ip']}")
+
+    client.calls = 0
+    limiter.hit("ip:10.0.0.3", limit, window)
+    ok_calls = client.calls
+    client.calls = 0
+    limiter.hit("ip:10.0.0.1", limit, window)
+    check((ok_calls, client.calls) == (1, 2), f"поездок к Redis на hit(): пропуск {ok_calls}, отказ {client.calls}")
+
+    # ---- 3. цена вызова
+    n = min(args.ops, 100000)
+    print(f"3. мкс на вызов ({n} вызовов, 1 поток; redis — код бэкенда + фейк, без сети)")
+    fsm = RedisStateStore(ttl=3600, client=FakeRedis())
+    mem = MemoryStateStore(ttl=3600, max_size=10 ** 6)
+    data = {"step": "parent:name", "lang": "ru"}
+    for title, store in (("memory", mem), ("redis", fsm)):
+        set_us = per_call_us(lambda i: store.set(i % args.users, data), n)
+        get_us = per_call_us(lambda i: store.get(i % args.users), n)
+        print(f"  FSM {title:7} set {set_us:6.1f}  get {get_us:6.1f}")
+    for title, rl in (("memory", MemoryRateLimiter()), ("redis", RedisRateLimiter(client=FakeRedis()))):
+        hit_us = per_call_us(lambda i: rl.hit(f"ip:{i % args.users}", 10 ** 9, 60), n)
+        print(f"  лимитер {title:7} hit {hit_us:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
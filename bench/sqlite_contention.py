@@ -0,0 +1,148 @@
+"""
+Несколько процессов пишут в одну SQLite-базу, как бот + API + админка в проде.
+
+Для каждого профиля (baseline — только foreign_keys, как было; tuned — настройки SQLITE_*
+по умолчанию) на своей временной базе запускаются писатели (прочитать родителя -> добавить
+заявку -> коммит) и читатели (постраничная выгрузка заявок). Печатаем долю "database is locked"
+и задержки записи.
+
+    python bench/sqlite_contention.py
+    python bench/sqlite_contention.py --writers 8 --readers 4 --ops 300
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    # как до профиля: journal_mode=DELETE, synchronous=FULL, pysqlite timeout по умолчанию
+    "baseline": {
+        "SQLITE_JOURNAL_MODE": "",
+        "SQLITE_SYNCHRONOUS": "",
+        "SQLITE_BUSY_TIMEOUT_MS": "0",
+        "SQLITE_MMAP_SIZE": "0",
+        "SQLITE_CACHE_SIZE": "0",
+        "SQLITE_TEMP_STORE": "",
+    },
+    "tuned": {},
+}
+
+
+def _setup(db_url: str, profile: str) -> None:
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.update(PROFILES[profile])
+    sys.path.insert(0, ROOT)
+
+
+def _prepare(db_url: str, profile: str) -> None:
+    _setup(db_url, profile)
+    from app.core.db import db_session, init_db
+    from app.core.models import Parent
+    init_db()
+    with db_session() as db:
+        for i in range(100):
+            db.add(Parent(tg_id=f"bench-{i}", full_name=f"Parent {i}"))
+
+
+def _writer(db_url: str, profile: str, wid: int, ops: int, out) -> None:
+    _setup(db_url, profile)
+    from sqlalchemy.exc import OperationalError
+    from app.core.db import db_session
+    from app.core.models import Lead, Parent
+
+    latencies, errors = [], 0
+    for i in range(ops):
+        t0 = time.perf_counter()
+        try:
+            with db_session() as db:
+                p = db.query(Parent).filter_by(tg_id=f"bench-{(wid * ops + i) % 100}").first()
+                db.add(Lead(name=f"w{wid}-{i}", phone="+998900000000", parent_id=p.id, source="bench"))
+            latencies.append(time.perf_counter() - t0)
+        except OperationalError:
+            errors += 1
+    out.put(("w", latencies, errors))
+
+
+def _reader(db_url: str, profile: str, stop, out) -> None:
+    """Как выгрузка CSV в админке: курсор по заявкам читается порциями, пока открыт — держит чтение."""
+    _setup(db_url, profile)
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+    from app.core.db import engine
+    from app.core.models import Lead
+
+    reads, errors = 0, 0
+    while not stop.is_set():
+        try:
+            with engine.connect() as conn:
+                result = conn.execute(select(Lead.id, Lead.name, Lead.phone))
+                while result.fetchmany(200):
+                    time.sleep(0.002)
+            reads += 1
+        except OperationalError:
+            errors += 1
+    out.put(("r", reads, errors))
+
+
+def _pct(values: list, p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def run(profile: str, writers: int, readers: int, ops: int) -> None:
+    tmp = tempfile.mkdtemp(prefix=f"bench-sqlite-{profile}-")
+    db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    ctx = mp.get_context("spawn")
+
+    prep = ctx.Process(target=_prepare, args=(db_url, profile))
+    prep.start()
+    prep.join()
+
+    out, stop = ctx.Queue(), ctx.Event()
+    rprocs = [ctx.Process(target=_reader, args=(db_url, profile, stop, out)) for _ in range(readers)]
+    wprocs = [ctx.Process(target=_writer, args=(db_url, profile, w, ops, out)) for w in range(writers)]
+    t0 = time.perf_counter()
+    for pr in rprocs + wprocs:
+        pr.start()
+
+    latencies, w_errors, reads, r_errors = [], 0, 0, 0
+    for _ in wprocs:
+        _, lat, err = out.get()
+        latencies += lat
+        w_errors += err
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    for _ in rprocs:
+        _, n, err = out.get()
+        reads += n
+        r_errors += err
+    for pr in rprocs + wprocs:
+        pr.join()
+
+    attempts = writers * ops
+    print(
+        f"{profile:9} writes {len(latencies):5}/{attempts:<5} locked {w_errors / attempts:6.1%}  "
+        f"p50 {_pct(latencies, 0.50):7.1f} ms  p99 {_pct(latencies, 0.99):7.1f} ms  "
+        f"reads {reads:6} (locked {r_errors})  {elapsed:5.1f} s"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=6)
+    ap.add_argument("--readers", type=int, default=2)
+    ap.add_argument("--ops", type=int, default=200, help="транзакций на писателя")
+    ap.add_argument("--profile", choices=[*PROFILES, "all"], default="all")
+    args = ap.parse_args()
+    for profile in PROFILES if args.profile == "all" else [args.profile]:
+        run(profile, args.writers, args.readers, args.ops)
+
+
+if __name__ == "__main__":
+    main()
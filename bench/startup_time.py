@@ -0,0 +1,110 @@
+"""
+Холодный старт трёх точек входа: app.main, app.admin.app, app.bot.bot.
+
+Каждый замер — новый процесс на своей временной SQLite (как scale-to-zero воркер):
+время `import`, время фабрики (create_app / create_bot; для FastAPI — вместе со
+startup-хуками), побочные эффекты импорта (создан ли файл БД, загружены ли telebot/requests)
+и самые тяжёлые пакеты по `python -X importtime` (собственное время по пакетам).
+
+    python bench/startup_time.py
+    python bench/startup_time.py --runs 10 --top 12 app.main
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "app.main": "create_app",
+    "app.admin.app": "create_app",
+    "app.bot.bot": "create_bot",
+}
+# чего не должно быть в процессе, которому не нужен бот
+WATCH = ("telebot", "requests", "app.bot.bot")
+
+CHILD = r"""
+import importlib, json, os, sys, time
+name, factory, db_path, watch = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4].split(",")
+t0 = time.perf_counter()
+mod = importlib.import_module(name)
+t1 = time.perf_counter()
+report = {
+    "import": t1 - t0,
+    "db_created": os.path.exists(db_path),
+    "loaded": [m for m in watch if m in sys.modules],
+}
+if factory and hasattr(mod, factory):
+    obj = getattr(mod, factory)()
+    for hook in getattr(getattr(obj, "router", None), "on_startup", []):
+        hook()  # FastAPI: то, что uvicorn выполнит перед первым запросом
+    report["factory"] = time.perf_counter() - t1
+print(json.dumps(report))
+"""
+
+
+def _env(tmp: str) -> dict:
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    env["BOT_TOKEN"] = "123456:bench"
+    env["BOT_MODE"] = "polling"
+    env["PYTHONPATH"] = ROOT
+    return env
+
+
+def _run(name: str, factory: str) -> dict:
+    tmp = tempfile.mkdtemp(prefix="bench-startup-")
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, name, factory, os.path.join(tmp, "bench.db"), ",".join(WATCH)],
+        cwd=ROOT, env=_env(tmp), capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _importtime(name: str) -> Counter:
+    """Собственное время импорта (мкс) по пакетам верхнего уровня."""
+    tmp = tempfile.mkdtemp(prefix="bench-startup-")
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {name}"],
+        cwd=ROOT, env=_env(tmp), capture_output=True, text=True, check=True,
+    )
+    by_pkg: Counter = Counter()
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, mod = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            by_pkg[mod.split(".")[0] if not mod.startswith("app.") else ".".join(mod.split(".")[:2])] += int(self_us)
+    return by_pkg
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("targets", nargs="*", default=list(TARGETS))
+    ap.add_argument("--runs", type=int, default=5, help="процессов на точку входа (берём медиану)")
+    ap.add_argument("--top", type=int, default=8, help="сколько пакетов показать из importtime")
+    args = ap.parse_args()
+
+    for name in args.targets:
+        factory = TARGETS.get(name, "")
+        runs = [_run(name, factory) for _ in range(args.runs)]
+        imp = statistics.median(r["import"] for r in runs) * 1000
+        line = f"{name:14} import {imp:7.1f} ms"
+        if "factory" in runs[0]:
+            fac = statistics.median(r["factory"] for r in runs) * 1000
+            line += f"   {factory}() + startup {fac:7.1f} ms"
+        print(line)
+        print(f"{'':14} при импорте: БД {'создана' if runs[0]['db_created'] else 'не тронута'}, "
+              f"загружены: {', '.join(runs[0]['loaded']) or '—'}")
+        for pkg, us in _importtime(name).most_common(args.top):
+            print(f"{'':16}{pkg:28} {us / 1000:7.1f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
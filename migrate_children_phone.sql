@@ -1,2 +0,0 @@
-ALTER TABLE children ADD COLUMN phone VARCHAR;
-CREATE INDEX IF NOT EXISTS ix_children_phone ON children(phone);
\ No newline at end of file